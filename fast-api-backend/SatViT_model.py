@@ -1,9 +1,35 @@
 import torch
 from torch import nn, einsum
+import torch.nn.functional as F
 from einops import rearrange
 import numpy as np
 
 
+# Attention implementations, all numerically equivalent up to floating point:
+# - "sdpa": fused torch.nn.functional.scaled_dot_product_attention, never materialises the score matrix
+# - "chunked": queries processed in blocks so only (BSZ, num_heads, chunk_size, num_patches) scores exist at once
+# - "einsum": the original full (BSZ, num_heads, num_patches, num_patches) implementation
+# - "auto": "sdpa" when this torch build has it, otherwise "chunked"
+ATTENTION_BACKENDS = ("auto", "sdpa", "chunked", "einsum")
+DEFAULT_ATTENTION_CHUNK_SIZE = 128
+
+
+def resolve_attention_backend(backend):
+    if backend not in ATTENTION_BACKENDS:
+        raise ValueError(f"Unknown attention backend '{backend}'; expected one of {', '.join(ATTENTION_BACKENDS)}")
+    if backend == "auto":
+        return "sdpa" if hasattr(F, "scaled_dot_product_attention") else "chunked"
+    if backend == "sdpa" and not hasattr(F, "scaled_dot_product_attention"):
+        raise ValueError("Attention backend 'sdpa' requires torch>=2.0")
+    return backend
+
+
+# Token scores for adaptive encoding (BaseTransformer.forward_adaptive); the lowest-scoring tokens are dropped:
+# - "attention": attention each token receives from the mean query of the next layer (averaged over heads)
+# - "norm": distance of each token from the image's mean token, i.e. how much it differs from its neighbours
+TOKEN_SCORES = ("attention", "norm")
+
+
 # --------------------------------------------------------
 # POSITION EMBEDDINGS ###
 # --------------------------------------------------------
@@ -95,12 +121,16 @@ class Attention(nn.Module):
                  dim,
                  num_heads=8,
                  dropout=0.,
+                 backend="auto",
+                 chunk_size=DEFAULT_ATTENTION_CHUNK_SIZE,
                  ):
         """
         Self-Attention module
         :param dim: model dimension (number of features)
         :param num_heads: number of attention heads
         :param dropout: dropout between 0 and 1
+        :param backend: one of ATTENTION_BACKENDS (no parameters depend on it, so checkpoints load either way)
+        :param chunk_size: number of queries per block for the "chunked" backend
         """
         super().__init__()
         self.num_heads = num_heads
@@ -113,20 +143,55 @@ class Attention(nn.Module):
         self.input_norm = nn.LayerNorm(dim)
         self.dropout = nn.Dropout(dropout)
 
+        self.backend = resolve_attention_backend(backend)
+        self.chunk_size = chunk_size
+
+    def _einsum_attention(self, q, k, v):
+        attention_scores = einsum('b h i d, b h j d -> b h i j', q, k) * self.scale  # (BSZ, num_heads, num_queries, num_patches)
+
+        attn = attention_scores.softmax(dim=-1)  # (BSZ, num_heads, num_queries, num_patches)
+        attn = self.dropout(attn)  # (BSZ, num_heads, num_queries, num_patches)
+
+        return einsum('b h i j, b h j d -> b h i d', attn, v)  # (BSZ, num_heads, num_queries, dim_head)
+
     def forward(self, x):
         x = self.input_norm(x)  # (BSZ, num_patches, dim)
         q, k, v = self.to_qkv(x).chunk(3, dim=-1)  # (BSZ, num_patches, dim)
         q, k, v = map(lambda t: rearrange(t, 'b n (h d) -> b h n d', h=self.num_heads), (q, k, v))  # (BSZ, num_heads, num_patches, dim_head)
 
-        attention_scores = einsum('b h i d, b h j d -> b h i j', q, k) * self.scale  # (BSZ, num_heads, num_patches, num_patches)
+        if self.backend == "sdpa":
+            # Default scale is dim_head ** -0.5, i.e. self.scale
+            dropout_p = self.dropout.p if self.training else 0.
+            out = F.scaled_dot_product_attention(q, k, v, dropout_p=dropout_p)  # (BSZ, num_heads, num_patches, dim_head)
+        elif self.backend == "chunked" and q.shape[2] > self.chunk_size:
+            # Each query's softmax only needs its own row of scores, so blocks of queries are independent
+            out = torch.cat([
+                self._einsum_attention(q[:, :, start:start + self.chunk_size], k, v)
+                for start in range(0, q.shape[2], self.chunk_size)
+            ], dim=2)  # (BSZ, num_heads, num_patches, dim_head)
+        else:
+            out = self._einsum_attention(q, k, v)  # (BSZ, num_heads, num_patches, dim_head)
 
-        attn = attention_scores.softmax(dim=-1)  # (BSZ, num_heads, num_patches, num_patches)
-        attn = self.dropout(attn)  # (BSZ, num_heads, num_patches, num_patches)
-
-        out = einsum('b h i j, b h j d -> b h i d', attn, v)  # (BSZ, num_heads, num_patches, dim_head)
         out = rearrange(out, 'b h n d -> b n (h d)')  # (BSZ, num_patches, dim)
         return self.to_out(out)  # (BSZ, num_patches, dim)
 
+    def token_importance(self, x):
+        """
+        Attention each token would receive from the mean query, averaged over heads; (BSZ, num_patches).
+        Only the query/key projections are computed (to_qkv has no bias, so the mean query is the query of the mean).
+        """
+        weight = self.to_qkv.weight
+        if callable(weight):  # dynamically quantized nn.Linear
+            weight = weight().dequantize()
+        dim = weight.shape[1]
+        x = self.input_norm(x)
+        q = F.linear(x.mean(dim=1), weight[:dim])  # (BSZ, dim)
+        k = F.linear(x, weight[dim:2 * dim])  # (BSZ, num_patches, dim)
+        q = rearrange(q, 'b (h d) -> b h d', h=self.num_heads)
+        k = rearrange(k, 'b n (h d) -> b h n d', h=self.num_heads)
+        attn = (einsum('b h d, b h n d -> b h n', q, k) * self.scale).softmax(dim=-1)  # (BSZ, num_heads, num_patches)
+        return attn.mean(dim=1)
+
 
 class BaseTransformer(nn.Module):
     def __init__(self,
@@ -136,12 +201,13 @@ class BaseTransformer(nn.Module):
                  attn_dropout=0.,
                  ff_dropout=0.,
                  ff_mult=4,
+                 attn_backend="auto",
                  ):
         super().__init__()
         self.layers = nn.ModuleList([])
         for _ in range(depth):
             self.layers.append(nn.ModuleList([
-                Attention(dim=dim, num_heads=num_heads, dropout=attn_dropout),
+                Attention(dim=dim, num_heads=num_heads, dropout=attn_dropout, backend=attn_backend),
                 FFN(dim=dim, mult=ff_mult, dropout=ff_dropout),
             ]))
 
@@ -154,6 +220,73 @@ class BaseTransformer(nn.Module):
 
         return self.norm_out(x)  # (BSZ, num_patches, dim)
 
+    def forward_adaptive(self,
+                         x,
+                         keep_ratio=1.0,
+                         prune_layers=(),
+                         exit_threshold=None,
+                         min_layers=1,
+                         score="attention",
+                         ):
+        """
+        Inference-only forward pass that spends fewer layers on fewer tokens, for a data-dependent speedup.
+        keep_ratio: before each layer index in prune_layers, keep only this fraction of the still active tokens, ranked
+                    by TOKEN_SCORES[score]. Dropped tokens keep their state from that depth (like a token that stopped
+                    early), so the output still has every token in its original position.
+        exit_threshold: once min_layers have run, a sample stops when the cosine similarity between its mean active
+                        token before and after a layer reaches this value. None runs every layer.
+        Returns the normalized tokens (BSZ, num_patches, dim) and per-sample tensors (BSZ,): "layers_run",
+        "tokens_kept" (active tokens in the last layer run) and "token_layers" (token-layer evaluations).
+        """
+        if score not in TOKEN_SCORES:
+            raise ValueError(f"Unknown token score '{score}'; expected one of {', '.join(TOKEN_SCORES)}")
+        B, N, D = x.shape
+        full = x.clone()  # latest state of every token; active tokens are written back when they stop
+        rows = torch.arange(B, device=x.device)  # samples still running
+        ids = torch.arange(N, device=x.device).expand(B, N)  # positions of their active tokens
+        layers_run = torch.zeros(B, dtype=torch.long)
+        tokens_kept = torch.full((B,), N, dtype=torch.long)
+        token_layers = torch.zeros(B, dtype=torch.long)
+        prev = None
+
+        for i, (self_attn, ffn) in enumerate(self.layers):
+            keep = max(1, int(round(x.shape[1] * keep_ratio)))
+            if i in prune_layers and keep < x.shape[1]:
+                full[rows.unsqueeze(1), ids] = x
+                if score == "attention":
+                    importance = self_attn.token_importance(x)
+                else:
+                    importance = (x - x.mean(dim=1, keepdim=True)).norm(dim=-1)
+                top = importance.topk(keep, dim=1).indices  # (b, keep)
+                # Same gather as random_masking, with data-dependent instead of random ids
+                ids = torch.gather(ids, dim=1, index=top)
+                x = torch.gather(x, dim=1, index=top.unsqueeze(-1).repeat(1, 1, D))
+                tokens_kept[rows.cpu()] = keep
+                prev = None  # the mean now covers other tokens
+
+            x = self_attn(x) + x  # (b, active_tokens, dim)
+            x = ffn(x) + x  # (b, active_tokens, dim)
+            layers_run[rows.cpu()] += 1
+            token_layers[rows.cpu()] += x.shape[1]
+
+            if exit_threshold is None or i + 1 >= len(self.layers):
+                continue
+            pooled = x.mean(dim=1)  # (b, dim)
+            if prev is not None and i + 1 >= min_layers:
+                done = F.cosine_similarity(pooled, prev, dim=-1) >= exit_threshold
+                if done.any():
+                    full[rows[done].unsqueeze(1), ids[done]] = x[done]
+                    running = ~done
+                    rows, ids, x, pooled = rows[running], ids[running], x[running], pooled[running]
+                    if len(rows) == 0:
+                        break
+            prev = pooled
+
+        if len(rows):
+            full[rows.unsqueeze(1), ids] = x
+        stats = {"layers_run": layers_run, "tokens_kept": tokens_kept, "token_layers": token_layers}
+        return self.norm_out(full), stats
+
 
 # --------------------------------------------------------
 # SatViT Model
@@ -169,6 +302,7 @@ class SatViT(nn.Module):
                  decoder_dim=384,
                  decoder_depth=2,
                  decoder_num_heads=6,
+                 attn_backend="auto",
                  ):
         super().__init__()
 
@@ -181,6 +315,7 @@ class SatViT(nn.Module):
         self.encoder = BaseTransformer(dim=encoder_dim,
                                        depth=encoder_depth,
                                        num_heads=encoder_num_heads,
+                                       attn_backend=attn_backend,
                                        )
 
         # Mask embeddings are used in the decoder (these are the locations the decoder will predict the input)
@@ -194,6 +329,7 @@ class SatViT(nn.Module):
         self.decoder = BaseTransformer(dim=decoder_dim,
                                        depth=decoder_depth,
                                        num_heads=decoder_num_heads,
+                                       attn_backend=attn_backend,
                                        )
 
         # Setup position embeddings
@@ -211,6 +347,18 @@ class SatViT(nn.Module):
         self.linear_output = nn.Linear(decoder_dim, io_dim)
         self.norm_pix_loss = True
 
+    def set_attention_backend(self, backend, chunk_size=None):
+        """
+        Switch every attention layer (encoder and decoder) to another backend from ATTENTION_BACKENDS.
+        chunk_size: optional number of queries per block for the "chunked" backend.
+        """
+        backend = resolve_attention_backend(backend)
+        for module in self.modules():
+            if isinstance(module, Attention):
+                module.backend = backend
+                if chunk_size is not None:
+                    module.chunk_size = chunk_size
+
     def random_masking(self, x, mask_ratio):
         """
         Perform per-sample random masking by per-sample shuffling.
@@ -281,14 +429,44 @@ class SatViT(nn.Module):
         loss = (loss * mask).sum() / mask.sum()  # mean loss on removed patches
         return loss
 
-    def encode(self, images_patches):
+    def encode(self, images_patches, linear_input=None):
         """
         We encode full images (i.e., no masking) by linearly projecting image patches, adding position embeddings,
         then encoding these inputs with our MAE encoder. This function will be used during fine-tuning and inference.
+        linear_input: optional replacement for self.linear_input, e.g. a projection folded for fewer input channels.
         """
-        patch_encodings = self.linear_input(images_patches) + self.pos_embed  # (BSZ, num_patches, encoder_dim)
+        linear_input = self.linear_input if linear_input is None else linear_input
+        patch_encodings = linear_input(images_patches) + self.pos_embed  # (BSZ, num_patches, encoder_dim)
         return self.encoder(patch_encodings)
 
+    def encode_adaptive(self, images_patches, linear_input=None, **kwargs):
+        """
+        Like encode, with token pruning and early exit (see BaseTransformer.forward_adaptive for kwargs).
+        Returns the encodings (BSZ, num_patches, encoder_dim) and the per-sample stats.
+        """
+        linear_input = self.linear_input if linear_input is None else linear_input
+        patch_encodings = linear_input(images_patches) + self.pos_embed  # (BSZ, num_patches, encoder_dim)
+        return self.encoder.forward_adaptive(patch_encodings, **kwargs)
+
+    def decode(self, latent, pool=False, blocks=True):
+        """
+        Decode full (unmasked) encodings back to patch space. This is forward_decoder without the mask token and
+        unshuffle gather: with nothing masked, ids_restore is a permutation we never need, so the output matches
+        forward(x, mask_ratio=0.0) up to floating point reordering.
+        pool: average over patches before the output projection. linear_output is affine, so this equals the mean
+              of the per-patch predictions while projecting one vector instead of num_patches.
+        blocks: run the decoder Transformer blocks. With blocks=False only the projections and final norm are
+                applied, which is cheaper but no longer matches forward().
+        """
+        x = self.enc_to_dec(latent) + self.decoder_pos_embed  # (BSZ, num_patches, decoder_dim)
+        if blocks:
+            x = self.decoder(x)
+        else:
+            x = self.decoder.norm_out(x)
+        if pool:
+            x = x.mean(dim=1)  # (BSZ, decoder_dim)
+        return self.linear_output(x)  # (BSZ, num_patches, io_dim) or (BSZ, io_dim) if pooled
+
     def forward(self, patch_encodings, mask_ratio=0.75):
         latent, mask, ids_restore = self.forward_encoder(patch_encodings, mask_ratio)
         pred = self.forward_decoder(latent, ids_restore)  # [N, L, p*p*3]
@@ -0,0 +1,92 @@
+import os
+import tarfile
+import zipfile
+from typing import Iterator, Optional, Tuple
+
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp", ".webp")
+ARCHIVE_EXTENSIONS = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+
+# Upper bound on a single decompressed member, so one entry cannot exhaust memory
+MAX_MEMBER_BYTES = int(os.getenv("TERRAVIT_ARCHIVE_MAX_MEMBER_BYTES", str(64 << 20)))
+
+# (member name, bytes or None, error or None)
+ArchiveItem = Tuple[str, Optional[bytes], Optional[str]]
+
+
+def archive_kind(filename: str) -> Optional[str]:
+    """Return ``"zip"`` or ``"tar"`` from an archive file name, or None if it is not a supported archive."""
+    name = filename.lower()
+    if name.endswith(".zip"):
+        return "zip"
+    if name.endswith(ARCHIVE_EXTENSIONS):
+        return "tar"
+    return None
+
+
+def is_image_member(name: str) -> bool:
+    """Image files by extension, skipping hidden files and macOS resource forks."""
+    base = os.path.basename(name)
+    if not base or base.startswith(".") or "__MACOSX/" in name:
+        return False
+    return os.path.splitext(base)[1].lower() in IMAGE_EXTENSIONS
+
+
+def _too_large(name: str, max_member_bytes: int) -> ArchiveItem:
+    return name, None, f"Archive member exceeds {max_member_bytes} bytes."
+
+
+def _iter_zip(path: str, max_member_bytes: int) -> Iterator[ArchiveItem]:
+    with zipfile.ZipFile(path) as zf:
+        for info in zf.infolist():
+            if info.is_dir() or not is_image_member(info.filename):
+                continue
+            if info.file_size > max_member_bytes:
+                yield _too_large(info.filename, max_member_bytes)
+                continue
+            with zf.open(info) as member:
+                # The declared size can lie; never read past the limit
+                data = member.read(max_member_bytes + 1)
+            if len(data) > max_member_bytes:
+                yield _too_large(info.filename, max_member_bytes)
+                continue
+            yield info.filename, data, None
+
+
+def _iter_tar(path: str, max_member_bytes: int) -> Iterator[ArchiveItem]:
+    # Stream mode reads members strictly in order without building an index
+    with tarfile.open(path, mode="r|*") as tf:
+        for member in tf:
+            if not member.isfile() or not is_image_member(member.name):
+                continue
+            if member.size > max_member_bytes:
+                yield _too_large(member.name, max_member_bytes)
+                continue
+            f = tf.extractfile(member)
+            if f is None:
+                continue
+            yield member.name, f.read(), None
+
+
+def iter_archive_images(
+    path: str,
+    filename: Optional[str] = None,
+    max_member_bytes: int = MAX_MEMBER_BYTES,
+) -> Iterator[ArchiveItem]:
+    """Yield image members of a zip/tar archive one at a time, in archive order.
+
+    Only one member is held in memory at a time. ``filename`` (e.g. the
+    original upload name) decides the format when ``path`` is a temporary
+    file. Members over ``max_member_bytes`` are yielded with an error instead
+    of their bytes. Raises ValueError for unsupported or unreadable archives.
+    """
+    kind = archive_kind(filename or path)
+    if kind is None:
+        raise ValueError(f"Unsupported archive format; expected one of {', '.join(ARCHIVE_EXTENSIONS)}")
+    try:
+        if kind == "zip":
+            yield from _iter_zip(path, max_member_bytes)
+        else:
+            yield from _iter_tar(path, max_member_bytes)
+    except (zipfile.BadZipFile, tarfile.TarError, EOFError) as exc:
+        raise ValueError(f"Could not read archive: {exc}") from exc
@@ -0,0 +1,143 @@
+import asyncio
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+
+RunSync = Callable[..., Awaitable[Any]]
+
+
+class MicroBatcher:
+    """Collect concurrent single-item requests into batched model calls.
+
+    Callers ``await submit(item)``; a background task drains the queue into
+    batches of at most ``max_batch_size`` items, waiting up to ``max_wait_ms``
+    for a batch to fill, runs ``run_batch`` once per batch and hands each
+    caller its own result. While a batch is running new requests keep
+    queueing, so the achieved batch size grows with load.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[List[Any]], Sequence[Any]],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 5.0,
+        run_sync: Optional[RunSync] = None,
+    ) -> None:
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+
+        self._run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        # Blocking batches run off the event loop; default to the loop's thread pool
+        self._run_sync: RunSync = run_sync or asyncio.to_thread
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        # Metrics
+        self._batches = 0
+        self._items = 0
+        self._last_batch_size = 0
+        self._batch_sizes: Counter = Counter()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue depth and achieved batch size counters."""
+        return {
+            "queue_depth": self.queue_depth,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "batches": self._batches,
+            "items": self._items,
+            "last_batch_size": self._last_batch_size,
+            "mean_batch_size": self._items / self._batches if self._batches else 0.0,
+            "batch_size_histogram": {str(size): count for size, count in sorted(self._batch_sizes.items())},
+        }
+
+    async def submit(self, item: Any) -> Any:
+        """Queue ``item`` for the next batch and wait for its result."""
+        self._ensure_worker()
+        assert self._queue is not None
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def close(self) -> None:
+        """Stop the background task; pending callers receive CancelledError."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        if self._queue is not None:
+            while not self._queue.empty():
+                _, future = self._queue.get_nowait()
+                if not future.done():
+                    future.cancel()
+        self._worker = None
+        self._queue = None
+        self._loop = None
+
+    def _ensure_worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Queues are bound to the loop that first uses them (e.g. a new TestClient loop)
+            self._queue = asyncio.Queue()
+            self._worker = None
+            self._loop = loop
+        if self._worker is None or self._worker.done():
+            self._worker = loop.create_task(self._work())
+
+    async def _collect(self) -> List[Tuple[Any, asyncio.Future]]:
+        assert self._queue is not None
+        loop = asyncio.get_running_loop()
+
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait_ms / 1000.0
+        while len(batch) < self.max_batch_size:
+            # Take whatever is already queued before waiting on the clock
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _work(self) -> None:
+        while True:
+            batch = await self._collect()
+            # Drop callers that gave up while waiting (e.g. client disconnects)
+            batch = [(item, future) for item, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            items = [item for item, _ in batch]
+            self._batches += 1
+            self._items += len(items)
+            self._last_batch_size = len(items)
+            self._batch_sizes[len(items)] += 1
+
+            try:
+                results = await self._run_sync(self._run_batch, items)
+                if len(results) != len(items):
+                    raise RuntimeError(f"Batch function returned {len(results)} results for {len(items)} items")
+            except Exception as exc:  # noqa: BLE001
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
@@ -0,0 +1,530 @@
+"""Offline CPU benchmarks of the model and API hot paths, emitted as JSON for comparison across commits.
+
+    python benchmark.py run --output bench.json
+    python benchmark.py run --suites model --batch-sizes 1,8 --random-weights V2
+    python benchmark.py compare base.json bench.json
+
+Suites: ``preprocess`` (decode + patchify, legacy vs fused pipeline), ``model`` (encoder-only and full
+forward passes per batch size), ``api`` (/predict/image and /change/detect
+under concurrent load through an in-process ASGI client) and ``risk``
+(/risk/* against an in-process Open-Meteo stub). Nothing touches the network.
+Caches are disabled so every request does the full work, and job/ERA5/vector
+state goes to a temporary directory.
+
+For eager vs exported vs torch.compile start-up comparisons see
+``export_model.py benchmark``.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+
+SUITES = ("preprocess", "model", "api", "risk")
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1 << 20) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def _summary(
+    name: str,
+    latencies_s: List[float],
+    items_per_call: int = 1,
+    wall_s: Optional[float] = None,
+    **extra: Any,
+) -> Dict[str, Any]:
+    """Latency percentiles (ms), throughput (items/s over ``wall_s``, or the summed latencies) and peak RSS so far."""
+    ms = np.array(latencies_s) * 1000.0
+    wall_s = wall_s if wall_s is not None else float(sum(latencies_s))
+    return {
+        "name": name,
+        **extra,
+        "calls": len(latencies_s),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p90_ms": round(float(np.percentile(ms, 90)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "throughput_per_s": round(len(latencies_s) * items_per_call / wall_s, 2) if wall_s > 0 else None,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def _time_calls(fn: Callable[[], Any], iterations: int, warmup: int) -> List[float]:
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def _torch_alloc_mb(fn: Callable[[], Any]) -> float:
+    """CPU tensor memory allocated during one call of ``fn`` (whether freed or not), in MiB."""
+    from torch.profiler import ProfilerActivity, profile
+
+    with profile(activities=[ProfilerActivity.CPU], profile_memory=True) as prof:
+        fn()
+    return round(sum(max(event.self_cpu_memory_usage, 0) for event in prof.events()) / (1 << 20), 3)
+
+
+def _test_images(count: int, side: int, seed: int = 0, fmt: str = "PNG") -> List[bytes]:
+    """Distinct random RGB images (PNG or JPEG), so no request is answered from a cache."""
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    images = []
+    for _ in range(count):
+        buf = io.BytesIO()
+        Image.fromarray(rng.integers(0, 256, (side, side, 3), dtype=np.uint8)).save(buf, format=fmt)
+        images.append(buf.getvalue())
+    return images
+
+
+def _random_weights(variant: str, directory: str) -> str:
+    """Save randomly initialized SatViT weights with the ``variant`` hyperparameters, for runs without a checkpoint."""
+    import torch
+
+    from SatViT_model import SatViT
+
+    if variant == "V1":
+        config = dict(io_dim=3840, num_patches=256, decoder_dim=384, decoder_depth=2, decoder_num_heads=6)
+    else:
+        config = dict(io_dim=960, num_patches=1024, decoder_dim=512, decoder_depth=1, decoder_num_heads=8)
+    torch.manual_seed(0)
+    model = SatViT(encoder_dim=768, encoder_depth=12, encoder_num_heads=12, **config)
+    path = os.path.join(directory, f"SatViT_{variant}_random.pt")
+    torch.save(model.state_dict(), path)
+    return path
+
+
+# Suites. Each returns a list of result dicts.
+
+
+def bench_preprocess(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    """Each preprocessing step under the "legacy" pipeline (per-image ToTensor/Normalize/unfold, full-size
+    decoding) and the "fused" one (TERRAVIT_FUSED_PREPROCESS, TERRAVIT_REDUCED_DECODE), with the tensor memory
+    allocated per call."""
+    from PIL import Image
+
+    from terravit_model import prepare_image, terravit_model
+
+    terravit_model.load()
+    side = terravit_model.input_side
+    sources = [("PNG", side), ("PNG", 2 * side), ("JPEG", 8 * side)]
+    sources = [(fmt, px, _test_images(1, px, fmt=fmt)[0]) for fmt, px in sources]
+    batch = [Image.open(io.BytesIO(data)).convert("RGB") for data in _test_images(max(args.batch_sizes), side, seed=1)]
+
+    results = []
+    saved = terravit_model._fused_preprocess, terravit_model._reduced_decode
+    try:
+        for pipeline in ("legacy", "fused"):
+            terravit_model._fused_preprocess = terravit_model._reduced_decode = pipeline == "fused"
+            for fmt, source_side, data in sources:
+                image = Image.open(io.BytesIO(data)).convert("RGB")
+                steps = [
+                    ("preprocess.image_to_patches", lambda: terravit_model._image_to_patches(image)),
+                    ("preprocess.prepare_image", lambda: prepare_image(data)),
+                ]
+                for name, fn in steps:
+                    results.append(
+                        _summary(
+                            name,
+                            _time_calls(fn, args.iterations, args.warmup),
+                            pipeline=pipeline,
+                            source_format=fmt,
+                            source_px=source_side,
+                            torch_alloc_mb=_torch_alloc_mb(fn),
+                        )
+                    )
+            for batch_size in args.batch_sizes:
+                images = batch[:batch_size]
+
+                def to_batch() -> None:
+                    terravit_model.images_to_patches(images)  # legacy: per-image patches, then one concatenation
+
+                results.append(
+                    _summary(
+                        "preprocess.batch",
+                        _time_calls(to_batch, args.iterations, args.warmup),
+                        items_per_call=batch_size,
+                        pipeline=pipeline,
+                        batch_size=batch_size,
+                        torch_alloc_mb=_torch_alloc_mb(to_batch),
+                    )
+                )
+    finally:
+        terravit_model._fused_preprocess, terravit_model._reduced_decode = saved
+    return results
+
+
+def bench_model(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    import torch
+
+    from terravit_model import terravit_model
+
+    terravit_model.load()
+    assert terravit_model._num_patches is not None and terravit_model._patch_hw is not None
+    io_dim = terravit_model._patch_hw ** 2 * 15
+    generator = torch.Generator().manual_seed(0)
+
+    results = []
+    for batch_size in args.batch_sizes:
+        patches = torch.randn(batch_size, terravit_model._num_patches, io_dim, generator=generator)
+
+        def encode() -> None:
+            with torch.no_grad(), terravit_model._autocast():
+                terravit_model._encode(patches)
+
+        results.append(
+            _summary(
+                "model.encode",
+                _time_calls(encode, args.iterations, args.warmup),
+                items_per_call=batch_size,
+                batch_size=batch_size,
+            )
+        )
+        for mode in args.modes:
+            results.append(
+                _summary(
+                    f"model.forward.{mode}",
+                    _time_calls(lambda: terravit_model._patch_outputs(patches, mode), args.iterations, args.warmup),
+                    items_per_call=batch_size,
+                    batch_size=batch_size,
+                )
+            )
+    return results
+
+
+async def _load(
+    request: Callable[[int], Awaitable[Any]],
+    total: int,
+    concurrency: int,
+) -> Dict[str, Any]:
+    """Run ``total`` requests with at most ``concurrency`` in flight; return latencies, wall time and failures."""
+    latencies: List[float] = []
+    failures: Dict[str, int] = {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            response = await request(i)
+            if response.status_code >= 400:
+                failures[str(response.status_code)] = failures.get(str(response.status_code), 0) + 1
+            else:
+                latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return {"latencies": latencies, "wall_s": time.perf_counter() - started, "failures": failures}
+
+
+def _load_summary(name: str, run: Dict[str, Any], concurrency: int, items_per_call: int = 1) -> Dict[str, Any]:
+    if not run["latencies"]:
+        return {"name": name, "concurrency": concurrency, "failures": run["failures"], "peak_rss_mb": _peak_rss_mb()}
+    return _summary(
+        name,
+        run["latencies"],
+        items_per_call=items_per_call,
+        wall_s=run["wall_s"],
+        concurrency=concurrency,
+        failures=run["failures"],
+    )
+
+
+async def _bench_api(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    import httpx
+
+    import main
+
+    main.terravit_model.load()
+    main.inference_executor.start()
+    side = main.terravit_model.input_side
+    images = _test_images(args.requests + 1, side, seed=1)
+
+    results = []
+    try:
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600.0) as client:
+            # One unmeasured request per endpoint so the first measured one doesn't pay for lazy setup
+            await client.post("/predict/image", files={"file": ("w.png", images[-1], "image/png")})
+
+            for concurrency in args.concurrency:
+
+                def predict(i: int) -> Awaitable[Any]:
+                    return client.post("/predict/image", files={"file": (f"{i}.png", images[i], "image/png")})
+
+                run = await _load(predict, args.requests, concurrency)
+                results.append(_load_summary("api.predict_image", run, concurrency))
+
+                def change(i: int) -> Awaitable[Any]:
+                    files = {
+                        "before": ("b.png", images[i], "image/png"),
+                        "after": ("a.png", images[(i + 1) % args.requests], "image/png"),
+                    }
+                    return client.post("/change/detect", params={"spatial": "true"}, files=files)
+
+                run = await _load(change, args.requests, concurrency)
+                results.append(_load_summary("api.change_detect_spatial", run, concurrency))
+    finally:
+        for batcher in main._batchers.values():
+            await batcher.close()
+        main._batchers.clear()
+        main.inference_executor.shutdown()
+    return results
+
+
+def _stub_forecast(lat: float, lon: float) -> Dict[str, Any]:
+    """Deterministic synthetic Open-Meteo hourly forecast (24 h) for one location."""
+    rng = np.random.default_rng(abs(hash((round(lat, 4), round(lon, 4)))) % (1 << 32))
+    return {
+        "latitude": lat,
+        "longitude": lon,
+        "hourly": {
+            "temperature_2m": np.round(rng.normal(22, 6, 24), 1).tolist(),
+            "precipitation": np.round(rng.exponential(0.5, 24), 2).tolist(),
+            "relativehumidity_2m": np.round(rng.uniform(20, 90, 24)).tolist(),
+        },
+    }
+
+
+def _stub_era5(lat: float, lon: float, days: int) -> Dict[str, Any]:
+    """Deterministic synthetic ERA5 daily aggregates for ``days`` days at one location."""
+    rng = np.random.default_rng(abs(hash((round(lat, 4), round(lon, 4), days))) % (1 << 32))
+    return {
+        "latitude": lat,
+        "longitude": lon,
+        "daily": {
+            "temperature_2m_max": np.round(rng.normal(25, 8, days), 1).tolist(),
+            "precipitation_sum": np.round(rng.exponential(2.0, days), 1).tolist(),
+            "relative_humidity_2m_mean": np.round(rng.uniform(20, 90, days)).tolist(),
+        },
+    }
+
+
+def _open_meteo_stub(latency_s: float) -> Any:
+    """httpx transport answering Open-Meteo forecast/ERA5 queries with :func:`_stub_forecast` / :func:`_stub_era5`."""
+    import httpx
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if latency_s:
+            await asyncio.sleep(latency_s)
+        params = request.url.params
+        lats = [float(v) for v in params["latitude"].split(",")]
+        lons = [float(v) for v in params["longitude"].split(",")]
+        if "daily" in params:
+            return httpx.Response(200, json=_stub_era5(lats[0], lons[0], 365))
+        data = [_stub_forecast(lat, lon) for lat, lon in zip(lats, lons)]
+        return httpx.Response(200, json=data if len(data) > 1 else data[0])
+
+    return httpx.MockTransport(handler)
+
+
+async def _bench_risk(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    import httpx
+
+    import main
+
+    main.open_meteo._client = httpx.AsyncClient(transport=_open_meteo_stub(args.stub_latency_ms / 1000.0))
+    results = []
+    try:
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600.0) as client:
+            for concurrency in args.concurrency:
+
+                def score(i: int) -> Awaitable[Any]:
+                    return client.post("/risk/score", json={"lat": 10.0 + i * 0.1, "lon": 20.0 + i * 0.1})
+
+                run = await _load(score, args.requests, concurrency)
+                results.append(_load_summary("api.risk_score", run, concurrency))
+
+                def history(i: int) -> Awaitable[Any]:
+                    return client.post("/risk/history", json={"lat": -10.0 - i * 0.1, "lon": 30.0 + i * 0.1})
+
+                run = await _load(history, args.requests, concurrency)
+                results.append(_load_summary("api.risk_history", run, concurrency))
+
+            # Batch scoring is one request; measure it sequentially for a 50x50 grid
+            grid = {"bbox": {"min_lat": 40, "min_lon": -5, "max_lat": 45, "max_lon": 0, "rows": 50, "cols": 50}}
+
+            async def batch(i: int) -> Any:
+                response = await client.post("/risk/score/batch", json=grid)
+                response.read()
+                return response
+
+            run = await _load(batch, max(1, args.requests // 8), 1)
+            results.append(_load_summary("api.risk_score_batch_2500", run, 1, items_per_call=2500))
+    finally:
+        await main.open_meteo.aclose()
+    return results
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix="terravit-bench-")
+    try:
+        return _run(args, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _run(args: argparse.Namespace, workdir: str) -> Dict[str, Any]:
+    weights = _random_weights(args.random_weights, workdir) if args.random_weights else args.weights
+    if not os.path.exists(weights):
+        raise SystemExit(f"Weights not found at '{weights}'; pass --weights or --random-weights V1|V2")
+
+    # Configure the service before anything reads its environment
+    os.environ.update(
+        {
+            "TERRAVIT_WEIGHTS_PATH": weights,
+            "TERRAVIT_CACHE_SIZE": "0",
+            "TERRAVIT_FORECAST_CACHE_SIZE": "0",
+            "TERRAVIT_ERA5_CACHE_PATH": "",
+            "TERRAVIT_JOB_DB": os.path.join(workdir, "jobs.sqlite3"),
+            "TERRAVIT_JOB_DIR": os.path.join(workdir, "job_data"),
+            "TERRAVIT_VECTOR_INDEX_DIR": "",
+        }
+    )
+    os.environ.pop("TERRAVIT_CACHE_DIR", None)
+
+    import torch
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    results: List[Dict[str, Any]] = []
+    for suite in args.suites:
+        started = time.perf_counter()
+        if suite == "preprocess":
+            results += bench_preprocess(args)
+        elif suite == "model":
+            results += bench_model(args)
+        elif suite == "api":
+            results += asyncio.run(_bench_api(args))
+        else:
+            results += asyncio.run(_bench_risk(args))
+        print(f"{suite}: {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    from terravit_model import terravit_model
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "torch_threads": torch.get_num_threads(),
+            "weights": os.path.basename(weights),
+            "runtime": terravit_model.runtime,
+            "precision": terravit_model.precision,
+            "iterations": args.iterations,
+            "requests": args.requests,
+        },
+        "results": results,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def _result_key(result: Dict[str, Any]) -> str:
+    params = [
+        f"{k}={result[k]}" for k in ("pipeline", "batch_size", "source_format", "source_px", "concurrency") if k in result
+    ]
+    return " ".join([result["name"], *params])
+
+
+def compare(args: argparse.Namespace) -> int:
+    """Print p50 and throughput changes between two runs; exit 1 if any p50 regressed by more than the threshold."""
+    with open(args.base, encoding="utf-8") as f:
+        base = {_result_key(r): r for r in json.load(f)["results"]}
+    with open(args.new, encoding="utf-8") as f:
+        new = {_result_key(r): r for r in json.load(f)["results"]}
+
+    regressed = False
+    print(f"{'benchmark':55} {'p50 base':>10} {'p50 new':>10} {'change':>8}")
+    for key, result in new.items():
+        before = base.get(key)
+        if before is None or "p50_ms" not in before or "p50_ms" not in result:
+            print(f"{key:55} {'-':>10} {result.get('p50_ms', '-'):>10} {'':>8}")
+            continue
+        change = result["p50_ms"] / before["p50_ms"] - 1.0 if before["p50_ms"] else 0.0
+        flag = " !" if change > args.threshold else ""
+        regressed = regressed or bool(flag)
+        print(f"{key:55} {before['p50_ms']:>10.2f} {result['p50_ms']:>10.2f} {change:>+7.1%}{flag}")
+    return 1 if regressed else 0
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("run", help="Run benchmark suites and print (or save) JSON results")
+    p.add_argument("--suites", type=lambda v: v.split(","), default=list(SUITES), help=f"Comma-separated: {','.join(SUITES)}")
+    p.add_argument("--weights", default=os.getenv("TERRAVIT_WEIGHTS_PATH", "SatViT_V2.pt"))
+    p.add_argument("--random-weights", choices=("V1", "V2"), help="Benchmark randomly initialized weights of this variant")
+    p.add_argument("--batch-sizes", type=_int_list, default=[1, 4, 8])
+    p.add_argument("--modes", type=lambda v: v.split(","), default=["encoder", "linear"])
+    p.add_argument("--iterations", type=int, default=10)
+    p.add_argument("--warmup", type=int, default=2)
+    p.add_argument("--concurrency", type=_int_list, default=[1, 8])
+    p.add_argument("--requests", type=int, default=32, help="Requests per API benchmark")
+    p.add_argument("--stub-latency-ms", type=float, default=5.0, help="Simulated Open-Meteo response time")
+    p.add_argument("--threads", type=int, default=0, help="torch intra-op threads (default: torch's choice)")
+    p.add_argument("--output", help="Write JSON here instead of stdout")
+
+    p = sub.add_parser("compare", help="Compare two result files")
+    p.add_argument("base")
+    p.add_argument("new")
+    p.add_argument("--threshold", type=float, default=0.10, help="p50 slowdown that counts as a regression")
+
+    args = parser.parse_args()
+    if args.command == "compare":
+        sys.exit(compare(args))
+
+    unknown = set(args.suites) - set(SUITES)
+    if unknown:
+        parser.error(f"Unknown suites: {', '.join(sorted(unknown))}")
+    report = json.dumps(run(args), indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
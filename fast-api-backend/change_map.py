@@ -0,0 +1,76 @@
+import base64
+import io
+from typing import Any, Dict, List
+
+import numpy as np
+import torch
+from PIL import Image
+
+
+CHANGE_METRICS = ("cosine", "l2")
+HEATMAP_FORMATS = ("png", "float16")
+
+
+def patch_distances(before_tokens: torch.Tensor, after_tokens: torch.Tensor, metric: str = "cosine") -> torch.Tensor:
+    """Per-patch distance between two token sets [..., num_patches, dim] -> [..., num_patches].
+
+    ``cosine`` is 1 - cosine similarity (0 = unchanged, up to 2); ``l2`` is
+    the Euclidean distance between the encoder tokens.
+    """
+    if metric == "cosine":
+        return 1.0 - torch.nn.functional.cosine_similarity(before_tokens, after_tokens, dim=-1)
+    if metric == "l2":
+        return torch.linalg.vector_norm(after_tokens - before_tokens, dim=-1)
+    raise ValueError(f"Unknown change metric '{metric}'; expected one of {', '.join(CHANGE_METRICS)}")
+
+
+def encode_heatmap(grid: torch.Tensor, fmt: str = "png") -> Dict[str, Any]:
+    """Encode a [grid_h, grid_w] change grid compactly as base64.
+
+    ``png``: 8-bit grayscale scaled to [min, max] (both returned for rescaling).
+    ``float16``: row-major little-endian float16 values.
+    """
+    values = grid.detach().float().cpu().numpy()
+    vmin = float(values.min()) if values.size else 0.0
+    vmax = float(values.max()) if values.size else 0.0
+
+    if fmt == "png":
+        span = vmax - vmin
+        scaled = (values - vmin) / span if span > 0 else np.zeros_like(values)
+        buf = io.BytesIO()
+        Image.fromarray(np.round(scaled * 255.0).astype(np.uint8)).save(buf, format="PNG", optimize=True)
+        data = buf.getvalue()
+    elif fmt == "float16":
+        data = values.astype("<f2").tobytes()
+    else:
+        raise ValueError(f"Unknown heatmap format '{fmt}'; expected one of {', '.join(HEATMAP_FORMATS)}")
+
+    return {
+        "format": fmt,
+        "height": int(values.shape[0]),
+        "width": int(values.shape[1]),
+        "min": vmin,
+        "max": vmax,
+        "data": base64.b64encode(data).decode("ascii"),
+    }
+
+
+def top_changed_regions(grid: torch.Tensor, k: int = 5) -> List[Dict[str, Any]]:
+    """Return the ``k`` most changed grid cells with bounding boxes as fractions of the image."""
+    grid_h, grid_w = grid.shape
+    flat = grid.detach().float().cpu().reshape(-1)
+    k = max(0, min(k, flat.numel()))
+    scores, indices = torch.topk(flat, k)
+
+    regions = []
+    for score, index in zip(scores.tolist(), indices.tolist()):
+        row, col = divmod(index, grid_w)
+        regions.append(
+            {
+                "row": row,
+                "col": col,
+                "score": score,
+                "bbox": [col / grid_w, row / grid_h, (col + 1) / grid_w, (row + 1) / grid_h],
+            }
+        )
+    return regions
@@ -0,0 +1,125 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+# Precipitation totals that map to a flood risk of 1 for each kind of series
+FORECAST_FLOOD_SCALE_MM = 50.0  # 50mm/day
+HISTORY_FLOOD_SCALE_MM = 1000.0  # 1000mm/year
+
+RISK_FIELDS = ("heat_risk", "flood_risk", "vegetation_stress", "air_quality_proxy", "overall_risk")
+
+
+def _series_matrix(series: Sequence[Optional[Sequence[Optional[float]]]]) -> np.ndarray:
+    """Pack per-location series (ragged, possibly with None gaps) into a NaN-padded float64 [N, T] matrix."""
+    length = max((len(s) for s in series if s), default=0)
+    out = np.full((len(series), length), np.nan)
+    for row, values in enumerate(series):
+        if values:
+            out[row, : len(values)] = np.array(values, dtype=np.float64)  # None -> nan
+    return out
+
+
+def _row_reduce(matrix: np.ndarray, reduce: Any, default: np.ndarray) -> np.ndarray:
+    """Row-wise NaN-ignoring reduction, falling back to ``default`` for rows without any values."""
+    valid = ~np.isnan(matrix)
+    has_values = valid.any(axis=1)
+    out = np.array(default, dtype=np.float64, copy=True)
+    if has_values.any():
+        out[has_values] = reduce(matrix[has_values], axis=1)
+    return out
+
+
+def risk_scores(
+    temps: Sequence[Optional[Sequence[Optional[float]]]],
+    precips: Sequence[Optional[Sequence[Optional[float]]]],
+    humid: Sequence[Optional[Sequence[Optional[float]]]],
+    flood_scale_mm: float = FORECAST_FLOOD_SCALE_MM,
+) -> Dict[str, np.ndarray]:
+    """Heuristic 0–1 climate risk scores for N locations at once.
+
+    Each argument holds one series per location (hourly forecast or daily
+    history values). Aggregates and scores are computed as array operations
+    over all locations; missing values are ignored and a location with no
+    values falls back to the same defaults as a single-point request.
+    Returns one [N] array per name in ``RISK_FIELDS``.
+    """
+    n = len(temps)
+    temps_m, precips_m, humid_m = _series_matrix(temps), _series_matrix(precips), _series_matrix(humid)
+
+    avg_temp = _row_reduce(temps_m, np.nanmean, np.full(n, 20.0))
+    max_temp = _row_reduce(temps_m, np.nanmax, avg_temp)
+    total_precip = _row_reduce(precips_m, np.nansum, np.zeros(n))
+    avg_humid = _row_reduce(humid_m, np.nanmean, np.full(n, 50.0))
+
+    heat_risk = np.clip((max_temp - 25.0) / 15.0, 0.0, 1.0)  # >40C -> ~1
+    flood_risk = np.clip(total_precip / flood_scale_mm, 0.0, 1.0)
+    vegetation_stress = np.clip((60.0 - avg_humid) / 40.0, 0.0, 1.0)  # very low humidity -> high stress
+    air_quality_proxy = np.clip(heat_risk * 0.5 + vegetation_stress * 0.5, 0.0, 1.0)
+
+    overall_risk = np.clip(
+        0.35 * heat_risk + 0.30 * flood_risk + 0.20 * vegetation_stress + 0.15 * air_quality_proxy,
+        0.0,
+        1.0,
+    )
+
+    return {
+        "heat_risk": heat_risk,
+        "flood_risk": flood_risk,
+        "vegetation_stress": vegetation_stress,
+        "air_quality_proxy": air_quality_proxy,
+        "overall_risk": overall_risk,
+    }
+
+
+def forecast_risk_scores(forecasts: Sequence[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """Score Open-Meteo hourly forecast responses, one per location."""
+    hourly = [f.get("hourly", {}) for f in forecasts]
+    return risk_scores(
+        [h.get("temperature_2m") for h in hourly],
+        [h.get("precipitation") for h in hourly],
+        [h.get("relativehumidity_2m") for h in hourly],
+        FORECAST_FLOOD_SCALE_MM,
+    )
+
+
+def history_risk_scores(years: Sequence[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """Score Open-Meteo ERA5 daily responses, one per year."""
+    daily = [y.get("daily", {}) for y in years]
+    return risk_scores(
+        [d.get("temperature_2m_max") for d in daily],
+        [d.get("precipitation_sum") for d in daily],
+        [d.get("relative_humidity_2m_mean") for d in daily],
+        HISTORY_FLOOD_SCALE_MM,
+    )
+
+
+def scores_at(scores: Dict[str, np.ndarray], index: int) -> Dict[str, float]:
+    """Plain-float scores of one location out of a :func:`risk_scores` result."""
+    return {name: float(scores[name][index]) for name in RISK_FIELDS}
+
+
+def risk_summary(scores: Dict[str, float]) -> str:
+    return (
+        "Climate risk snapshot: "
+        f"overall={scores['overall_risk']:.2f}, heat={scores['heat_risk']:.2f}, "
+        f"flood={scores['flood_risk']:.2f}, vegetation_stress={scores['vegetation_stress']:.2f}."
+    )
+
+
+def grid_points(
+    min_lat: float,
+    min_lon: float,
+    max_lat: float,
+    max_lon: float,
+    rows: int,
+    cols: int,
+) -> List[Tuple[float, float]]:
+    """Row-major (lat, lon) cell centres of a ``rows`` x ``cols`` grid over a bounding box."""
+    if min_lat > max_lat or min_lon > max_lon:
+        raise ValueError("Bounding box minimums must not exceed its maximums.")
+    lat_step = (max_lat - min_lat) / rows
+    lon_step = (max_lon - min_lon) / cols
+    lats = min_lat + lat_step * (np.arange(rows) + 0.5)
+    lons = min_lon + lon_step * (np.arange(cols) + 0.5)
+    return [(float(lat), float(lon)) for lat in lats for lon in lons]
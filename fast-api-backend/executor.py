@@ -0,0 +1,196 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import BrokenExecutor, Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional
+
+import torch
+
+
+EXECUTOR_KINDS = ("thread", "process")
+
+
+class ExecutorBusyError(Exception):
+    """Raised when a request cannot be admitted; carries the HTTP status and Retry-After hint."""
+
+    def __init__(self, message: str, status_code: int, retry_after: float) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def configure_torch_threads(num_threads: Optional[int], num_interop_threads: Optional[int]) -> None:
+    """Apply explicit torch intra-op / inter-op thread counts in the current process."""
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    if num_interop_threads:
+        try:
+            torch.set_num_interop_threads(num_interop_threads)
+        except RuntimeError:
+            # Can only be set before the first inter-op parallel work in this process
+            pass
+
+
+def _init_process_worker(num_threads: Optional[int], num_interop_threads: Optional[int]) -> None:
+    configure_torch_threads(num_threads, num_interop_threads)
+    # Load weights once per worker instead of on its first request
+    from terravit_model import terravit_model
+
+    terravit_model.load()
+
+
+def _optional_int(name: str) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value else None
+
+
+class InferenceExecutor:
+    """Bounded worker pool for blocking image decoding and model inference.
+
+    Work is submitted with ``await run(fn, ...)`` so it never blocks the
+    event loop. With ``kind="process"`` callables must be picklable
+    (module-level functions); each worker loads its own model copy.
+
+    Admission control is separate from execution: request handlers wrap
+    their work in ``admit(cost)``, which fails fast with a 429 once
+    ``max_pending`` units of work are in flight, rather than letting queueing
+    latency grow without bound.
+    """
+
+    def __init__(
+        self,
+        kind: str = "thread",
+        max_workers: int = 2,
+        max_pending: int = 32,
+        num_threads: Optional[int] = None,
+        num_interop_threads: Optional[int] = None,
+        retry_after: float = 1.0,
+    ) -> None:
+        if kind not in EXECUTOR_KINDS:
+            raise ValueError(f"Unknown executor kind '{kind}'; expected one of {', '.join(EXECUTOR_KINDS)}")
+
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.num_threads = num_threads
+        self.num_interop_threads = num_interop_threads
+        self.retry_after = retry_after
+
+        self._pool: Optional[Executor] = None
+        self._closed = False
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._rejected = 0
+
+    @classmethod
+    def from_env(cls) -> "InferenceExecutor":
+        return cls(
+            kind=os.getenv("TERRAVIT_EXECUTOR", "thread"),
+            max_workers=int(os.getenv("TERRAVIT_EXECUTOR_WORKERS", "2")),
+            max_pending=int(os.getenv("TERRAVIT_MAX_PENDING", "32")),
+            num_threads=_optional_int("TERRAVIT_TORCH_THREADS"),
+            num_interop_threads=_optional_int("TERRAVIT_TORCH_INTEROP_THREADS"),
+            retry_after=float(os.getenv("TERRAVIT_RETRY_AFTER_S", "1")),
+        )
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "pending": self._pending,
+            "rejected": self._rejected,
+            "torch_threads": torch.get_num_threads(),
+            "torch_interop_threads": torch.get_num_interop_threads(),
+        }
+
+    def start(self) -> None:
+        """Create the worker pool (and apply thread settings) if not already running."""
+        with self._lock:
+            if self._pool is not None:
+                return
+            self._closed = False
+            if self.kind == "thread":
+                configure_torch_threads(self.num_threads, self.num_interop_threads)
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="terravit")
+            else:
+                # fork() after torch has started its thread pools can deadlock; always spawn
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_process_worker,
+                    initargs=(self.num_threads, self.num_interop_threads),
+                )
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._closed = True
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def _reserve(self, cost: int, count_rejection: bool = True) -> None:
+        with self._lock:
+            if self._closed:
+                raise ExecutorBusyError("Inference workers are shutting down.", 503, self.retry_after)
+            if self._pending + cost > self.max_pending:
+                if count_rejection:
+                    self._rejected += 1
+                raise ExecutorBusyError("Inference queue is full, retry later.", 429, self.retry_after)
+            self._pending += cost
+
+    def _release(self, cost: int) -> None:
+        with self._lock:
+            self._pending -= cost
+
+    @contextmanager
+    def admit(self, cost: int = 1) -> Iterator[None]:
+        """Reserve ``cost`` slots for the duration of a request or raise ExecutorBusyError."""
+        self._reserve(cost)
+        try:
+            yield
+        finally:
+            self._release(cost)
+
+    @asynccontextmanager
+    async def admit_waiting(self, cost: int = 1, poll_s: float = 0.02) -> AsyncIterator[None]:
+        """Like :meth:`admit`, but wait for free slots instead of raising 429.
+
+        For long-running streams that already hold a response open, where
+        backpressure is better than failing midway. Still raises 503 once the
+        pool is shutting down; ``cost`` is capped at ``max_pending``.
+        """
+        cost = min(cost, self.max_pending)
+        while True:
+            try:
+                self._reserve(cost, count_rejection=False)
+                break
+            except ExecutorBusyError as exc:
+                if exc.status_code != 429:
+                    raise
+                await asyncio.sleep(poll_s)
+        try:
+            yield
+        finally:
+            self._release(cost)
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run ``fn(*args, **kwargs)`` on the pool and await its result."""
+        if self._closed:
+            raise ExecutorBusyError("Inference workers are shutting down.", 503, self.retry_after)
+        if self._pool is None:
+            self.start()
+        assert self._pool is not None
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._pool, functools.partial(fn, *args, **kwargs))
+        except BrokenExecutor as exc:
+            # A process worker died (e.g. OOM-killed); the pool cannot accept more work
+            raise ExecutorBusyError("Inference workers are unavailable.", 503, self.retry_after) from exc
@@ -0,0 +1,209 @@
+"""Build exported model artifacts and compare their startup / latency with eager mode.
+
+    python export_model.py export --output SatViT_V2.encoder.pt2
+    python export_model.py benchmark --artifact SatViT_V2.encoder.pt2 --compile
+    python export_model.py convert-weights --weights SatViT_V2.pt --output SatViT_V2.safetensors
+
+The service serves an artifact with TERRAVIT_MODEL_ARTIFACT=<path> (see
+terravit_model.RUNTIMES). Artifacts are tied to the weights, inference mode
+and torch version they were exported with; re-export after changing any of them.
+"""
+import time
+
+_STARTED = time.perf_counter()
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+import torch
+
+from model_artifact import (
+    ARTIFACT_MODES,
+    InferenceGraph,
+    artifact_format,
+    export_artifact,
+    load_artifact,
+    load_metadata,
+    save_metadata,
+)
+from terravit_model import TerraViTModel
+
+try:  # Optional: .safetensors weights
+    from safetensors.torch import save_file as save_safetensors
+except ImportError:  # pragma: no cover - depends on the environment
+    save_safetensors = None
+
+
+def _eager_model(weights: str) -> TerraViTModel:
+    # Exports always start from the fp32 eager model, whatever the service is configured with
+    os.environ.update(
+        {
+            "TERRAVIT_WEIGHTS_PATH": weights,
+            "TERRAVIT_PRECISION": "fp32",
+            "TERRAVIT_MODEL_ARTIFACT": "",
+            "TERRAVIT_TORCH_COMPILE": "0",
+        }
+    )
+    model = TerraViTModel()
+    model.load()
+    return model
+
+
+def convert_weights(args: argparse.Namespace) -> Dict[str, Any]:
+    """Re-save a checkpoint in a format the service can memory-map (.safetensors, or zip-format .pt)."""
+    os.environ.update({"TERRAVIT_WEIGHTS_PATH": args.weights, "TERRAVIT_WEIGHTS_MMAP": "0"})
+    state_dict = {k: v.contiguous() for k, v in TerraViTModel().read_state_dict().items()}
+
+    if args.output.endswith(".safetensors"):
+        if save_safetensors is None:
+            raise SystemExit("Writing .safetensors weights requires the optional safetensors package")
+        save_safetensors(state_dict, args.output)
+    else:
+        torch.save(state_dict, args.output)
+    return {"weights": args.output, "tensors": len(state_dict), "bytes": os.path.getsize(args.output)}
+
+
+def _random_patches(model: TerraViTModel, batch_size: int, seed: int = 0) -> torch.Tensor:
+    assert model._num_patches is not None and model._patch_hw is not None and model._num_channels is not None
+    generator = torch.Generator().manual_seed(seed)
+    io_dim = model._patch_hw * model._patch_hw * model._num_channels
+    return torch.randn(batch_size, model._num_patches, io_dim, generator=generator).to(model._device)
+
+
+def export(args: argparse.Namespace) -> Dict[str, Any]:
+    model = _eager_model(args.weights)
+    satvit = model._eager_model()
+    graph = InferenceGraph(satvit, args.mode).eval()
+
+    started = time.perf_counter()
+    export_artifact(graph, _random_patches(model, 2), args.output)
+    export_s = time.perf_counter() - started
+
+    # Validate on a batch size the export did not see
+    check = _random_patches(model, 3, seed=1)
+    with torch.no_grad():
+        ref_logits, ref_tokens = graph(check)
+        logits, tokens = load_artifact(args.output, model._device)(check)
+
+    metadata = {
+        "format": artifact_format(args.output),
+        "mode": args.mode,
+        "weights": os.path.basename(args.weights),
+        "patch_hw": model._patch_hw,
+        "num_patches": model._num_patches,
+        "num_channels": model._num_channels,
+        "encoder_dim": satvit.encoder_dim,
+        "torch_version": torch.__version__,
+        "export_s": round(export_s, 3),
+        "max_abs_logit_diff": float((logits - ref_logits).abs().max()),
+        "max_abs_token_diff": float((tokens - ref_tokens).abs().max()),
+    }
+    save_metadata(args.output, metadata)
+    return metadata
+
+
+def _measure(args: argparse.Namespace) -> Dict[str, Any]:
+    """Runs in a fresh interpreter per variant, so load and first-call times are real cold starts."""
+    imported = time.perf_counter()
+    model = TerraViTModel()
+
+    started = time.perf_counter()
+    model.load()
+    loaded = time.perf_counter()
+
+    patches = _random_patches(model, args.batch_size)
+    model._patch_outputs(patches, args.mode)
+    first = time.perf_counter()
+
+    latencies: List[float] = []
+    for _ in range(args.iterations):
+        t = time.perf_counter()
+        model._patch_outputs(patches, args.mode)
+        latencies.append((time.perf_counter() - t) * 1000.0)
+    latencies.sort()
+
+    return {
+        "runtime": model.runtime,
+        "mode": args.mode,
+        "batch_size": args.batch_size,
+        "import_s": round(imported - _STARTED, 3),
+        "load_s": round(loaded - started, 3),
+        "first_inference_s": round(first - loaded, 3),
+        "cold_start_s": round(first - _STARTED, 3),
+        "steady_median_ms": round(statistics.median(latencies), 1),
+        "steady_p95_ms": round(latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))], 1),
+    }
+
+
+def benchmark(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    base_env = {**os.environ, "TERRAVIT_WEIGHTS_PATH": args.weights, "TERRAVIT_PRECISION": "fp32"}
+    mode = load_metadata(args.artifact)["mode"] if args.artifact else args.mode
+
+    variants = {"eager": {"TERRAVIT_MODEL_ARTIFACT": "", "TERRAVIT_TORCH_COMPILE": "0"}}
+    if args.artifact:
+        variants["artifact"] = {"TERRAVIT_MODEL_ARTIFACT": args.artifact, "TERRAVIT_TORCH_COMPILE": "0"}
+    if args.compile:
+        variants["compiled"] = {"TERRAVIT_MODEL_ARTIFACT": "", "TERRAVIT_TORCH_COMPILE": "1"}
+
+    results = []
+    for name, env in variants.items():
+        command = [
+            sys.executable,
+            os.path.abspath(__file__),
+            "_measure",
+            "--mode",
+            mode,
+            "--batch-size",
+            str(args.batch_size),
+            "--iterations",
+            str(args.iterations),
+        ]
+        out = subprocess.run(command, env={**base_env, **env}, check=True, capture_output=True, text=True)
+        results.append({"variant": name, **json.loads(out.stdout.strip().splitlines()[-1])})
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("export", help="Export the inference graph to a .ts (TorchScript), .pt2 (torch.export) or .onnx file")
+    p.add_argument("--output", required=True)
+    p.add_argument("--mode", choices=ARTIFACT_MODES, default="encoder")
+    p.add_argument("--weights", default=os.getenv("TERRAVIT_WEIGHTS_PATH", "SatViT_V2.pt"))
+
+    p = sub.add_parser("benchmark", help="Cold start and steady-state latency of eager vs artifact vs torch.compile")
+    p.add_argument("--artifact")
+    p.add_argument("--compile", action="store_true")
+    p.add_argument("--mode", choices=ARTIFACT_MODES, default="encoder")
+    p.add_argument("--weights", default=os.getenv("TERRAVIT_WEIGHTS_PATH", "SatViT_V2.pt"))
+    p.add_argument("--batch-size", type=int, default=4)
+    p.add_argument("--iterations", type=int, default=10)
+
+    p = sub.add_parser("convert-weights", help="Re-save weights as .safetensors or zip-format .pt for memory-mapped loading")
+    p.add_argument("--output", required=True)
+    p.add_argument("--weights", default=os.getenv("TERRAVIT_WEIGHTS_PATH", "SatViT_V2.pt"))
+
+    p = sub.add_parser("_measure")
+    p.add_argument("--mode", default="encoder")
+    p.add_argument("--batch-size", type=int, default=4)
+    p.add_argument("--iterations", type=int, default=10)
+
+    args = parser.parse_args()
+    if args.command == "export":
+        print(json.dumps(export(args), indent=2))
+    elif args.command == "benchmark":
+        print(json.dumps(benchmark(args), indent=2))
+    elif args.command == "convert-weights":
+        print(json.dumps(convert_weights(args), indent=2))
+    else:
+        print(json.dumps(_measure(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+import asyncio
+import json
+import os
+import time
+import warnings
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+try:  # Optional: shared cache across workers/replicas
+    import redis.asyncio as redis_asyncio
+except ImportError:  # pragma: no cover - depends on the environment
+    redis_asyncio = None
+
+
+class ForecastCache:
+    """Short-TTL cache of Open-Meteo forecast responses with in-flight request coalescing.
+
+    Keys combine lat/lon rounded to ``precision`` decimals, the forecast
+    length and the current UTC hour, so nearby calls within the same forecast
+    hour share one entry and entries roll over when the hour does.
+    Concurrent misses for the same key share a single upstream fetch. With
+    ``redis_url`` set (needs the optional ``redis`` package), entries are
+    also stored in Redis so several workers share them; Redis errors are
+    treated as misses.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 4096,
+        ttl_s: float = 600.0,
+        precision: int = 2,
+        redis_url: Optional[str] = None,
+        key_prefix: str = "terravit:forecast:",
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.precision = precision
+        self.key_prefix = key_prefix
+
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._inflight: Dict[str, "asyncio.Future[Dict[str, Any]]"] = {}
+        self._batch_loads: Set["asyncio.Task[None]"] = set()  # referenced until done, so they are not collected
+
+        self._redis: Any = None
+        if redis_url:
+            if redis_asyncio is None:
+                warnings.warn(
+                    "TERRAVIT_FORECAST_CACHE_REDIS_URL is set but redis is not installed; "
+                    "using the in-process forecast cache only"
+                )
+            else:
+                self._redis = redis_asyncio.from_url(redis_url)
+
+        self._hits = 0
+        self._shared_hits = 0
+        self._coalesced = 0
+        self._misses = 0
+        self._evictions = 0
+        self._shared_errors = 0
+
+    @classmethod
+    def from_env(cls) -> "ForecastCache":
+        return cls(
+            max_entries=int(os.getenv("TERRAVIT_FORECAST_CACHE_SIZE", "4096")),
+            ttl_s=float(os.getenv("TERRAVIT_FORECAST_CACHE_TTL_S", "600")),
+            precision=int(os.getenv("TERRAVIT_FORECAST_CACHE_PRECISION", "2")),
+            redis_url=os.getenv("TERRAVIT_FORECAST_CACHE_REDIS_URL") or None,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def round_coord(self, value: float) -> float:
+        return round(value, self.precision)
+
+    def key(self, lat: float, lon: float, forecast_days: int = 1) -> str:
+        hour = datetime.now(timezone.utc).strftime("%Y%m%d%H")
+        return f"{self.round_coord(lat)}:{self.round_coord(lon)}:{forecast_days}:{hour}"
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._hits + self._shared_hits + self._coalesced + self._misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl_s,
+            "shared_backend": "redis" if self._redis is not None else None,
+            "inflight": len(self._inflight),
+            "hits": self._hits,
+            "shared_hits": self._shared_hits,
+            "coalesced": self._coalesced,
+            "misses": self._misses,
+            "evictions": self._evictions,
+            "shared_errors": self._shared_errors,
+            "hit_rate": (self._hits + self._shared_hits + self._coalesced) / lookups if lookups else 0.0,
+        }
+
+    def peek(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return an unexpired in-process entry (counted as a hit), or None without counting a miss."""
+        if not self.enabled:
+            return None
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, data = entry
+        if time.monotonic() >= expires:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        self._hits += 1
+        return data
+
+    def put(self, key: str, data: Dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_s, data)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    async def get_or_fetch(self, key: str, fetch: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Return the cached forecast for ``key``, joining an in-flight fetch or starting ``fetch()``.
+
+        The fetch runs as its own task, so a caller that disconnects does not
+        cancel it for the others waiting on the same key. Errors are not
+        cached; every waiter of a failed fetch sees its exception.
+        """
+        if not self.enabled:
+            self._misses += 1
+            return await fetch()
+
+        data = self.peek(key)
+        if data is not None:
+            return data
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self._coalesced += 1
+        else:
+            task = asyncio.ensure_future(self._load(key, fetch))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        return await asyncio.shield(task)
+
+    async def get_or_fetch_many(
+        self, keys: Sequence[str], fetch: Callable[[List[int]], Awaitable[List[Dict[str, Any]]]]
+    ) -> List[Dict[str, Any]]:
+        """Like :meth:`get_or_fetch` for several keys, returning their forecasts in order.
+
+        Keys that are neither cached nor in flight are registered as in flight
+        and, unless Redis has them, loaded with one ``fetch(positions)`` call
+        that returns forecasts for those positions of ``keys``. Single lookups
+        join this load and this call joins theirs. The load runs as its own
+        task; if it fails, every waiter on its keys sees the exception.
+        """
+        if not self.enabled:
+            self._misses += len(keys)
+            return await fetch(list(range(len(keys))))
+
+        waits: List["asyncio.Future[Dict[str, Any]]"] = []
+        claimed: List[int] = []
+        loop = asyncio.get_running_loop()
+        for i, key in enumerate(keys):
+            data = self.peek(key)
+            task = self._inflight.get(key)
+            if data is not None:
+                task = loop.create_future()
+                task.set_result(data)
+            elif task is not None:
+                self._coalesced += 1
+            else:
+                task = loop.create_future()
+                self._inflight[key] = task
+                task.add_done_callback(lambda t, key=key: self._finish(key, t))
+                claimed.append(i)
+            waits.append(task)
+
+        if claimed:
+            load = asyncio.ensure_future(self._load_many(keys, claimed, [waits[i] for i in claimed], fetch))
+            self._batch_loads.add(load)
+            load.add_done_callback(self._batch_loads.discard)
+        return list(await asyncio.gather(*(asyncio.shield(task) for task in waits)))
+
+    async def _load_many(
+        self,
+        keys: Sequence[str],
+        claimed: List[int],
+        futures: List["asyncio.Future[Dict[str, Any]]"],
+        fetch: Callable[[List[int]], Awaitable[List[Dict[str, Any]]]],
+    ) -> None:
+        try:
+            shared = await asyncio.gather(*(self._shared_get(keys[i]) for i in claimed))
+            missing = []
+            for i, future, data in zip(claimed, futures, shared):
+                if data is None:
+                    missing.append((i, future))
+                    continue
+                self._shared_hits += 1
+                self.put(keys[i], data)
+                future.set_result(data)
+            if not missing:
+                return
+            self._misses += len(missing)
+            fetched = await fetch([i for i, _ in missing])
+            for (i, future), data in zip(missing, fetched):
+                self.put(keys[i], data)
+                future.set_result(data)
+            await asyncio.gather(*(self._shared_put(keys[i], data) for (i, _), data in zip(missing, fetched)))
+        except asyncio.CancelledError:
+            for future in futures:
+                future.cancel()
+            raise
+        except Exception as exc:  # noqa: BLE001 - handed to the waiters
+            for future in futures:
+                if not future.done():
+                    future.set_exception(exc)
+
+    async def _load(self, key: str, fetch: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        data = await self._shared_get(key)
+        if data is not None:
+            self._shared_hits += 1
+        else:
+            self._misses += 1
+            data = await fetch()
+            await self._shared_put(key, data)
+        self.put(key, data)
+        return data
+
+    def _finish(self, key: str, task: "asyncio.Future[Dict[str, Any]]") -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved even if every waiter went away
+            task.exception()
+
+    async def _shared_get(self, key: str) -> Optional[Dict[str, Any]]:
+        if self._redis is None:
+            return None
+        try:
+            raw = await self._redis.get(self.key_prefix + key)
+        except Exception:  # noqa: BLE001
+            self._shared_errors += 1
+            return None
+        return json.loads(raw) if raw else None
+
+    async def _shared_put(self, key: str, data: Dict[str, Any]) -> None:
+        if self._redis is None:
+            return
+        try:
+            await self._redis.set(self.key_prefix + key, json.dumps(data), ex=max(1, int(self.ttl_s)))
+        except Exception:  # noqa: BLE001
+            self._shared_errors += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    async def aclose(self) -> None:
+        if self._redis is not None:
+            await self._redis.aclose()
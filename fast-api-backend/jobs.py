@@ -0,0 +1,337 @@
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from executor import InferenceExecutor
+from tiling import analyze_raster, analyze_scene, tiled_summary
+
+
+JOB_KINDS = ("tiled", "raster")
+JOB_STATUSES = ("queued", "running", "succeeded", "failed", "cancelled")
+TERMINAL_STATUSES = ("succeeded", "failed", "cancelled")
+
+_COLUMNS = (
+    "id, kind, status, priority, progress, windows_done, windows_total, "
+    "created_at, started_at, finished_at, error, cancel_requested"
+)
+
+
+class JobCancelled(Exception):
+    """Raised from a progress callback to stop a running job."""
+
+
+class JobStore:
+    """SQLite-backed job records, so queued work and results survive restarts.
+
+    Each job row holds its parameters, the paths of its saved inputs,
+    progress, and the JSON result once finished. Claiming a job is a
+    conditional UPDATE, so several workers can share one database file.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, priority INTEGER NOT NULL,"
+                " params TEXT NOT NULL, inputs TEXT NOT NULL, progress REAL NOT NULL DEFAULT 0,"
+                " windows_done INTEGER NOT NULL DEFAULT 0, windows_total INTEGER NOT NULL DEFAULT 0,"
+                " created_at REAL NOT NULL, started_at REAL, finished_at REAL,"
+                " error TEXT, result TEXT, cancel_requested INTEGER NOT NULL DEFAULT 0)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority DESC, created_at)")
+
+    def create(
+        self, job_id: str, kind: str, priority: int, params: Dict[str, Any], inputs: Dict[str, Any]
+    ) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, status, priority, params, inputs, created_at)"
+                " VALUES (?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, kind, priority, json.dumps(params), json.dumps(inputs), time.time()),
+            )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list(self, status: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        query = f"SELECT {_COLUMNS} FROM jobs"
+        args: List[Any] = []
+        if status is not None:
+            query += " WHERE status = ?"
+            args.append(status)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        args.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, args).fetchall()
+        return [dict(row) for row in rows]
+
+    def result(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT result FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row["result"]) if row and row["result"] else None
+
+    def claim_next(self) -> Optional[Dict[str, Any]]:
+        """Mark the highest-priority, oldest queued job as running and return it with params/inputs."""
+        while True:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE status = 'queued' ORDER BY priority DESC, created_at LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    return None
+                with self._conn:
+                    claimed = self._conn.execute(
+                        "UPDATE jobs SET status = 'running', started_at = ? WHERE id = ? AND status = 'queued'",
+                        (time.time(), row["id"]),
+                    ).rowcount
+                if claimed:
+                    job = self._conn.execute(
+                        f"SELECT {_COLUMNS}, params, inputs FROM jobs WHERE id = ?", (row["id"],)
+                    ).fetchone()
+                    job = dict(job)
+                    job["params"] = json.loads(job["params"])
+                    job["inputs"] = json.loads(job["inputs"])
+                    return job
+            # Another worker claimed it first; try the next one
+
+    def set_progress(self, job_id: str, done: int, total: int) -> bool:
+        """Record progress; returns True if cancellation has been requested."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET windows_done = ?, windows_total = ?, progress = ? WHERE id = ?",
+                (done, total, done / total if total else 0.0, job_id),
+            )
+            row = self._conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row["cancel_requested"])
+
+    def finish(
+        self,
+        job_id: str,
+        status: str,
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+    ) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, result = ?, error = ?,"
+                " progress = CASE WHEN ? = 'succeeded' THEN 1.0 ELSE progress END WHERE id = ?",
+                (status, time.time(), json.dumps(result) if result is not None else None, error, status, job_id),
+            )
+
+    def cancel(self, job_id: str) -> Optional[str]:
+        """Cancel a queued job now, or flag a running one; returns the resulting status (None if unknown)."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ?, cancel_requested = 1"
+                " WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id),
+            )
+            self._conn.execute(
+                "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,)
+            )
+            row = self._conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row["status"] if row else None
+
+    def cancel_requested(self, job_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row["cancel_requested"])
+
+    def requeue_running(self) -> int:
+        """Put jobs interrupted by a restart back in the queue (or finish them if they were being cancelled)."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ?"
+                " WHERE status = 'running' AND cancel_requested = 1",
+                (time.time(),),
+            )
+            return self._conn.execute(
+                "UPDATE jobs SET status = 'queued', started_at = NULL, progress = 0, windows_done = 0"
+                " WHERE status = 'running'"
+            ).rowcount
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        counts = {status: 0 for status in JOB_STATUSES}
+        counts.update({row["status"]: row["n"] for row in rows})
+        return counts
+
+
+def run_job(
+    kind: str,
+    inputs: Dict[str, Any],
+    params: Dict[str, Any],
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> Dict[str, Any]:
+    """Execute one job on the global model (or ``params["model"]``) and return its TiledSceneResponse-shaped result.
+
+    Module-level so it can run on process-pool workers (there ``progress`` is
+    None, since callbacks cannot cross processes).
+    """
+    if kind == "tiled":
+        result = analyze_scene(
+            inputs["file"],
+            inputs.get("after"),
+            params["mode"],
+            params["overlap"],
+            params["batch_size"],
+            progress,
+            params.get("model"),
+        )
+        return {**result, "summary": tiled_summary(result)}
+
+    if kind == "raster":
+        result = analyze_raster(
+            inputs["file"],
+            inputs.get("file_name"),
+            inputs.get("after"),
+            inputs.get("after_name"),
+            params["mode"],
+            params["overlap"],
+            params["batch_size"],
+            params["normalize"],
+            progress,
+            params.get("model"),
+        )
+        return {**result, "summary": tiled_summary(result, "raster")}
+
+    raise ValueError(f"Unknown job kind '{kind}'; expected one of {', '.join(JOB_KINDS)}")
+
+
+class JobManager:
+    """Background workers that run queued jobs from a :class:`JobStore` on the inference executor.
+
+    Jobs run through the same executor (and loaded model) as interactive
+    requests, one admission slot each, so they queue behind live traffic
+    rather than starving it. With a thread executor, progress is reported
+    per batch of windows and running jobs stop at the next batch when
+    cancelled; with a process executor, a cancelled running job finishes its
+    current computation and its result is discarded. Store reads and writes
+    made from the event loop run in a thread, so a slow disk never stalls it.
+    """
+
+    def __init__(
+        self,
+        executor: InferenceExecutor,
+        db_path: str = "jobs.sqlite3",
+        data_dir: str = "job_data",
+        workers: int = 1,
+        poll_s: float = 1.0,
+    ) -> None:
+        self.executor = executor
+        self.data_dir = data_dir
+        self.workers = workers
+        self.poll_s = poll_s
+        self.store = JobStore(db_path)
+
+        self._tasks: List["asyncio.Task[None]"] = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    @classmethod
+    def from_env(cls, executor: InferenceExecutor) -> "JobManager":
+        return cls(
+            executor,
+            db_path=os.getenv("TERRAVIT_JOB_DB", "jobs.sqlite3"),
+            data_dir=os.getenv("TERRAVIT_JOB_DIR", "job_data"),
+            workers=int(os.getenv("TERRAVIT_JOB_WORKERS", "1")),
+        )
+
+    def new_job(self) -> Tuple[str, str]:
+        """Reserve a job id and create the directory its inputs are saved to before :meth:`submit`."""
+        job_id = uuid.uuid4().hex
+        os.makedirs(self.job_dir(job_id), exist_ok=True)
+        return job_id, self.job_dir(job_id)
+
+    def job_dir(self, job_id: str) -> str:
+        return os.path.join(self.data_dir, job_id)
+
+    async def submit(
+        self, job_id: str, kind: str, priority: int, params: Dict[str, Any], inputs: Dict[str, Any]
+    ) -> None:
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind '{kind}'; expected one of {', '.join(JOB_KINDS)}")
+        await asyncio.to_thread(self.store.create, job_id, kind, priority, params, inputs)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        os.makedirs(self.data_dir, exist_ok=True)
+        self.store.requeue_running()
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Jobs cut off here are still 'running' and are requeued by the next start()
+
+    async def cancel(self, job_id: str) -> Optional[str]:
+        status = await asyncio.to_thread(self.store.cancel, job_id)
+        if status == "cancelled":
+            await asyncio.to_thread(self._cleanup_inputs, job_id)
+        return status
+
+    def stats(self) -> Dict[str, Any]:
+        return {"workers": len(self._tasks), **self.store.counts()}
+
+    async def _worker(self) -> None:
+        assert self._wakeup is not None
+        while True:
+            job = await asyncio.to_thread(self.store.claim_next)
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_s)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    def _progress_callback(self, job_id: str) -> Optional[Callable[[int, int], None]]:
+        if self.executor.kind != "thread":
+            return None
+
+        def progress(done: int, total: int) -> None:
+            if self.store.set_progress(job_id, done, total):
+                raise JobCancelled(job_id)
+
+        return progress
+
+    async def _run(self, job: Dict[str, Any]) -> None:
+        job_id = job["id"]
+        progress = self._progress_callback(job_id)
+        try:
+            async with self.executor.admit_waiting(1):
+                result = await self.executor.run(run_job, job["kind"], job["inputs"], job["params"], progress)
+        except JobCancelled:
+            await asyncio.to_thread(self.store.finish, job_id, "cancelled")
+        except Exception as exc:  # noqa: BLE001
+            # Cancellation of the worker task itself (shutdown) is not caught here: the job stays
+            # 'running' and is requeued by the next start()
+            await asyncio.to_thread(self.store.finish, job_id, "failed", error=str(exc) or type(exc).__name__)
+        else:
+            if await asyncio.to_thread(self.store.cancel_requested, job_id):
+                await asyncio.to_thread(self.store.finish, job_id, "cancelled")
+            else:
+                await asyncio.to_thread(self.store.finish, job_id, "succeeded", result=result)
+        await asyncio.to_thread(self._cleanup_inputs, job_id)
+
+    def _cleanup_inputs(self, job_id: str) -> None:
+        shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
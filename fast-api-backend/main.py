@@ -1,22 +1,78 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Dict, List
-from datetime import datetime
-from PIL import Image
-import io
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from typing import Any, AsyncIterator, Dict, Iterator, List, Literal, Optional, Sequence, Set, Tuple
+from datetime import datetime, timezone
+import asyncio
+import base64
+import contextlib
+import functools
+import math
+import os
+import shutil
+import tempfile
+import time
+import weakref
 import httpx
+import torch
 
 from schemas import (
     PredictionResponse,
+    BatchPredictionItem,
     HealthResponse,
+    BatchingMetricsResponse,
+    ExecutorStats,
+    CacheStats,
+    ForecastCacheStats,
     ClimateRiskRequest,
     ClimateRiskResponse,
     ClimateRiskScores,
     ClimateRiskHistoryYear,
     ClimateRiskHistoryResponse,
+    ClimateRiskBatchRequest,
+    ClimateRiskBatchItem,
     ChangeDetectResponse,
+    ChangeSeriesResponse,
+    SeriesAcquisition,
+    SeriesStep,
+    SiteStoreStats,
+    TiledSceneResponse,
+    JobStatus,
+    JobListResponse,
+    JobStats,
+    EmbeddingResponse,
+    SimilarTile,
+    SimilarSearchResponse,
+    VectorIndexStats,
+    ProfilerStatus,
+    ModelRegistryStats,
+)
+from archive_io import ARCHIVE_EXTENSIONS, ArchiveItem, archive_kind, iter_archive_images
+from batching import MicroBatcher
+from climate_risk import forecast_risk_scores, grid_points, history_risk_scores, risk_summary, scores_at
+from change_map import encode_heatmap, top_changed_regions
+from executor import ExecutorBusyError, InferenceExecutor
+from jobs import TERMINAL_STATUSES, JobManager
+from model_registry import model_registry
+from open_meteo import OpenMeteoClient
+from result_cache import CachedResult, ResultCache
+from raster_io import RASTER_EXTENSIONS
+from site_store import SiteSeries, SiteStore
+from response_codec import ARRAY_DTYPES, RESPONSE_FORMATS, encode_response, negotiate_format
+from telemetry import CONTENT_TYPE, REGISTRY, STAGE_SECONDS, MetricsMiddleware, ProfilerCapture, stage
+from tiling import analyze_raster, analyze_scene, tiled_summary
+from vector_index import VectorIndex
+from terravit_model import (
+    INFERENCE_MODES,
+    batch_outputs,
+    decode_image,
+    encode_tokens,
+    images_to_patches,
+    patch_change,
+    prepare_image,
+    resolve_inference_mode,
+    terravit_model,
 )
-from terravit_model import terravit_model
 
 app = FastAPI(
     title="TerraViT Backend API",
@@ -33,11 +89,231 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# torch.profiler captures of upcoming inference requests, armed via POST /admin/profile
+profiler_capture = ProfilerCapture.from_env()
+ADMIN_TOKEN = os.getenv("TERRAVIT_ADMIN_TOKEN")
+
+# Request latency / in-flight metrics for GET /metrics; outermost so CORS handling is timed too
+app.add_middleware(
+    MetricsMiddleware,
+    profiler=profiler_capture,
+    profiled_prefixes=("/predict", "/change", "/embed", "/search"),
+)
+
+# Per-endpoint inference modes (see terravit_model.INFERENCE_MODES); a request can override via ?mode=
+PREDICT_MODE_ENV = "TERRAVIT_PREDICT_MODE"
+CHANGE_MODE_ENV = "TERRAVIT_CHANGE_MODE"
+TILED_MODE_ENV = "TERRAVIT_TILED_MODE"
+MODE_QUERY = Query(None, description=f"Inference mode, one of: {', '.join(INFERENCE_MODES)}")
+
+
+def _endpoint_mode(mode: Optional[str], env_var: str) -> str:
+    try:
+        return resolve_inference_mode(mode, env_var)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+# Registered models (see model_registry); a request can pick one via ?model=, e.g. V1 as a cheaper 256-token tier
+MODEL_QUERY = Query(None, description=f"Model name, one of: {', '.join(model_registry.names)}")
+
+
+def _endpoint_model(model: Optional[str]) -> str:
+    try:
+        return model_registry.resolve(model)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+# Response encoding of the score vectors (see response_codec.RESPONSE_FORMATS); ?format= overrides Accept
+FORMAT_QUERY = Query(None, alias="format", description=f"Response format, one of: {', '.join(RESPONSE_FORMATS)}")
+DTYPE_QUERY = Query("float32", description=f"Array dtype in binary formats, one of: {', '.join(ARRAY_DTYPES)}")
+TOP_CLASSES_QUERY = Query(None, ge=1, le=4096, description="Only return the scores of this many top classes.")
+PREDICTION_ARRAYS = ("raw_scores",)
+CHANGE_ARRAYS = ("class_scores_before", "class_scores_after", "per_class_change")
+
+
+def _response_format(accept: Optional[str], requested: Optional[str], dtype: str) -> str:
+    if dtype not in ARRAY_DTYPES:
+        raise HTTPException(status_code=400, detail=f"dtype must be one of: {', '.join(ARRAY_DTYPES)}")
+    try:
+        return negotiate_format(accept, requested)
+    except ValueError as exc:
+        raise HTTPException(status_code=406, detail=str(exc)) from exc
+
+
+# Image decoding and model inference run on this pool, never on the event loop
+inference_executor = InferenceExecutor.from_env()
+
+
+@app.exception_handler(ExecutorBusyError)
+async def executor_busy_handler(request: Request, exc: ExecutorBusyError) -> JSONResponse:
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+    )
+
+
+# Dynamic micro-batching: concurrent requests share one forward pass per inference mode
+BATCH_MAX_SIZE = int(os.getenv("TERRAVIT_BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.getenv("TERRAVIT_BATCH_MAX_WAIT_MS", "5"))
+_batchers: Dict[str, MicroBatcher] = {}
+
+
+def _get_batcher(mode: str, model: Optional[str] = None) -> MicroBatcher:
+    """The micro-batcher for ``mode`` on ``model``, keyed "<mode>" for the default model and "<model>/<mode>" otherwise."""
+    model = model_registry.resolve(model)
+    key = mode if model == model_registry.default_name else f"{model}/{mode}"
+    batcher = _batchers.get(key)
+    if batcher is None:
+        batcher = MicroBatcher(
+            functools.partial(batch_outputs, mode=mode, model=model),
+            max_batch_size=BATCH_MAX_SIZE,
+            max_wait_ms=BATCH_MAX_WAIT_MS,
+            run_sync=inference_executor.run,
+        )
+        _batchers[key] = batcher
+    return batcher
+
+
+# Content-addressed cache of per-image logits/embeddings (pixels + weights identity + mode)
+result_cache = ResultCache.from_env()
+
+
+async def _cache_get(key: str) -> Optional[CachedResult]:
+    """Result cache lookup: the in-memory LRU inline, the disk tier (file I/O) off the event loop."""
+    cached = result_cache.get_memory(key)
+    if cached is not None:
+        return cached
+    if not result_cache.disk_enabled:
+        return result_cache.get_disk(key)  # no file I/O; only counts the miss
+    return await asyncio.to_thread(result_cache.get_disk, key)
+
+
+async def _cache_put(entries: Sequence[Tuple[str, CachedResult]]) -> None:
+    """Store results in the in-memory LRU inline and write them to the disk tier, if any, in one thread call."""
+    stored = [(key, result_cache.put_memory(key, result)) for key, result in entries]
+    if not result_cache.disk_enabled:
+        return
+
+    def write() -> None:
+        for key, result in stored:
+            result_cache.put_disk(key, result)
+
+    await asyncio.to_thread(write)
+
+
+async def _infer_image(image_bytes: bytes, mode: str, model: Optional[str] = None) -> CachedResult:
+    """Decode an upload off the event loop and return its model outputs, from the cache when possible."""
+    digest, patches = await inference_executor.run(prepare_image, image_bytes, model)
+    return await _infer_patches(digest, patches, mode, model)
+
+
+async def _infer_patches(digest: str, patches: torch.Tensor, mode: str, model: Optional[str] = None) -> CachedResult:
+    """Model outputs for an already decoded image, from the cache when possible."""
+    key = ResultCache.key(model_registry.model(model).mode_id(mode), mode, digest)
+    cached = await _cache_get(key)
+    if cached is not None:
+        return cached
+
+    logits, embedding, stats = await _get_batcher(mode, model).submit(patches)
+    result = CachedResult(logits=logits, embedding=embedding, stats=stats)
+    await _cache_put([(key, result)])
+    return result
+
+
+async def _infer_change_map(
+    before_bytes: bytes,
+    after_bytes: bytes,
+    mode: str,
+    metric: str,
+    model: Optional[str] = None,
+) -> Tuple[CachedResult, CachedResult, torch.Tensor]:
+    """Encode a before/after pair in one batched pass; return both outputs and the per-patch distance grid."""
+    (before_digest, before_patches), (after_digest, after_patches) = await asyncio.gather(
+        inference_executor.run(prepare_image, before_bytes, model),
+        inference_executor.run(prepare_image, after_bytes, model),
+    )
+    out = await inference_executor.run(patch_change, before_patches, after_patches, mode, metric, model)
+    mode_id = model_registry.model(model).mode_id(mode)
+
+    stats = out["stats"] or [None, None]
+    results = [
+        CachedResult(logits=logits, embedding=embedding, stats=item_stats)
+        for logits, embedding, item_stats in zip(out["logits"], out["embeddings"], stats)
+    ]
+    keys = [ResultCache.key(mode_id, mode, digest) for digest in (before_digest, after_digest)]
+    await _cache_put(list(zip(keys, results)))
+    return results[0], results[1], out["distances"]
+
+
+# Pooled encoder embeddings of indexed tiles, for /search/similar
+vector_index = VectorIndex.from_env()
+
+
+def _embedding_space(mode: str, model: Optional[str] = None) -> str:
+    """Vector index space of ``model``'s embeddings in ``mode``; embeddings from different spaces are not compared."""
+    return f"{mode}:{model_registry.model(model).mode_id(mode)}"
+
+
+async def _image_embedding(upload: UploadFile, mode: str, model: Optional[str] = None) -> Tuple[str, torch.Tensor]:
+    """Read an uploaded image and return its pixel digest and pooled encoder embedding [encoder_dim]."""
+    if upload.content_type is None or not upload.content_type.startswith("image/"):
+        raise HTTPException(status_code=400, detail="Uploaded file must be an image.")
+    try:
+        with STAGE_SECONDS.time(stage="read"):
+            image_bytes = await upload.read()
+    except Exception as exc:  # noqa: BLE001
+        raise HTTPException(status_code=400, detail="Could not read image file.") from exc
+
+    try:
+        with inference_executor.admit():
+            digest, patches = await inference_executor.run(prepare_image, image_bytes, model)
+            outputs = await _infer_patches(digest, patches, mode, model)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    except RuntimeError as exc:
+        raise HTTPException(status_code=500, detail=str(exc)) from exc
+    assert outputs.embedding is not None
+    return digest, outputs.embedding
+
+
+# Per-site acquisition series for /change/series; requests for one site run one at a time
+site_store = SiteStore.from_env()
+_site_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def _site_lock(site_id: str) -> asyncio.Lock:
+    lock = _site_locks.get(site_id)
+    if lock is None:
+        lock = _site_locks[site_id] = asyncio.Lock()
+    return lock
+
+
+# Shared, pooled client for the /risk/* endpoints
+open_meteo = OpenMeteoClient.from_env()
+
+# Background jobs for long tiled/raster analyses, run on the same executor and model
+job_manager = JobManager.from_env(inference_executor)
+
 
 @app.on_event("startup")
 async def load_model_on_startup() -> None:
-    """Load the TerraViT model when the server starts."""
+    """Load the TerraViT model and start the inference workers when the server starts."""
     terravit_model.load()
+    inference_executor.start()
+    job_manager.start()
+
+
+@app.on_event("shutdown")
+async def close_batchers_on_shutdown() -> None:
+    """Stop the job, micro-batching and inference workers."""
+    await job_manager.stop()
+    for batcher in _batchers.values():
+        await batcher.close()
+    inference_executor.shutdown()
+    await open_meteo.aclose()
 
 
 @app.get("/health", response_model=HealthResponse)
@@ -47,27 +323,240 @@ async def health_check() -> HealthResponse:
         status="ok",
         model_loaded=terravit_model.is_loaded,
         device=terravit_model.device_str,
+        precision=terravit_model.precision,
+        runtime=terravit_model.runtime,
+        precision_check=terravit_model.precision_check_result,
+        models=model_registry.stats()["models"],
+    )
+
+
+def _collect_service_metrics() -> List[Tuple[str, str, str, List[Tuple[Dict[str, Any], float]]]]:
+    """Gauges/counters derived from the per-subsystem stats() at scrape time."""
+    executor = inference_executor.stats()
+    cache = result_cache.stats()
+    batchers = {mode: batcher.stats() for mode, batcher in _batchers.items()}
+    models = model_registry.stats()
+    sites = site_store.stats()
+    return [
+        ("terravit_executor_pending", "gauge", "Admitted inference work not yet finished.", [({}, executor["pending"])]),
+        ("terravit_executor_max_pending", "gauge", "Admission limit of the inference executor.", [({}, executor["max_pending"])]),
+        ("terravit_executor_rejected_total", "counter", "Requests rejected because the executor was full.", [({}, executor["rejected"])]),
+        ("terravit_batcher_queue_depth", "gauge", "Items waiting in a micro-batcher queue.",
+         [({"mode": mode}, stats["queue_depth"]) for mode, stats in batchers.items()]),
+        ("terravit_batcher_batches_total", "counter", "Forward passes run by a micro-batcher.",
+         [({"mode": mode}, stats["batches"]) for mode, stats in batchers.items()]),
+        ("terravit_batcher_items_total", "counter", "Items run through a micro-batcher.",
+         [({"mode": mode}, stats["items"]) for mode, stats in batchers.items()]),
+        ("terravit_result_cache_entries", "gauge", "Entries in the in-memory result cache.", [({}, cache["entries"])]),
+        ("terravit_result_cache_lookups_total", "counter", "Result cache lookups by outcome.",
+         [({"result": "hit"}, cache["hits"]), ({"result": "disk_hit"}, cache["disk_hits"]), ({"result": "miss"}, cache["misses"])]),
+        ("terravit_vector_index_vectors", "gauge", "Embeddings stored in the vector index.", [({}, len(vector_index))]),
+        ("terravit_site_acquisitions_total", "counter", "Images submitted to /change/series by outcome.",
+         [({"result": "encoded"}, sites["acquisitions_encoded"]), ({"result": "reused"}, sites["acquisitions_reused"])]),
+        ("terravit_model_memory_bytes", "gauge", "Parameter memory of each resident model.",
+         [({"model": m["name"]}, m["memory_mb"] * 2**20) for m in models["models"] if m["resident"]]),
+        ("terravit_model_evictions_total", "counter", "Models evicted from the registry to fit the memory budget.",
+         [({}, models["evictions"])]),
+    ]
+
+
+REGISTRY.add_collector(_collect_service_metrics)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics() -> Response:
+    """All service metrics in the Prometheus text exposition format, for scraping."""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+def _require_admin(token: Optional[str]) -> None:
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set TERRAVIT_ADMIN_TOKEN to enable them.")
+    if token != ADMIN_TOKEN:
+        raise HTTPException(status_code=401, detail="Missing or invalid X-Admin-Token header.")
+
+
+@app.post("/admin/profile", response_model=ProfilerStatus, status_code=202)
+async def start_profile(
+    requests: int = Query(10, ge=1, le=1000, description="Number of inference requests to capture."),
+    x_admin_token: Optional[str] = Header(None),
+) -> ProfilerStatus:
+    """Capture a torch.profiler trace of the next ``requests`` inference requests to TERRAVIT_PROFILE_DIR."""
+    _require_admin(x_admin_token)
+    try:
+        profiler_capture.arm(requests)
+    except RuntimeError as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+    return ProfilerStatus(**profiler_capture.status())
+
+
+@app.get("/admin/profile", response_model=ProfilerStatus)
+async def profile_status(x_admin_token: Optional[str] = Header(None)) -> ProfilerStatus:
+    """Whether a capture is pending, and where the last trace was written."""
+    _require_admin(x_admin_token)
+    return ProfilerStatus(**profiler_capture.status())
+
+
+@app.get("/metrics/batching", response_model=BatchingMetricsResponse)
+async def batching_metrics() -> BatchingMetricsResponse:
+    """Queue depth and achieved batch sizes of the inference micro-batchers, per mode."""
+    return BatchingMetricsResponse(
+        batchers={mode: batcher.stats() for mode, batcher in _batchers.items()},
     )
 
 
+@app.get("/metrics/models", response_model=ModelRegistryStats)
+async def model_metrics() -> ModelRegistryStats:
+    """Registered models, which are resident and their memory, plus load/eviction counters."""
+    return ModelRegistryStats(**model_registry.stats())
+
+
+@app.get("/metrics/executor", response_model=ExecutorStats)
+async def executor_metrics() -> ExecutorStats:
+    """Worker pool configuration, admitted work in flight and rejected requests."""
+    return ExecutorStats(**inference_executor.stats())
+
+
+@app.get("/metrics/cache", response_model=CacheStats)
+async def cache_metrics() -> CacheStats:
+    """Result cache size and hit/miss counters."""
+    return CacheStats(**result_cache.stats())
+
+
+@app.get("/metrics/forecast-cache", response_model=ForecastCacheStats)
+async def forecast_cache_metrics() -> ForecastCacheStats:
+    """Open-Meteo forecast cache size, hit rate and request coalescing counters."""
+    return ForecastCacheStats(**open_meteo.forecast_cache.stats())
+
+
+@app.get("/metrics/vector-index", response_model=VectorIndexStats)
+async def vector_index_metrics() -> VectorIndexStats:
+    """Vector index size, clustering state and search latency."""
+    return VectorIndexStats(**vector_index.stats())
+
+
+@app.get("/metrics/sites", response_model=SiteStoreStats)
+async def site_metrics() -> SiteStoreStats:
+    """Site series store occupancy and how many submitted acquisitions needed encoding."""
+    return SiteStoreStats(**site_store.stats())
+
+
+@app.get("/metrics/jobs", response_model=JobStats)
+async def job_metrics() -> JobStats:
+    """Job worker count and jobs per status."""
+    return JobStats(**await asyncio.to_thread(job_manager.stats))
+
+
 @app.post("/predict/image", response_model=PredictionResponse)
-async def predict_from_image(file: UploadFile = File(...)) -> PredictionResponse:
-    """Run TerraViT inference on an uploaded satellite image file."""
+async def predict_from_image(
+    file: UploadFile = File(...),
+    mode: Optional[str] = MODE_QUERY,
+    model: Optional[str] = MODEL_QUERY,
+    top_classes: Optional[int] = TOP_CLASSES_QUERY,
+    response_format: Optional[str] = FORMAT_QUERY,
+    dtype: str = DTYPE_QUERY,
+    accept: Optional[str] = Header(None),
+) -> Response:
+    """Run TerraViT inference on an uploaded satellite image file.
+
+    The response is JSON unless a binary format is requested via ``format``
+    or the Accept header; ``top_classes`` truncates ``raw_scores``.
+    ``model`` picks a registered model other than the default.
+    """
+    inference_mode = _endpoint_mode(mode, PREDICT_MODE_ENV)
+    model_name = _endpoint_model(model)
+    fmt = _response_format(accept, response_format, dtype)
+
     if file.content_type is None or not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="Uploaded file must be an image.")
 
     try:
-        image_bytes = await file.read()
-        image = Image.open(io.BytesIO(image_bytes))
+        with STAGE_SECONDS.time(stage="read"):
+            image_bytes = await file.read()
     except Exception as exc:  # noqa: BLE001
         raise HTTPException(status_code=400, detail="Could not read image file.") from exc
 
     try:
-        result: Dict = terravit_model.predict(image)
+        with inference_executor.admit():
+            outputs = await _infer_image(image_bytes, inference_mode, model_name)
+        result: Dict = terravit_model.logits_to_prediction(outputs.logits, top_classes)
+        result["inference_stats"] = outputs.stats
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
     except RuntimeError as exc:
         raise HTTPException(status_code=500, detail=str(exc)) from exc
 
-    return PredictionResponse(**result)
+    with stage("serialize"):
+        return encode_response(PredictionResponse(**result), fmt, PREDICTION_ARRAYS, dtype)
+
+
+@app.post("/embed", response_model=EmbeddingResponse)
+async def embed_image(
+    file: UploadFile = File(...),
+    mode: Optional[str] = MODE_QUERY,
+    model: Optional[str] = MODEL_QUERY,
+    index: bool = Query(True, description="Also store the embedding in the vector index for /search/similar."),
+    tile_id: Optional[str] = Query(None, max_length=256, description="Id to store the tile under (default: content address)."),
+) -> EmbeddingResponse:
+    """Return the pooled SatViT encoder embedding of an uploaded image as base64 float16.
+
+    The index keeps embeddings of each model and mode apart. Without
+    ``tile_id`` the id is derived from the pixels, weights and mode, like a
+    result-cache key.
+    """
+    inference_mode = _endpoint_mode(mode, PREDICT_MODE_ENV)
+    model_name = _endpoint_model(model)
+    digest, embedding = await _image_embedding(file, inference_mode, model_name)
+    mode_id = model_registry.model(model_name).mode_id(inference_mode)
+    item_id = tile_id or ResultCache.key(mode_id, inference_mode, digest)
+
+    values = embedding.float().cpu().numpy()
+    indexed = False
+    if index:
+        metadata = {"filename": file.filename, "model": model_name, "mode": inference_mode}
+        space = _embedding_space(inference_mode, model_name)
+        try:
+            indexed = await asyncio.to_thread(vector_index.add, item_id, values, metadata, space)
+        except ValueError as exc:
+            raise HTTPException(status_code=409, detail=str(exc)) from exc
+
+    return EmbeddingResponse(
+        id=item_id,
+        dim=int(values.shape[0]),
+        data=base64.b64encode(values.astype("<f2").tobytes()).decode("ascii"),
+        norm=float(embedding.float().norm().item()),
+        indexed=indexed,
+    )
+
+
+@app.post("/search/similar", response_model=SimilarSearchResponse)
+async def search_similar(
+    file: UploadFile = File(...),
+    mode: Optional[str] = MODE_QUERY,
+    model: Optional[str] = MODEL_QUERY,
+    k: int = Query(10, ge=1, le=100, description="Number of tiles to return."),
+    nprobe: Optional[int] = Query(None, ge=1, le=4096, description="Clusters to scan (default TERRAVIT_VECTOR_INDEX_NPROBE)."),
+) -> SimilarSearchResponse:
+    """Return the ``k`` indexed tiles whose embeddings are most similar (cosine) to an uploaded image's.
+
+    Only tiles embedded with the same model and mode are ranked.
+    """
+    inference_mode = _endpoint_mode(mode, PREDICT_MODE_ENV)
+    model_name = _endpoint_model(model)
+    _, embedding = await _image_embedding(file, inference_mode, model_name)
+    space = _embedding_space(inference_mode, model_name)
+
+    started = time.perf_counter()
+    try:
+        results = await asyncio.to_thread(vector_index.search, embedding.float().cpu().numpy(), k, nprobe, space)
+    except ValueError as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+
+    return SimilarSearchResponse(
+        results=[SimilarTile(**r) for r in results],
+        indexed_vectors=len(vector_index),
+        took_ms=(time.perf_counter() - started) * 1000.0,
+    )
 
 
 @app.post("/risk/score", response_model=ClimateRiskResponse)
@@ -79,69 +568,18 @@ async def climate_risk_score(payload: ClimateRiskRequest) -> ClimateRiskResponse
     simple and transparent so it can be refined later.
     """
 
-    base_url = "https://api.open-meteo.com/v1/forecast"
-    params = {
-        "latitude": payload.lat,
-        "longitude": payload.lon,
-        "hourly": "temperature_2m,precipitation,relativehumidity_2m",
-        "forecast_days": 1,
-    }
-
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        try:
-            resp = await client.get(base_url, params=params)
-            resp.raise_for_status()
-        except httpx.HTTPError as exc:  # noqa: TRY003
-            raise HTTPException(status_code=502, detail=f"Climate API error: {exc}") from exc
-
-    data = resp.json()
-    hourly = data.get("hourly", {})
-
-    temps = hourly.get("temperature_2m") or []
-    precips = hourly.get("precipitation") or []
-    humid = hourly.get("relativehumidity_2m") or []
-
-    # Simple aggregates
-    avg_temp = sum(temps) / len(temps) if temps else 20.0
-    max_temp = max(temps) if temps else avg_temp
-    total_precip = sum(precips) if precips else 0.0
-    avg_humid = sum(humid) / len(humid) if humid else 50.0
-
-    def clamp01(x: float) -> float:
-        return max(0.0, min(1.0, x))
-
-    # Heuristic risk scores (0–1). You can refine these later.
-    heat_risk = clamp01((max_temp - 25.0) / 15.0)  # >40C -> ~1
-    flood_risk = clamp01(total_precip / 50.0)  # 50mm/day -> 1
-    vegetation_stress = clamp01((60.0 - avg_humid) / 40.0)  # very low humidity -> high stress
-    air_quality_proxy = clamp01(heat_risk * 0.5 + vegetation_stress * 0.5)
-
-    overall_risk = clamp01(
-        0.35 * heat_risk
-        + 0.30 * flood_risk
-        + 0.20 * vegetation_stress
-        + 0.15 * air_quality_proxy
-    )
-
-    scores = ClimateRiskScores(
-        heat_risk=heat_risk,
-        flood_risk=flood_risk,
-        vegetation_stress=vegetation_stress,
-        air_quality_proxy=air_quality_proxy,
-        overall_risk=overall_risk,
-    )
+    try:
+        data = await open_meteo.forecast(payload.lat, payload.lon)
+    except httpx.HTTPError as exc:  # noqa: TRY003
+        raise HTTPException(status_code=502, detail=f"Climate API error: {exc}") from exc
 
-    summary = (
-        "Climate risk snapshot: "
-        f"overall={overall_risk:.2f}, heat={heat_risk:.2f}, "
-        f"flood={flood_risk:.2f}, vegetation_stress={vegetation_stress:.2f}."
-    )
+    scores = scores_at(forecast_risk_scores([data]), 0)
 
     return ClimateRiskResponse(
         lat=payload.lat,
         lon=payload.lon,
-        scores=scores,
-        summary=summary,
+        scores=ClimateRiskScores(**scores),
+        summary=risk_summary(scores),
     )
 
 
@@ -150,71 +588,22 @@ async def climate_risk_history(payload: ClimateRiskRequest) -> ClimateRiskHistor
     """Return simple yearly climate risk scores over the last 10 years for a location.
 
     This uses the Open-Meteo ERA5 archive API to fetch daily aggregates for each
-    year, then applies the same heuristic scoring used in `/risk/score`.
+    year, then applies the same heuristic scoring used in `/risk/score`. Years
+    are fetched concurrently and completed years are served from a local cache.
     """
 
-    def clamp01(x: float) -> float:
-        return max(0.0, min(1.0, x))
-
-    async def compute_year_scores(client: httpx.AsyncClient, year: int) -> ClimateRiskHistoryYear:
-        base_url = "https://archive-api.open-meteo.com/v1/era5"
-        params = {
-            "latitude": payload.lat,
-            "longitude": payload.lon,
-            "start_date": f"{year}-01-01",
-            "end_date": f"{year}-12-31",
-            "daily": "temperature_2m_max,precipitation_sum,relative_humidity_2m_mean",
-        }
-
-        resp = await client.get(base_url, params=params)
-        resp.raise_for_status()
-        data = resp.json()
-        daily = data.get("daily", {})
-
-        temps = daily.get("temperature_2m_max") or []
-        precips = daily.get("precipitation_sum") or []
-        humid = daily.get("relative_humidity_2m_mean") or []
-
-        avg_temp = sum(temps) / len(temps) if temps else 20.0
-        max_temp = max(temps) if temps else avg_temp
-        total_precip = sum(precips) if precips else 0.0
-        avg_humid = sum(humid) / len(humid) if humid else 50.0
-
-        heat_risk = clamp01((max_temp - 25.0) / 15.0)
-        flood_risk = clamp01(total_precip / 1000.0)  # 1000mm/year -> ~1
-        vegetation_stress = clamp01((60.0 - avg_humid) / 40.0)
-        air_quality_proxy = clamp01(heat_risk * 0.5 + vegetation_stress * 0.5)
-
-        overall_risk = clamp01(
-            0.35 * heat_risk
-            + 0.30 * flood_risk
-            + 0.20 * vegetation_stress
-            + 0.15 * air_quality_proxy
-        )
-
-        scores = ClimateRiskScores(
-            heat_risk=heat_risk,
-            flood_risk=flood_risk,
-            vegetation_stress=vegetation_stress,
-            air_quality_proxy=air_quality_proxy,
-            overall_risk=overall_risk,
-        )
-
-        return ClimateRiskHistoryYear(year=year, scores=scores)
-
-    current_year = datetime.utcnow().year
+    current_year = datetime.now(timezone.utc).year
     years: List[int] = list(range(current_year - 9, current_year + 1))
 
-    history_years: List[ClimateRiskHistoryYear] = []
+    year_data = await open_meteo.era5_years(payload.lat, payload.lon, years)
+    # Best-effort history: skip years that fail instead of aborting
+    fetched = [year for year in years if year_data[year] is not None]
+    scores = history_risk_scores([year_data[year] for year in fetched])
 
-    async with httpx.AsyncClient(timeout=20.0) as client:
-        for year in years:
-            try:
-                year_scores = await compute_year_scores(client, year)
-            except httpx.HTTPError:
-                # Best-effort history: skip years that fail instead of aborting
-                continue
-            history_years.append(year_scores)
+    history_years = [
+        ClimateRiskHistoryYear(year=year, scores=ClimateRiskScores(**scores_at(scores, i)))
+        for i, year in enumerate(fetched)
+    ]
 
     return ClimateRiskHistoryResponse(
         lat=payload.lat,
@@ -223,11 +612,76 @@ async def climate_risk_history(payload: ClimateRiskRequest) -> ClimateRiskHistor
     )
 
 
+# Upper bound on points (explicit + bounding-box cells) per batch risk request
+RISK_BATCH_MAX_POINTS = int(os.getenv("TERRAVIT_RISK_BATCH_MAX_POINTS", "2500"))
+
+
+@app.post("/risk/score/batch")
+async def climate_risk_score_batch(payload: ClimateRiskBatchRequest) -> StreamingResponse:
+    """Score many coordinates at once, streaming one NDJSON ``ClimateRiskBatchItem`` per line.
+
+    Points are the explicit ``points`` followed by the cell centres of
+    ``bbox``. Forecasts are fetched with Open-Meteo multi-location requests
+    and each chunk is scored as array operations and streamed as soon as it
+    arrives, so lines are not in input order (use ``index``). Points whose
+    chunk failed upstream get an ``error`` instead of ``scores``.
+    """
+    points = [(p.lat, p.lon) for p in payload.points]
+    if payload.bbox is not None:
+        box = payload.bbox
+        if len(points) + box.rows * box.cols > RISK_BATCH_MAX_POINTS:
+            raise HTTPException(status_code=400, detail=f"At most {RISK_BATCH_MAX_POINTS} points per request.")
+        try:
+            points += grid_points(box.min_lat, box.min_lon, box.max_lat, box.max_lon, box.rows, box.cols)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+    if not points:
+        raise HTTPException(status_code=400, detail="Provide at least one point or a bounding box.")
+    if len(points) > RISK_BATCH_MAX_POINTS:
+        raise HTTPException(status_code=400, detail=f"At most {RISK_BATCH_MAX_POINTS} points per request.")
+
+    async def lines() -> AsyncIterator[str]:
+        async for indices, forecasts in open_meteo.forecast_chunks(points):
+            if forecasts is None:
+                for i in indices:
+                    item = ClimateRiskBatchItem(
+                        index=i, lat=points[i][0], lon=points[i][1], error="Climate API error"
+                    )
+                    yield item.model_dump_json() + "\n"
+                continue
+
+            scores = forecast_risk_scores(forecasts)
+            chunk = []
+            for row, i in enumerate(indices):
+                point_scores = scores_at(scores, row)
+                item = ClimateRiskBatchItem(
+                    index=i,
+                    lat=points[i][0],
+                    lon=points[i][1],
+                    scores=ClimateRiskScores(**point_scores),
+                    summary=risk_summary(point_scores),
+                )
+                chunk.append(item.model_dump_json() + "\n")
+            yield "".join(chunk)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
 @app.post("/change/detect", response_model=ChangeDetectResponse)
 async def change_detect(
     before: UploadFile = File(...),
     after: UploadFile = File(...),
-) -> ChangeDetectResponse:
+    mode: Optional[str] = MODE_QUERY,
+    model: Optional[str] = MODEL_QUERY,
+    spatial: bool = Query(False, description="Also return a per-patch change heatmap and top changed regions."),
+    metric: Literal["cosine", "l2"] = Query("cosine", description="Per-patch token distance for the change map."),
+    heatmap_format: Literal["png", "float16"] = Query("png", description="Encoding of the change map data."),
+    top_k: int = Query(5, ge=0, le=256, description="Number of most changed regions to return."),
+    top_classes: Optional[int] = TOP_CLASSES_QUERY,
+    response_format: Optional[str] = FORMAT_QUERY,
+    dtype: str = DTYPE_QUERY,
+    accept: Optional[str] = Header(None),
+) -> Response:
     """Detect change between two satellite images using TerraViT logits difference.
 
     This V1 implementation:
@@ -235,64 +689,762 @@ async def change_detect(
     - computes softmax probabilities for each,
     - defines a change score as the mean absolute difference across classes,
     - returns per-class change vector and a brief summary.
+
+    With ``spatial=true`` both images are encoded together as a batch of 2 and
+    their per-patch encoder tokens are compared, adding a compact change
+    heatmap over the patch grid and the ``top_k`` most changed cells.
+
+    ``top_classes`` keeps only the classes with the largest absolute change
+    in the three score vectors (see ``class_indices``); ``format`` / Accept
+    select a binary encoding for them. ``model`` picks a registered model
+    other than the default.
     """
 
+    inference_mode = _endpoint_mode(mode, CHANGE_MODE_ENV)
+    model_name = _endpoint_model(model)
+    fmt = _response_format(accept, response_format, dtype)
+
     for f, name in ((before, "before"), (after, "after")):
         if f.content_type is None or not f.content_type.startswith("image/"):
             raise HTTPException(status_code=400, detail=f"Uploaded {name} file must be an image.")
 
     try:
-        before_bytes = await before.read()
-        after_bytes = await after.read()
-        before_img = Image.open(io.BytesIO(before_bytes))
-        after_img = Image.open(io.BytesIO(after_bytes))
+        with STAGE_SECONDS.time(stage="read"):
+            before_bytes = await before.read()
+            after_bytes = await after.read()
     except Exception as exc:  # noqa: BLE001
         raise HTTPException(status_code=400, detail="Could not read one or both image files.") from exc
 
-    if not terravit_model.is_loaded:
-        try:
-            terravit_model.load()
-        except RuntimeError as exc:  # noqa: TRY003
-            raise HTTPException(status_code=500, detail=str(exc)) from exc
-
-    import torch
-
     try:
-        # Use the same image->logits pathway as generic prediction
-        before_logits = terravit_model._image_logits(before_img)  # type: ignore[attr-defined]
-        after_logits = terravit_model._image_logits(after_img)  # type: ignore[attr-defined]
+        with inference_executor.admit(2):
+            # Use the same image->logits pathway as generic prediction; both sides land in one batch
+            try:
+                if spatial:
+                    before_out, after_out, distances = await _infer_change_map(
+                        before_bytes, after_bytes, inference_mode, metric, model_name
+                    )
+                else:
+                    before_out, after_out = await asyncio.gather(
+                        _infer_image(before_bytes, inference_mode, model_name),
+                        _infer_image(after_bytes, inference_mode, model_name),
+                    )
+            except ValueError as exc:
+                raise HTTPException(status_code=400, detail="Could not read one or both image files.") from exc
 
-        before_probs = torch.softmax(before_logits, dim=0)
-        after_probs = torch.softmax(after_logits, dim=0)
+        before_probs = torch.softmax(before_out.logits, dim=0)
+        after_probs = torch.softmax(after_out.logits, dim=0)
 
-        per_class_change = (after_probs - before_probs).tolist()
-        change_score = torch.mean(torch.abs(after_probs - before_probs)).item()
+        change = after_probs - before_probs
+        change_score = torch.mean(torch.abs(change)).item()
 
-        if len(per_class_change) > 0:
-            diffs_abs = torch.abs(after_probs - before_probs)
+        if change.numel() > 0:
+            diffs_abs = torch.abs(change)
             dominant_idx = int(torch.argmax(diffs_abs).item())
         else:
             dominant_idx = None
 
+        class_indices = None
+        if top_classes is not None:
+            class_indices = torch.topk(torch.abs(change), min(top_classes, change.numel())).indices
+            before_probs, after_probs, change = before_probs[class_indices], after_probs[class_indices], change[class_indices]
+            class_indices = class_indices.tolist()
+
         summary = (
             f"Change score: {change_score:.3f}. "
             "Positive per_class_change values indicate classes that increased in probability from before to after."
         )
 
-        return ChangeDetectResponse(
+        change_map = None
+        changed_regions = None
+        if spatial:
+            change_map = {"metric": metric, **encode_heatmap(distances, heatmap_format)}
+            changed_regions = top_changed_regions(distances, top_k)
+            if changed_regions:
+                top = changed_regions[0]
+                summary += f" Most changed patch: row {top['row']}, col {top['col']} ({metric}={top['score']:.3f})."
+
+        response = ChangeDetectResponse(
             change_score=change_score,
             class_scores_before=before_probs.tolist(),
             class_scores_after=after_probs.tolist(),
-            per_class_change=per_class_change,
+            per_class_change=change.tolist(),
+            class_indices=class_indices,
             dominant_change_class_index=dominant_idx,
+            change_map=change_map,
+            changed_regions=changed_regions,
+            inference_stats=[before_out.stats, after_out.stats] if before_out.stats and after_out.stats else None,
             summary=summary,
         )
-    except HTTPException:
+        with stage("serialize"):
+            return encode_response(response, fmt, CHANGE_ARRAYS, dtype)
+    except (HTTPException, ExecutorBusyError):
         raise
     except Exception as exc:  # noqa: BLE001
         raise HTTPException(status_code=500, detail=f"Change detection failed: {exc}") from exc
 
 
+# Images decoded and encoded together by /change/series, and the most images one request may upload
+SERIES_BATCH_SIZE = int(os.getenv("TERRAVIT_SERIES_BATCH_SIZE", "8"))
+SERIES_MAX_IMAGES = int(os.getenv("TERRAVIT_SERIES_MAX_IMAGES", "64"))
+SERIES_METRIC_QUERY = Query("cosine", description="Per-patch token distance for the change scores.")
+SERIES_TOP_K_QUERY = Query(5, ge=0, le=256, description="Number of most changed regions (first to latest acquisition).")
+SERIES_TRAJECTORIES_QUERY = Query(True, description="Include the per-patch step and cumulative change trajectories.")
+
+
+async def _extend_series(
+    series: SiteSeries,
+    uploads: List[Tuple[str, bytes]],
+    mode: str,
+    model: Optional[str] = None,
+) -> None:
+    """Append the uploads not already in ``series``, in order, encoding them in batches.
+
+    Images are decoded and encoded SERIES_BATCH_SIZE at a time, so memory
+    stays bounded regardless of the stack size. If a batch fails, the
+    batches before it stay appended.
+    """
+    mode_id = model_registry.model(model).mode_id(mode)
+    known = set(series.digests)
+    for start in range(0, len(uploads), SERIES_BATCH_SIZE):
+        chunk = uploads[start : start + SERIES_BATCH_SIZE]
+        decoded = await asyncio.gather(*(inference_executor.run(decode_image, data, model) for _, data in chunk))
+        pending = []
+        for (label, _), (digest, image) in zip(chunk, decoded):
+            if digest not in known:
+                known.add(digest)
+                pending.append((label, digest, image))
+        if not pending:
+            continue
+
+        # Only new images are preprocessed, straight into one batch tensor
+        patches = await inference_executor.run(images_to_patches, [image for _, _, image in pending], model)
+        out = await inference_executor.run(encode_tokens, [patches], mode, model)
+        digests = [digest for _, digest, _ in pending]
+        # In this process, not on the executor: a process-pool worker would append to a pickled copy
+        await asyncio.to_thread(series.append, digests, [label for label, _, _ in pending], out["logits"], out["tokens"])
+        stats = out["stats"] or [None] * len(digests)
+        await _cache_put([
+            (ResultCache.key(mode_id, mode, digest), CachedResult(logits=logits, embedding=tokens.mean(dim=0), stats=item_stats))
+            for digest, logits, tokens, item_stats in zip(digests, out["logits"], out["tokens"], stats)
+        ])
+
+
+def _series_response(
+    series: SiteSeries,
+    site_id: Optional[str],
+    metric: str,
+    top_k: int,
+    trajectories: bool,
+    encoded: Set[str],
+    reused: int = 0,
+) -> ChangeSeriesResponse:
+    step, cumulative = series.trajectories(metric)
+    num_patches = 0 if series.baseline is None else series.baseline.shape[0]
+    grid_size = int(num_patches ** 0.5)
+
+    probs = torch.softmax(torch.stack(series.logits), dim=-1) if series.logits else torch.zeros(0, 0)
+    class_change = torch.mean(torch.abs(probs[1:] - probs[:-1]), dim=-1)
+    acquisitions = [
+        SeriesAcquisition(
+            index=i,
+            digest=digest,
+            label=label,
+            added_at=added_at,
+            encoded=digest in encoded,
+            top_class_index=int(torch.argmax(probs[i]).item()),
+        )
+        for i, (digest, label, added_at) in enumerate(zip(series.digests, series.labels, series.added_at))
+    ]
+    steps = [
+        SeriesStep(
+            index=i + 1,
+            change_score=float(step[i].mean().item()),
+            cumulative_score=float(cumulative[i].mean().item()),
+            max_patch_change=float(step[i].max().item()),
+            class_change_score=float(class_change[i].item()),
+        )
+        for i in range(len(step))
+    ]
+
+    summary = f"{len(acquisitions)} acquisitions, {len(steps)} change steps."
+    changed_regions = step_trajectories = cumulative_trajectories = None
+    if steps:
+        largest = max(steps, key=lambda s: s.change_score)
+        summary += (
+            f" Cumulative change: {steps[-1].cumulative_score:.3f};"
+            f" largest step: acquisition {largest.index} ({metric}={largest.change_score:.3f})."
+        )
+        changed_regions = top_changed_regions(cumulative[-1].view(grid_size, grid_size), top_k)
+        if trajectories:
+            step_trajectories = {"metric": metric, **encode_heatmap(step, "float16")}
+            cumulative_trajectories = {"metric": metric, **encode_heatmap(cumulative, "float16")}
+
+    return ChangeSeriesResponse(
+        site_id=site_id,
+        metric=metric,
+        grid=grid_size,
+        acquisitions=acquisitions,
+        steps=steps,
+        step_trajectories=step_trajectories,
+        cumulative_trajectories=cumulative_trajectories,
+        changed_regions=changed_regions,
+        encoded=len(encoded),
+        reused=reused,
+        summary=summary,
+    )
+
+
+@app.post("/change/series", response_model=ChangeSeriesResponse)
+async def change_series(
+    files: List[UploadFile] = File(...),
+    site_id: Optional[str] = Query(
+        None, min_length=1, max_length=128, description="Keep the series under this id; later calls append to it."
+    ),
+    mode: Optional[str] = MODE_QUERY,
+    model: Optional[str] = MODEL_QUERY,
+    metric: Literal["cosine", "l2"] = SERIES_METRIC_QUERY,
+    top_k: int = SERIES_TOP_K_QUERY,
+    trajectories: bool = SERIES_TRAJECTORIES_QUERY,
+) -> ChangeSeriesResponse:
+    """Change over an ordered stack of acquisitions of one location.
+
+    ``files`` are encoded in batches and every acquisition is compared
+    with the previous one (step) and the first one (cumulative), per patch
+    and on average. The per-patch trajectories come back as float16
+    [steps, num_patches] matrices.
+
+    With ``site_id``, the series is kept and later calls append to it:
+    only images not already in the series are encoded, so a monitoring
+    client can send just the newest acquisition (or resend the whole
+    stack). A site keeps its mode and model; DELETE it to start over.
+    """
+    inference_mode = _endpoint_mode(mode, CHANGE_MODE_ENV)
+    model_name = _endpoint_model(model)
+    series_mode = "encoder" if inference_mode == "mae" else inference_mode  # served alike (see patch_change)
+
+    if len(files) > SERIES_MAX_IMAGES:
+        raise HTTPException(status_code=400, detail=f"Upload at most {SERIES_MAX_IMAGES} images per request.")
+    if site_id is None and len(files) < 2:
+        raise HTTPException(status_code=400, detail="Upload at least two images, or pass a site_id to append to.")
+    for f in files:
+        if f.content_type is None or not f.content_type.startswith("image/"):
+            raise HTTPException(status_code=400, detail=f"Uploaded file '{f.filename}' must be an image.")
+
+    try:
+        with STAGE_SECONDS.time(stage="read"):
+            uploads = [(f.filename or "", await f.read()) for f in files]
+    except Exception as exc:  # noqa: BLE001
+        raise HTTPException(status_code=400, detail="Could not read one or more image files.") from exc
+
+    weights_id = model_registry.model(model_name).mode_id(series_mode)
+    cost = min(len(uploads), SERIES_BATCH_SIZE, inference_executor.max_pending)
+    async with _site_lock(site_id) if site_id is not None else contextlib.nullcontext():
+        series = await asyncio.to_thread(site_store.get, site_id) if site_id is not None else None
+        if series is None:
+            series = SiteSeries(weights_id=weights_id, mode=series_mode)
+        elif (series.weights_id, series.mode) != (weights_id, series_mode):
+            raise HTTPException(
+                status_code=409,
+                detail=f"Site '{site_id}' was encoded with another mode, model or adaptive config (mode '{series.mode}'); "
+                "use the same ones, or DELETE the site to start over.",
+            )
+
+        before = len(series)
+        try:
+            with inference_executor.admit(cost):
+                await _extend_series(series, uploads, inference_mode, model_name)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+        except ExecutorBusyError:
+            raise
+        except Exception as exc:  # noqa: BLE001
+            raise HTTPException(status_code=500, detail=f"Change series failed: {exc}") from exc
+        finally:
+            # Batches appended before a failure are kept, like the rest of the series
+            if site_id is not None and len(series) > before:
+                await asyncio.to_thread(site_store.put, site_id, series)
+
+        encoded = set(series.digests[before:])
+        site_store.record(len(encoded), len(uploads) - len(encoded))
+        with stage("serialize"):
+            return _series_response(series, site_id, metric, top_k, trajectories, encoded, len(uploads) - len(encoded))
+
+
+@app.get("/change/series/{site_id}", response_model=ChangeSeriesResponse)
+async def get_change_series(
+    site_id: str,
+    metric: Literal["cosine", "l2"] = SERIES_METRIC_QUERY,
+    top_k: int = SERIES_TOP_K_QUERY,
+    trajectories: bool = SERIES_TRAJECTORIES_QUERY,
+) -> ChangeSeriesResponse:
+    """A stored site's change series, without uploading or encoding anything."""
+    async with _site_lock(site_id):
+        series = await asyncio.to_thread(site_store.get, site_id)
+        if series is None:
+            raise HTTPException(status_code=404, detail=f"Unknown site '{site_id}'.")
+        return _series_response(series, site_id, metric, top_k, trajectories, set())
+
+
+@app.delete("/change/series/{site_id}", status_code=204)
+async def delete_change_series(site_id: str) -> Response:
+    """Forget a site's series; the next upload for it starts a new baseline."""
+    async with _site_lock(site_id):
+        if not await asyncio.to_thread(site_store.delete, site_id):
+            raise HTTPException(status_code=404, detail=f"Unknown site '{site_id}'.")
+    return Response(status_code=204)
+
+
+# Windows per encoder batch for tiled scenes; bounds memory regardless of scene size
+TILE_BATCH_SIZE = int(os.getenv("TERRAVIT_TILE_BATCH_SIZE", "8"))
+
+
+def _remove_files(paths: List[str]) -> None:
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+async def _save_upload(upload: UploadFile, directory: Optional[str] = None) -> str:
+    """Stream an upload to a named temporary file (keeping its extension) so it can be memory-mapped."""
+    suffix = os.path.splitext(upload.filename or "")[1].lower()
+
+    def copy() -> str:
+        upload.file.seek(0)
+        with tempfile.NamedTemporaryFile(prefix="terravit-", suffix=suffix, dir=directory, delete=False) as tmp:
+            shutil.copyfileobj(upload.file, tmp, 1 << 20)
+        return tmp.name
+
+    return await asyncio.to_thread(copy)
+
+
+@app.post("/predict/tiled", response_model=TiledSceneResponse)
+async def predict_tiled(
+    file: UploadFile = File(...),
+    after: Optional[UploadFile] = File(None),
+    mode: Optional[str] = MODE_QUERY,
+    model: Optional[str] = MODEL_QUERY,
+    overlap: int = Query(0, ge=0, description="Overlap in pixels between neighbouring windows."),
+    batch_size: int = Query(TILE_BATCH_SIZE, ge=1, le=64, description="Windows per encoder batch."),
+) -> TiledSceneResponse:
+    """Sliding-window inference over a large scene at the model's native resolution.
+
+    The scene is cut into windows of ``patch_hw * grid_size`` pixels (256 for
+    V2) with the given overlap, batched through the model and stitched into a
+    per-tile grid. With only ``file`` the output is /predict-style (top class
+    per tile); with ``after`` as well it is /change-style (change score per
+    tile, ``file`` being the before scene).
+    """
+    inference_mode = _endpoint_mode(mode, TILED_MODE_ENV)
+    model_name = _endpoint_model(model)
+
+    uploads = [(file, "file")] + ([(after, "after")] if after is not None else [])
+    for f, name in uploads:
+        if f.content_type is None or not f.content_type.startswith("image/"):
+            raise HTTPException(status_code=400, detail=f"Uploaded {name} file must be an image.")
+
+    # Spooled to disk so scenes are read window by window (and memory-mapped when uncompressed)
+    paths: List[str] = []
+    try:
+        for f, _ in uploads:
+            paths.append(await _save_upload(f))
+    except Exception as exc:  # noqa: BLE001
+        _remove_files(paths)
+        raise HTTPException(status_code=400, detail="Could not read image file.") from exc
+
+    try:
+        with inference_executor.admit(len(uploads)):
+            result = await inference_executor.run(
+                analyze_scene,
+                paths[0],
+                paths[1] if after is not None else None,
+                inference_mode,
+                overlap,
+                batch_size,
+                None,
+                model_name,
+            )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    except RuntimeError as exc:
+        raise HTTPException(status_code=500, detail=str(exc)) from exc
+    finally:
+        _remove_files(paths)
+
+    return TiledSceneResponse(**result, summary=tiled_summary(result))
+
+
+@app.post("/predict/raster", response_model=TiledSceneResponse)
+async def predict_raster(
+    file: UploadFile = File(...),
+    after: Optional[UploadFile] = File(None),
+    mode: Optional[str] = MODE_QUERY,
+    model: Optional[str] = MODEL_QUERY,
+    overlap: int = Query(0, ge=0, description="Overlap in pixels between neighbouring windows."),
+    batch_size: int = Query(TILE_BATCH_SIZE, ge=1, le=64, description="Windows per encoder batch."),
+    normalize: bool = Query(True, description="Standardize each window per band before inference."),
+) -> TiledSceneResponse:
+    """Tiled inference over multi-band rasters (.npy, .npz band stacks, multi-page TIFF).
+
+    Bands are fed to the model natively (15 Sentinel-style bands for SatViT)
+    instead of repeating RGB. Files are memory-mapped where the format
+    allows, and only the windows being inferred are read. The output matches
+    ``/predict/tiled``, including change-style output when ``after`` is given.
+    """
+    inference_mode = _endpoint_mode(mode, TILED_MODE_ENV)
+    model_name = _endpoint_model(model)
+
+    uploads = [file] + ([after] if after is not None else [])
+    for f in uploads:
+        if os.path.splitext(f.filename or "")[1].lower() not in RASTER_EXTENSIONS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Raster files must have one of the extensions: {', '.join(RASTER_EXTENSIONS)}",
+            )
+
+    paths: List[str] = []
+    try:
+        for f in uploads:
+            paths.append(await _save_upload(f))
+
+        with inference_executor.admit(len(uploads)):
+            result = await inference_executor.run(
+                analyze_raster,
+                paths[0],
+                file.filename,
+                paths[1] if after is not None else None,
+                after.filename if after is not None else None,
+                inference_mode,
+                overlap,
+                batch_size,
+                normalize,
+                None,
+                model_name,
+            )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    except (RuntimeError, OSError) as exc:
+        raise HTTPException(status_code=500, detail=str(exc)) from exc
+    finally:
+        _remove_files(paths)
+
+    return TiledSceneResponse(**result, summary=tiled_summary(result, "raster"))
+
+
+JOB_PRIORITY_QUERY = Query(0, ge=-100, le=100, description="Higher priorities run first; ties run oldest first.")
+JOB_EVENTS_POLL_S = 0.5
+JOB_EVENTS_KEEPALIVE_S = 15.0
+
+
+async def _job_or_404(job_id: str) -> Dict[str, Any]:
+    # JobStore reads and writes hit SQLite on disk, so they run in a thread, off the event loop
+    job = await asyncio.to_thread(job_manager.store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job '{job_id}'.")
+    return job
+
+
+async def _submit_job(
+    kind: str,
+    uploads: Dict[str, UploadFile],
+    params: Dict[str, Any],
+    priority: int,
+) -> JobStatus:
+    """Save uploads under a new job directory, queue the job and return its initial status."""
+    job_id, job_dir = await asyncio.to_thread(job_manager.new_job)
+    inputs: Dict[str, Any] = {}
+    try:
+        for name, upload in uploads.items():
+            inputs[name] = await _save_upload(upload, job_dir)
+            inputs[f"{name}_name"] = upload.filename
+        await job_manager.submit(job_id, kind, priority, params, inputs)
+    except Exception:
+        await asyncio.to_thread(shutil.rmtree, job_dir, ignore_errors=True)
+        raise
+    return JobStatus(**await _job_or_404(job_id))
+
+
+@app.post("/jobs/tiled", response_model=JobStatus, status_code=202)
+async def submit_tiled_job(
+    file: UploadFile = File(...),
+    after: Optional[UploadFile] = File(None),
+    mode: Optional[str] = MODE_QUERY,
+    model: Optional[str] = MODEL_QUERY,
+    overlap: int = Query(0, ge=0, description="Overlap in pixels between neighbouring windows."),
+    batch_size: int = Query(TILE_BATCH_SIZE, ge=1, le=64, description="Windows per encoder batch."),
+    priority: int = JOB_PRIORITY_QUERY,
+) -> JobStatus:
+    """Queue a ``/predict/tiled`` analysis as a background job; poll ``/jobs/{id}`` for progress."""
+    inference_mode = _endpoint_mode(mode, TILED_MODE_ENV)
+    model_name = _endpoint_model(model)
+
+    uploads = {"file": file, **({"after": after} if after is not None else {})}
+    for name, f in uploads.items():
+        if f.content_type is None or not f.content_type.startswith("image/"):
+            raise HTTPException(status_code=400, detail=f"Uploaded {name} file must be an image.")
+
+    params = {"mode": inference_mode, "model": model_name, "overlap": overlap, "batch_size": batch_size}
+    return await _submit_job("tiled", uploads, params, priority)
+
+
+@app.post("/jobs/raster", response_model=JobStatus, status_code=202)
+async def submit_raster_job(
+    file: UploadFile = File(...),
+    after: Optional[UploadFile] = File(None),
+    mode: Optional[str] = MODE_QUERY,
+    model: Optional[str] = MODEL_QUERY,
+    overlap: int = Query(0, ge=0, description="Overlap in pixels between neighbouring windows."),
+    batch_size: int = Query(TILE_BATCH_SIZE, ge=1, le=64, description="Windows per encoder batch."),
+    normalize: bool = Query(True, description="Standardize each window per band before inference."),
+    priority: int = JOB_PRIORITY_QUERY,
+) -> JobStatus:
+    """Queue a ``/predict/raster`` analysis as a background job; poll ``/jobs/{id}`` for progress."""
+    inference_mode = _endpoint_mode(mode, TILED_MODE_ENV)
+    model_name = _endpoint_model(model)
+
+    uploads = {"file": file, **({"after": after} if after is not None else {})}
+    for f in uploads.values():
+        if os.path.splitext(f.filename or "")[1].lower() not in RASTER_EXTENSIONS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Raster files must have one of the extensions: {', '.join(RASTER_EXTENSIONS)}",
+            )
+
+    params = {
+        "mode": inference_mode,
+        "model": model_name,
+        "overlap": overlap,
+        "batch_size": batch_size,
+        "normalize": normalize,
+    }
+    return await _submit_job("raster", uploads, params, priority)
+
+
+@app.get("/jobs", response_model=JobListResponse)
+async def list_jobs(
+    status: Optional[Literal["queued", "running", "succeeded", "failed", "cancelled"]] = None,
+    limit: int = Query(100, ge=1, le=1000),
+) -> JobListResponse:
+    """Most recent jobs first, optionally filtered by status."""
+    jobs = await asyncio.to_thread(job_manager.store.list, status, limit)
+    return JobListResponse(jobs=[JobStatus(**job) for job in jobs])
+
+
+@app.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str) -> JobStatus:
+    return JobStatus(**await _job_or_404(job_id))
+
+
+@app.get("/jobs/{job_id}/result", response_model=TiledSceneResponse)
+async def get_job_result(job_id: str) -> TiledSceneResponse:
+    """The job's ``/predict/tiled``-style result; 409 until the job has succeeded."""
+    job = await _job_or_404(job_id)
+    if job["status"] != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}; no result available.")
+    result = await asyncio.to_thread(job_manager.store.result, job_id)
+    if result is None:
+        raise HTTPException(status_code=500, detail="Job result is missing.")
+    return TiledSceneResponse(**result)
+
+
+@app.delete("/jobs/{job_id}", response_model=JobStatus)
+async def cancel_job(job_id: str) -> JobStatus:
+    """Cancel a job. Queued jobs are cancelled at once; running jobs stop at their next batch."""
+    await _job_or_404(job_id)
+    await job_manager.cancel(job_id)
+    return JobStatus(**await _job_or_404(job_id))
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str) -> StreamingResponse:
+    """Server-sent events: a ``status`` event with the JobStatus on every change, until the job finishes."""
+    await _job_or_404(job_id)
+
+    async def events() -> AsyncIterator[str]:
+        last: Optional[Tuple[Any, ...]] = None
+        idle = 0.0
+        while True:
+            job = await asyncio.to_thread(job_manager.store.get, job_id)
+            if job is None:
+                return
+            snapshot = (job["status"], job["windows_done"], job["windows_total"], job["cancel_requested"])
+            if snapshot != last:
+                last = snapshot
+                idle = 0.0
+                yield f"event: status\ndata: {JobStatus(**job).model_dump_json()}\n\n"
+                if job["status"] in TERMINAL_STATUSES:
+                    return
+            elif idle >= JOB_EVENTS_KEEPALIVE_S:
+                idle = 0.0
+                yield ": keep-alive\n\n"
+            await asyncio.sleep(JOB_EVENTS_POLL_S)
+            idle += JOB_EVENTS_POLL_S
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+# Images per forward pass for /predict/batch; also the most images held in memory at once
+BATCH_PREDICT_SIZE = int(os.getenv("TERRAVIT_BATCH_PREDICT_SIZE", "16"))
+
+
+def _batch_items(
+    file_paths: List[Tuple[str, str]],
+    archive_path: Optional[str],
+    archive_name: Optional[str],
+) -> Iterator[ArchiveItem]:
+    """Spooled uploads (name, path), then archive members, one (name, bytes, error) at a time.
+
+    A file that cannot be read is yielded with an error; only a corrupt
+    archive raises (ValueError).
+    """
+    for name, path in file_paths:
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError as exc:
+            yield name, None, f"Could not read uploaded file: {exc.strerror or exc}"
+            continue
+        yield name, data, None
+    if archive_path is not None:
+        yield from iter_archive_images(archive_path, archive_name)
+
+
+async def _predict_items(
+    items: List[ArchiveItem],
+    mode: str,
+    top_classes: Optional[int] = None,
+    model: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """Decode a batch of images, run the cache misses in one forward pass and return one result dict each.
+
+    Images are decoded concurrently; the misses are then preprocessed
+    together, straight into the batch tensor of the forward pass.
+    """
+    results: List[Dict[str, Any]] = [{"filename": name, "error": error} for name, _, error in items]
+
+    decodable = [i for i, (_, data, _) in enumerate(items) if data is not None]
+    decoded = await asyncio.gather(
+        *(inference_executor.run(decode_image, items[i][1], model) for i in decodable), return_exceptions=True
+    )
+    mode_id = model_registry.model(model).mode_id(mode)
+
+    misses: List[Tuple[int, str, Any]] = []
+    for i, outcome in zip(decodable, decoded):
+        if isinstance(outcome, ValueError):
+            results[i]["error"] = str(outcome)
+            continue
+        if isinstance(outcome, BaseException):
+            raise outcome
+        digest, image = outcome
+        key = ResultCache.key(mode_id, mode, digest)
+        cached = await _cache_get(key)
+        if cached is not None:
+            results[i].update(terravit_model.logits_to_prediction(cached.logits, top_classes))
+            results[i]["inference_stats"] = cached.stats
+        else:
+            misses.append((i, key, image))
+
+    if misses:
+        patches = await inference_executor.run(images_to_patches, [image for _, _, image in misses], model)
+        outputs = await inference_executor.run(batch_outputs, [patches], mode, model)
+        await _cache_put([
+            (key, CachedResult(logits=logits, embedding=embedding, stats=stats))
+            for (_, key, _), (logits, embedding, stats) in zip(misses, outputs)
+        ])
+        for (i, _, _), (logits, _, stats) in zip(misses, outputs):
+            results[i].update(terravit_model.logits_to_prediction(logits, top_classes))
+            results[i]["inference_stats"] = stats
+    return results
+
+
+@app.post("/predict/batch")
+async def predict_batch(
+    files: Optional[List[UploadFile]] = File(None),
+    archive: Optional[UploadFile] = File(None),
+    mode: Optional[str] = MODE_QUERY,
+    model: Optional[str] = MODEL_QUERY,
+    batch_size: int = Query(BATCH_PREDICT_SIZE, ge=1, le=64, description="Images per forward pass."),
+    top_classes: Optional[int] = TOP_CLASSES_QUERY,
+) -> StreamingResponse:
+    """Predict many images (``files`` and/or a zip/tar ``archive``), streaming NDJSON results.
+
+    Images are read and decoded incrementally, ``batch_size`` at a time, and
+    each batch runs as one forward pass (cached images are skipped). One
+    ``BatchPredictionItem`` line per image is streamed as soon as its batch
+    finishes, so memory stays flat regardless of archive size. Unreadable
+    images get a line with ``error`` set instead of failing the stream.
+    """
+    inference_mode = _endpoint_mode(mode, PREDICT_MODE_ENV)
+    model_name = _endpoint_model(model)
+    files = files or []
+
+    if archive is not None and archive_kind(archive.filename or "") is None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Archives must have one of the extensions: {', '.join(ARCHIVE_EXTENSIONS)}",
+        )
+    if not files and archive is None:
+        raise HTTPException(status_code=400, detail="Upload at least one file or an archive.")
+
+    # Spool every upload now: FastAPI closes the request's UploadFiles before the response body streams
+    spooled: List[str] = []
+    try:
+        for f in files:
+            spooled.append(await _save_upload(f))
+        archive_path = await _save_upload(archive) if archive is not None else None
+    except Exception as exc:  # noqa: BLE001
+        _remove_files(spooled)
+        raise HTTPException(status_code=400, detail="Could not read uploaded files.") from exc
+    file_paths = [(f.filename or "", path) for f, path in zip(files, spooled)]
+
+    async def lines() -> AsyncIterator[str]:
+        source = _batch_items(file_paths, archive_path, archive.filename if archive is not None else None)
+        index = 0
+        try:
+            while True:
+                items: List[ArchiveItem] = []
+                read_error: Optional[str] = None
+                stop = False
+                try:
+                    while len(items) < batch_size:
+                        item = await asyncio.to_thread(next, source, None)
+                        if item is None:
+                            break
+                        items.append(item)
+                except ValueError as exc:
+                    # Corrupt archive: finish what was read, then report and stop
+                    read_error = str(exc)
+                    stop = True
+                if not items and read_error is None:
+                    break
+
+                if items:
+                    try:
+                        # Wait for capacity rather than failing a stream that is already open
+                        async with inference_executor.admit_waiting(len(items)):
+                            results = await _predict_items(items, inference_mode, top_classes, model_name)
+                    except (RuntimeError, ExecutorBusyError) as exc:
+                        # The response has started, so report on every image of the batch and stop
+                        results = [{"filename": name, "error": str(exc)} for name, _, _ in items]
+                        stop = True
+                    chunk = []
+                    for result in results:
+                        chunk.append(BatchPredictionItem(index=index, **result).model_dump_json() + "\n")
+                        index += 1
+                    yield "".join(chunk)
+                if read_error is not None:
+                    name = archive.filename if archive is not None else ""
+                    yield BatchPredictionItem(index=index, filename=name or "", error=read_error).model_dump_json() + "\n"
+                if stop:
+                    break
+        finally:
+            source.close()
+            _remove_files(spooled + ([archive_path] if archive_path is not None else []))
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
 # Root endpoint for quick verification
 @app.get("/")
 async def root() -> Dict[str, str]:
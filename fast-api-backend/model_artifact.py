@@ -0,0 +1,123 @@
+import json
+import os
+from typing import Any, Callable, Dict, Tuple
+
+import numpy as np
+import torch
+from torch import nn
+
+from SatViT_model import SatViT
+
+try:  # Optional: serving ONNX artifacts
+    import onnxruntime
+except ImportError:  # pragma: no cover - depends on the environment
+    onnxruntime = None
+
+
+# Artifact formats by file extension
+ARTIFACT_FORMATS = {".ts": "torchscript", ".pt2": "export", ".onnx": "onnx"}
+
+# Graph modes an artifact can be built for (see terravit_model.INFERENCE_MODES)
+ARTIFACT_MODES = ("encoder", "linear")
+
+# patches [B, num_patches, io_dim] -> (logits [B, io_dim], encoder tokens [B, num_patches, encoder_dim])
+ArtifactFn = Callable[[torch.Tensor], Tuple[torch.Tensor, torch.Tensor]]
+
+
+class InferenceGraph(nn.Module):
+    """The masking-free inference path of SatViT for one mode, as a traceable module.
+
+    ``forward(patches)`` returns pooled logits [B, io_dim] and the encoder
+    tokens [B, num_patches, encoder_dim] (for embeddings and change maps).
+    """
+
+    def __init__(self, model: SatViT, mode: str = "encoder") -> None:
+        super().__init__()
+        if mode not in ARTIFACT_MODES:
+            raise ValueError(f"Unknown artifact mode '{mode}'; expected one of {', '.join(ARTIFACT_MODES)}")
+        self.model = model
+        self.blocks = mode == "encoder"
+
+    def forward(self, patches: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        latent = self.model.encode(patches)
+        return self.model.decode(latent, pool=True, blocks=self.blocks), latent
+
+
+def artifact_format(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in ARTIFACT_FORMATS:
+        raise ValueError(f"Unknown artifact extension '{ext}'; expected one of {', '.join(ARTIFACT_FORMATS)}")
+    return ARTIFACT_FORMATS[ext]
+
+
+def metadata_path(path: str) -> str:
+    """Sidecar JSON written next to an artifact with the model configuration it was built for."""
+    return f"{path}.json"
+
+
+def save_metadata(path: str, metadata: Dict[str, Any]) -> None:
+    with open(metadata_path(path), "w", encoding="utf-8") as f:
+        json.dump(metadata, f, indent=2)
+
+
+def load_metadata(path: str) -> Dict[str, Any]:
+    try:
+        with open(metadata_path(path), encoding="utf-8") as f:
+            return json.load(f)
+    except OSError as exc:
+        raise RuntimeError(f"Artifact metadata not found at '{metadata_path(path)}'; re-run export_model.py") from exc
+
+
+def export_artifact(graph: InferenceGraph, example: torch.Tensor, path: str) -> None:
+    """Export ``graph`` to ``path`` in the format given by its extension, with a dynamic batch dimension.
+
+    ``example`` is a patch batch [B, num_patches, io_dim] with B >= 2 (a
+    batch of 1 would be specialized by torch.export).
+    """
+    fmt = artifact_format(path)
+    graph.eval()
+    with torch.no_grad():
+        if fmt == "torchscript":
+            traced = torch.jit.freeze(torch.jit.trace(graph, (example,)))
+            torch.jit.save(traced, path)
+        elif fmt == "export":
+            batch = torch.export.Dim("batch", min=1, max=1024)
+            program = torch.export.export(graph, (example,), dynamic_shapes={"patches": {0: batch}})
+            torch.export.save(program, path)
+        else:
+            torch.onnx.export(
+                graph,
+                (example,),
+                path,
+                input_names=["patches"],
+                output_names=["logits", "tokens"],
+                dynamic_axes={"patches": {0: "batch"}, "logits": {0: "batch"}, "tokens": {0: "batch"}},
+            )
+
+
+def load_artifact(path: str, device: torch.device) -> ArtifactFn:
+    """Load an exported inference graph as a callable patches -> (logits, tokens)."""
+    fmt = artifact_format(path)
+    if not os.path.exists(path):
+        raise RuntimeError(f"Model artifact not found at '{path}'")
+
+    if fmt == "torchscript":
+        module = torch.jit.load(path, map_location=device)
+        module.eval()
+        return module
+
+    if fmt == "export":
+        module = torch.export.load(path).module()
+        module.to(device)
+        return module
+
+    if onnxruntime is None:
+        raise RuntimeError("Serving ONNX artifacts requires the optional onnxruntime package")
+    providers = ["CUDAExecutionProvider", "CPUExecutionProvider"] if device.type == "cuda" else ["CPUExecutionProvider"]
+    session = onnxruntime.InferenceSession(path, providers=providers)
+
+    def run(patches: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        logits, tokens = session.run(None, {"patches": np.ascontiguousarray(patches.detach().cpu().numpy())})
+        return torch.from_numpy(logits).to(device), torch.from_numpy(tokens).to(device)
+
+    return run
@@ -0,0 +1,161 @@
+import os
+import threading
+import time
+import warnings
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from terravit_model import SATVIT_CONFIGS, TerraViTModel, infer_version, terravit_model
+
+
+def parse_model_specs(value: str) -> List[Tuple[str, str, Optional[str]]]:
+    """Parse TERRAVIT_MODELS, e.g. ``"v1=SatViT_V1.pt:V1,v2-int8=SatViT_V2.pt"``, into (name, path, version).
+
+    The version (a SATVIT_CONFIGS key) is optional; without it, it is
+    inferred from the file name.
+    """
+    specs = []
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        name, sep, target = entry.partition("=")
+        if not sep or not name or not target:
+            raise ValueError(f"Invalid TERRAVIT_MODELS entry '{entry}'; expected name=path[:version]")
+        path, version = target, None
+        head, _, tail = target.rpartition(":")
+        if head and tail in SATVIT_CONFIGS:
+            path, version = head, tail
+        specs.append((name.strip(), path.strip(), version))
+    return specs
+
+
+class ModelRegistry:
+    """Named SatViT models, loaded on first use and evicted least-recently-used under a memory budget.
+
+    The default model is the module-level ``terravit_model`` (configured by
+    TERRAVIT_WEIGHTS_PATH and friends); it is pinned and never evicted.
+    Other models come from ``specs``. After a model loads, resident models
+    are evicted, oldest use first, until their total ``memory_bytes`` fits
+    ``memory_budget_bytes`` (0 means no limit). Eviction only drops the
+    registry's reference: requests still running on an evicted model finish
+    on it, and its memory is freed once they do.
+    """
+
+    def __init__(
+        self,
+        default_name: str = "default",
+        specs: Optional[List[Tuple[str, str, Optional[str]]]] = None,
+        memory_budget_bytes: int = 0,
+    ) -> None:
+        self.default_name = default_name
+        self.memory_budget_bytes = memory_budget_bytes
+
+        self._specs: Dict[str, Tuple[str, str]] = {}
+        for name, path, version in specs or []:
+            if name == default_name or name in self._specs:
+                raise ValueError(f"Duplicate model name '{name}'")
+            if version is not None and version not in SATVIT_CONFIGS:
+                raise ValueError(f"Unknown SatViT version '{version}' for model '{name}'")
+            # Resolved now, so TERRAVIT_MODEL_VERSION (meant for the default model) never applies to these
+            self._specs[name] = (path, version or infer_version(path))
+
+        self._lock = threading.Lock()
+        self._models: Dict[str, TerraViTModel] = {default_name: terravit_model}
+        self._resident: "OrderedDict[str, float]" = OrderedDict()  # name -> last use, least recent first
+        self._loads = 0
+        self._evictions = 0
+
+    @classmethod
+    def from_env(cls) -> "ModelRegistry":
+        return cls(
+            default_name=os.getenv("TERRAVIT_DEFAULT_MODEL", "default"),
+            specs=parse_model_specs(os.getenv("TERRAVIT_MODELS", "")),
+            memory_budget_bytes=int(float(os.getenv("TERRAVIT_MODEL_MEMORY_BUDGET_MB", "0")) * 1024 * 1024),
+        )
+
+    @property
+    def names(self) -> List[str]:
+        return [self.default_name, *self._specs]
+
+    def resolve(self, name: Optional[str]) -> str:
+        """Validated model name (None means the default); raises ValueError for an unknown one."""
+        if name is None:
+            return self.default_name
+        if name != self.default_name and name not in self._specs:
+            raise ValueError(f"Unknown model '{name}'; expected one of {', '.join(self.names)}")
+        return name
+
+    def model(self, name: Optional[str] = None) -> TerraViTModel:
+        """The model registered as ``name``, without loading it (e.g. for weights_id)."""
+        name = self.resolve(name)
+        with self._lock:
+            model = self._models.get(name)
+            if model is None:
+                path, version = self._specs[name]
+                # Extra models never pick up TERRAVIT_MODEL_ARTIFACT, which is built for the default weights
+                model = TerraViTModel(weights_path=path, version=version, artifact_path="")
+                self._models[name] = model
+            return model
+
+    def get(self, name: Optional[str] = None) -> TerraViTModel:
+        """The loaded model registered as ``name``, loading it (and evicting others) if needed."""
+        name = self.resolve(name)
+        model = self.model(name)
+        loaded = model.is_loaded
+        if not loaded:
+            # Outside the registry lock, so resident models stay usable during a load
+            model.load()
+        with self._lock:
+            self._resident[name] = time.time()
+            self._resident.move_to_end(name)
+            if not loaded:
+                self._loads += 1
+                self._evict(keep=name)
+        return model
+
+    def _evict(self, keep: str) -> None:
+        if self.memory_budget_bytes <= 0:
+            return
+        # Every loaded model counts, including a default loaded at startup without going through get()
+        total = sum(model.memory_bytes for model in self._models.values() if model.is_loaded)
+        for name in list(self._resident):
+            if total <= self.memory_budget_bytes:
+                break
+            if name in (keep, self.default_name):
+                continue
+            total -= self._models[name].memory_bytes
+            del self._resident[name]
+            del self._models[name]  # a fresh, unloaded instance is created on next use
+            self._evictions += 1
+        if total > self.memory_budget_bytes:
+            warnings.warn(
+                f"Resident models use {total / 2**20:.0f} MiB, over TERRAVIT_MODEL_MEMORY_BUDGET_MB "
+                f"({self.memory_budget_bytes / 2**20:.0f} MiB), with nothing left to evict"
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            models = []
+            for name in self.names:
+                model = self._models.get(name)
+                resident = model is not None and model.is_loaded
+                if model is not None:
+                    path, version = model.weights_path, model.version
+                else:
+                    path, version = self._specs[name]
+                models.append({
+                    "name": name,
+                    "default": name == self.default_name,
+                    "weights": path,
+                    "version": version,
+                    "resident": resident,
+                    "memory_mb": model.memory_bytes / 2**20 if resident else 0.0,
+                    "last_used": self._resident.get(name),
+                })
+            return {
+                "models": models,
+                "memory_budget_mb": self.memory_budget_bytes / 2**20,
+                "loads": self._loads,
+                "evictions": self._evictions,
+            }
+
+
+model_registry = ModelRegistry.from_env()
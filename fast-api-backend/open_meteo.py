@@ -0,0 +1,292 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Awaitable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import httpx
+
+from forecast_cache import ForecastCache
+from telemetry import UPSTREAM_ERRORS, UPSTREAM_SECONDS
+
+
+# Base URLs are configurable so tests and benchmarks can point at a local stub server
+FORECAST_URL = os.getenv("TERRAVIT_OPEN_METEO_FORECAST_URL", "https://api.open-meteo.com/v1/forecast")
+ARCHIVE_URL = os.getenv("TERRAVIT_OPEN_METEO_ARCHIVE_URL", "https://archive-api.open-meteo.com/v1/era5")
+
+FORECAST_HOURLY = "temperature_2m,precipitation,relativehumidity_2m"
+ERA5_DAILY = "temperature_2m_max,precipitation_sum,relative_humidity_2m_mean"
+
+# ERA5 trails real time by about five days, so the last days of a year that just ended are still null
+ERA5_LAG_DAYS = 5
+
+
+def era5_series_complete(data: Dict[str, Any]) -> bool:
+    """Whether every daily ERA5 variable in a response has a value for every day."""
+    daily = data.get("daily") or {}
+    series = [daily.get(name) for name in ERA5_DAILY.split(",")]
+    return all(values and all(v is not None for v in values) for values in series)
+
+
+class Era5Cache:
+    """Persistent SQLite cache of ERA5 yearly responses keyed by rounded lat/lon and year.
+
+    Only final years are stored (see :meth:`OpenMeteoClient.era5_is_final`),
+    since their reanalysis data no longer changes.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS era5_year ("
+                " lat REAL NOT NULL, lon REAL NOT NULL, year INTEGER NOT NULL, data TEXT NOT NULL,"
+                " PRIMARY KEY (lat, lon, year))"
+            )
+
+    def get(self, lat: float, lon: float, year: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM era5_year WHERE lat = ? AND lon = ? AND year = ?", (lat, lon, year)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, lat: float, lon: float, year: int, data: Dict[str, Any]) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO era5_year (lat, lon, year, data) VALUES (?, ?, ?, ?)",
+                (lat, lon, year, json.dumps(data)),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class OpenMeteoClient:
+    """App-lifetime Open-Meteo client with connection pooling, keep-alive and an ERA5 cache.
+
+    One ``httpx.AsyncClient`` is shared by all requests so TCP/TLS connections
+    are reused. Yearly ERA5 fetches run concurrently, bounded by
+    ``concurrency``; coordinates are rounded to ``precision`` decimals so
+    nearby requests share cache entries.
+    """
+
+    def __init__(
+        self,
+        forecast_url: str = FORECAST_URL,
+        archive_url: str = ARCHIVE_URL,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 30.0,
+        concurrency: int = 4,
+        precision: int = 2,
+        cache_path: Optional[str] = None,
+        locations_per_request: int = 100,
+        forecast_cache: Optional[ForecastCache] = None,
+        era5_lag_days: int = ERA5_LAG_DAYS,
+    ) -> None:
+        self.forecast_url = forecast_url
+        self.archive_url = archive_url
+        self.concurrency = concurrency
+        self.locations_per_request = locations_per_request
+        self.precision = precision
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+        self._cache = Era5Cache(cache_path) if cache_path else None
+        self.forecast_cache = forecast_cache
+        self.era5_lag_days = era5_lag_days
+
+    @classmethod
+    def from_env(cls) -> "OpenMeteoClient":
+        return cls(
+            max_connections=int(os.getenv("TERRAVIT_HTTP_MAX_CONNECTIONS", "20")),
+            max_keepalive_connections=int(os.getenv("TERRAVIT_HTTP_MAX_KEEPALIVE", "10")),
+            concurrency=int(os.getenv("TERRAVIT_ERA5_CONCURRENCY", "4")),
+            precision=int(os.getenv("TERRAVIT_ERA5_CACHE_PRECISION", "2")),
+            cache_path=os.getenv("TERRAVIT_ERA5_CACHE_PATH", "era5_cache.sqlite3") or None,
+            locations_per_request=int(os.getenv("TERRAVIT_OPEN_METEO_LOCATIONS_PER_REQUEST", "100")),
+            forecast_cache=ForecastCache.from_env(),
+            era5_lag_days=int(os.getenv("TERRAVIT_ERA5_LAG_DAYS", str(ERA5_LAG_DAYS))),
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(limits=self._limits, timeout=10.0)
+        return self._client
+
+    async def aclose(self) -> None:
+        """Close pooled connections; the client reopens lazily on next use."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self.forecast_cache is not None:
+            await self.forecast_cache.aclose()
+
+    def round_coord(self, value: float) -> float:
+        return round(value, self.precision)
+
+    async def _get_json(self, endpoint: str, url: str, params: Dict[str, Any], timeout: float) -> Any:
+        """GET ``url`` and decode the JSON body, recording latency and failures per ``endpoint``."""
+        started = time.perf_counter()
+        try:
+            resp = await self.client.get(url, params=params, timeout=timeout)
+            resp.raise_for_status()
+            return resp.json()
+        except httpx.HTTPStatusError as exc:
+            UPSTREAM_ERRORS.inc(service="open-meteo", endpoint=endpoint, kind=str(exc.response.status_code))
+            raise
+        except (httpx.HTTPError, ValueError) as exc:
+            UPSTREAM_ERRORS.inc(service="open-meteo", endpoint=endpoint, kind=type(exc).__name__)
+            raise
+        finally:
+            UPSTREAM_SECONDS.observe(time.perf_counter() - started, service="open-meteo", endpoint=endpoint)
+
+    async def forecast(self, lat: float, lon: float, forecast_days: int = 1) -> Dict[str, Any]:
+        """Hourly forecast for one location; raises httpx.HTTPError on failure.
+
+        With a forecast cache, coordinates are rounded to the cache precision
+        and concurrent calls for the same cell and hour share one fetch.
+        """
+        if self.forecast_cache is None:
+            return await self._fetch_forecast(lat, lon, forecast_days)
+        cache = self.forecast_cache
+        lat, lon = cache.round_coord(lat), cache.round_coord(lon)
+        return await cache.get_or_fetch(
+            cache.key(lat, lon, forecast_days), lambda: self._fetch_forecast(lat, lon, forecast_days)
+        )
+
+    async def _fetch_forecast(self, lat: float, lon: float, forecast_days: int) -> Dict[str, Any]:
+        params = {
+            "latitude": lat,
+            "longitude": lon,
+            "hourly": FORECAST_HOURLY,
+            "forecast_days": forecast_days,
+        }
+        return await self._get_json("forecast", self.forecast_url, params, 10.0)
+
+    async def forecast_many(
+        self, lats: Sequence[float], lons: Sequence[float], forecast_days: int = 1
+    ) -> List[Dict[str, Any]]:
+        """Hourly forecasts for several locations in one multi-location request, in input order."""
+        params = {
+            "latitude": ",".join(str(lat) for lat in lats),
+            "longitude": ",".join(str(lon) for lon in lons),
+            "hourly": FORECAST_HOURLY,
+            "forecast_days": forecast_days,
+        }
+        data = await self._get_json("forecast_many", self.forecast_url, params, 20.0)
+        # A single location comes back as one object rather than a list
+        results = data if isinstance(data, list) else [data]
+        if len(results) != len(lats):
+            raise httpx.DecodingError(f"Expected {len(lats)} forecasts, got {len(results)}")
+        return results
+
+    async def forecast_chunks(
+        self, points: Sequence[Tuple[float, float]], forecast_days: int = 1
+    ) -> AsyncIterator[Tuple[List[int], Optional[List[Dict[str, Any]]]]]:
+        """Fetch forecasts for many (lat, lon) points, yielding ``(indices, forecasts)`` per chunk as it completes.
+
+        Points are grouped ``locations_per_request`` at a time into
+        multi-location requests, at most ``concurrency`` in flight. A failed
+        chunk yields ``None`` for its forecasts instead of raising. Points
+        already in the forecast cache are yielded first, without a request;
+        the rest go through :meth:`ForecastCache.get_or_fetch_many`, so they
+        use the shared backend and join (or are joined by) concurrent fetches
+        of the same cells.
+        """
+        cache = self.forecast_cache
+        if cache is not None:
+            points = [(cache.round_coord(lat), cache.round_coord(lon)) for lat, lon in points]
+            keys = [cache.key(lat, lon, forecast_days) for lat, lon in points]
+            cached = [cache.peek(key) for key in keys]
+            hits = [i for i, data in enumerate(cached) if data is not None]
+            if hits:
+                yield hits, [cached[i] for i in hits]
+            missing = [i for i, data in enumerate(cached) if data is None]
+        else:
+            missing = list(range(len(points)))
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        step = max(1, self.locations_per_request)
+
+        def fetch_points(indices: List[int]) -> Awaitable[List[Dict[str, Any]]]:
+            return self.forecast_many([points[i][0] for i in indices], [points[i][1] for i in indices], forecast_days)
+
+        async def fetch(indices: List[int]) -> Tuple[List[int], Optional[List[Dict[str, Any]]]]:
+            async with semaphore:
+                try:
+                    if cache is None:
+                        forecasts = await fetch_points(indices)
+                    else:
+                        forecasts = await cache.get_or_fetch_many(
+                            [keys[i] for i in indices],
+                            lambda positions: fetch_points([indices[p] for p in positions]),
+                        )
+                except httpx.HTTPError:
+                    return indices, None
+            return indices, forecasts
+
+        tasks = [asyncio.ensure_future(fetch(missing[start : start + step])) for start in range(0, len(missing), step)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # The consumer may stop early (e.g. a client disconnect)
+            for task in tasks:
+                task.cancel()
+
+    async def era5_year(self, lat: float, lon: float, year: int) -> Dict[str, Any]:
+        """Daily ERA5 aggregates for one calendar year; raises httpx.HTTPError on failure."""
+        lat, lon = self.round_coord(lat), self.round_coord(lon)
+        if self._cache is not None:
+            cached = self._cache.get(lat, lon, year)
+            if cached is not None:
+                return cached
+
+        params = {
+            "latitude": lat,
+            "longitude": lon,
+            "start_date": f"{year}-01-01",
+            "end_date": f"{year}-12-31",
+            "daily": ERA5_DAILY,
+        }
+        data = await self._get_json("era5", self.archive_url, params, 20.0)
+
+        if self._cache is not None and self.era5_is_final(year, data):
+            self._cache.put(lat, lon, year, data)
+        return data
+
+    def era5_is_final(self, year: int, data: Dict[str, Any], now: Optional[datetime] = None) -> bool:
+        """Whether a yearly ERA5 response will not change: the year has ended and either it ended more than
+        ``era5_lag_days`` ago or its daily series has no missing days."""
+        now = now or datetime.now(timezone.utc)
+        if year >= now.year:
+            return False
+        year_end = datetime(year + 1, 1, 1, tzinfo=timezone.utc)
+        return now - year_end > timedelta(days=self.era5_lag_days) or era5_series_complete(data)
+
+    async def era5_years(self, lat: float, lon: float, years: Iterable[int]) -> Dict[int, Optional[Dict[str, Any]]]:
+        """Fetch several ERA5 years concurrently; failed years map to None."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(year: int) -> Optional[Dict[str, Any]]:
+            async with semaphore:
+                try:
+                    return await self.era5_year(lat, lon, year)
+                except httpx.HTTPError:
+                    return None
+
+        years = list(years)
+        results = await asyncio.gather(*(fetch(year) for year in years))
+        return dict(zip(years, results))
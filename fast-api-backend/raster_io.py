@@ -0,0 +1,250 @@
+import os
+import struct
+import tempfile
+import zipfile
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+try:  # Optional: windowed, memory-mapped GeoTIFF reads
+    import tifffile
+except ImportError:  # pragma: no cover - depends on the environment
+    tifffile = None
+
+
+RASTER_EXTENSIONS = (".npy", ".npz", ".tif", ".tiff")
+
+# Arrays with at most this many entries on an axis are treated as having bands on that axis
+MAX_BANDS = 64
+
+
+class BandStack:
+    """Lazily readable multi-band raster exposed as (bands, height, width).
+
+    Bands are backed by memory-mapped arrays where the file format allows it,
+    so :meth:`read_window` only touches the pages under the requested window.
+    Bands that cannot be mapped (compressed members/pages) are decoded on
+    first access, one band at a time, and spilled to an uncompressed
+    temporary file that is mapped in turn, so at most one decoded band is
+    ever held in memory. :meth:`close` (or leaving a ``with`` block) drops
+    the mappings and deletes the temporary files.
+    """
+
+    def __init__(
+        self,
+        bands: Sequence[Callable[[], np.ndarray]],
+        height: int,
+        width: int,
+        spill_paths: Sequence[str] = (),
+    ) -> None:
+        self._loaders: List[Optional[Callable[[], np.ndarray]]] = list(bands)
+        self._bands: List[Optional[np.ndarray]] = [None] * len(self._loaders)
+        self._spill_paths = list(spill_paths)
+        self.height = height
+        self.width = width
+
+    def __enter__(self) -> "BandStack":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    @property
+    def num_bands(self) -> int:
+        return len(self._bands)
+
+    def band(self, index: int) -> np.ndarray:
+        array = self._bands[index]
+        if array is None:
+            loader = self._loaders[index]
+            if loader is None:
+                raise ValueError("Raster is closed.")
+            array = loader()
+            if array.shape != (self.height, self.width):
+                raise ValueError(f"Band {index} has shape {array.shape}, expected {(self.height, self.width)}")
+            if not isinstance(array, np.memmap):
+                array, path = _spill(array)
+                self._spill_paths.append(path)
+            self._bands[index] = array
+            self._loaders[index] = None  # releases anything the loader kept alive
+        return array
+
+    def close(self) -> None:
+        self._bands = [None] * len(self._bands)
+        self._loaders = [None] * len(self._loaders)
+        for path in self._spill_paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._spill_paths = []
+
+    def read_window(self, x: int, y: int, size: int) -> np.ndarray:
+        """Read a ``size`` x ``size`` window at (x, y) as float32 [bands, size, size], zero padded at the edges."""
+        out = np.zeros((self.num_bands, size, size), dtype=np.float32)
+        x1, y1 = min(x + size, self.width), min(y + size, self.height)
+        if x1 > x and y1 > y:
+            for index in range(self.num_bands):
+                out[index, : y1 - y, : x1 - x] = self.band(index)[y:y1, x:x1]
+        return out
+
+
+def _spill(array: np.ndarray) -> Tuple[np.memmap, str]:
+    """Write a decoded array to a temporary .npy file and return a read-only mapping of it, with its path."""
+    fd, path = tempfile.mkstemp(prefix="terravit-raster-", suffix=".npy")
+    os.close(fd)
+    try:
+        mapped = np.lib.format.open_memmap(path, mode="w+", dtype=array.dtype, shape=array.shape)
+        mapped[...] = array
+        mapped.flush()
+        del mapped
+        return np.load(path, mmap_mode="r"), path
+    except BaseException:
+        os.remove(path)
+        raise
+
+
+def _from_array(array: np.ndarray) -> BandStack:
+    """Wrap a 2D band or a 3D band stack in either (bands, H, W) or (H, W, bands) layout.
+
+    An array already decoded into memory is spilled to a temporary mapped
+    file first, so the stack does not pin the whole decoded raster.
+    """
+    if array.ndim not in (2, 3):
+        raise ValueError(f"Expected a 2D band or 3D band stack, got shape {array.shape}")
+    spill_paths = []
+    if not isinstance(array, np.memmap):
+        array, path = _spill(array)
+        spill_paths.append(path)
+    if array.ndim == 2:
+        array = array[np.newaxis]
+    elif array.shape[-1] <= MAX_BANDS < array.shape[0]:
+        # (H, W, bands): a transposed view of the memmap, nothing is copied
+        array = np.moveaxis(array, -1, 0)
+
+    return BandStack(
+        [lambda i=i: array[i] for i in range(array.shape[0])], array.shape[1], array.shape[2], spill_paths
+    )
+
+
+def _from_bands(bands: Sequence[Callable[[], np.ndarray]], shape: Sequence[int]) -> BandStack:
+    return BandStack(bands, int(shape[0]), int(shape[1]))
+
+
+def _npz_member_memmap(path: str, info: zipfile.ZipInfo) -> Optional[np.ndarray]:
+    """Memory-map an uncompressed .npy member of an .npz in place, or None if it is compressed."""
+    if info.compress_type != zipfile.ZIP_STORED:
+        return None
+    with open(path, "rb") as f:
+        # Local file header: fixed 30 bytes, then file name and extra field
+        f.seek(info.header_offset)
+        header = f.read(30)
+        name_len, extra_len = struct.unpack("<HH", header[26:30])
+        f.seek(info.header_offset + 30 + name_len + extra_len)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        if dtype.hasobject:
+            return None
+        offset = f.tell()
+    return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=shape, order="F" if fortran_order else "C")
+
+
+def _open_npz(path: str) -> BandStack:
+    with zipfile.ZipFile(path) as zf:
+        infos = [info for info in zf.infolist() if info.filename.endswith(".npy")]
+    if not infos:
+        raise ValueError("No arrays found in .npz file.")
+
+    def loader(info: zipfile.ZipInfo) -> Callable[[], np.ndarray]:
+        def load() -> np.ndarray:
+            mapped = _npz_member_memmap(path, info)
+            if mapped is not None:
+                return mapped
+            with np.load(path) as data:
+                return data[info.filename[: -len(".npy")]]
+
+        return load
+
+    if len(infos) == 1:
+        # A single stacked array
+        return _from_array(loader(infos[0])())
+
+    # One 2D array per band, in archive order; only the first is read up front for its shape
+    first = loader(infos[0])()
+    return _from_bands([lambda a=first: a] + [loader(info) for info in infos[1:]], first.shape)
+
+
+def _open_tiff(path: str) -> BandStack:
+    if tifffile is not None:
+        try:
+            # Uncompressed, contiguous data maps directly
+            return _from_array(tifffile.memmap(path, mode="r"))
+        except ValueError:
+            pass
+        with tifffile.TiffFile(path) as tif:
+            series = tif.series[0]
+            if len(series.shape) == 2 or len(tif.pages) == 1:
+                return _from_array(series.asarray())
+            shape = tif.pages[0].shape
+
+        def page_loader(index: int) -> Callable[[], np.ndarray]:
+            def load() -> np.ndarray:
+                return tifffile.imread(path, key=index)
+
+            return load
+
+        return _from_bands([page_loader(i) for i in range(len(tif.pages))], shape)
+
+    # Pillow fallback: one band per page, each decoded on first use
+    with Image.open(path) as img:
+        num_pages = getattr(img, "n_frames", 1)
+        width, height = img.size
+
+    def pil_loader(index: int) -> Callable[[], np.ndarray]:
+        def load() -> np.ndarray:
+            with Image.open(path) as img:
+                img.seek(index)
+                return np.asarray(img)
+
+        return load
+
+    if num_pages == 1:
+        array = pil_loader(0)()
+        return _from_array(array)
+    return _from_bands([pil_loader(i) for i in range(num_pages)], (height, width))
+
+
+def standardize_bands(bands: np.ndarray, eps: float = 1e-6) -> np.ndarray:
+    """Standardize a [bands, H, W] float32 window to zero mean / unit variance per band, in place."""
+    flat = bands.reshape(bands.shape[0], -1)
+    mean = flat.mean(axis=1, keepdims=True)
+    std = flat.std(axis=1, keepdims=True)
+    flat -= mean
+    flat /= std + eps
+    return bands
+
+
+def open_raster(path: str, filename: Optional[str] = None) -> BandStack:
+    """Open a multi-band raster (.npy, .npz band stack or multi-page/multi-sample TIFF) lazily.
+
+    ``filename`` (e.g. the original upload name) decides the format when
+    ``path`` is a temporary file. Raises ValueError for unsupported or
+    unreadable files.
+    """
+    ext = os.path.splitext(filename or path)[1].lower()
+    try:
+        if ext == ".npy":
+            return _from_array(np.load(path, mmap_mode="r", allow_pickle=False))
+        if ext == ".npz":
+            return _open_npz(path)
+        if ext in (".tif", ".tiff"):
+            return _open_tiff(path)
+    except ValueError:
+        raise
+    except Exception as exc:  # noqa: BLE001
+        raise ValueError(f"Could not read raster file: {exc}") from exc
+    raise ValueError(f"Unsupported raster format '{ext}'; expected one of {', '.join(RASTER_EXTENSIONS)}")
@@ -0,0 +1,129 @@
+import json
+import struct
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+try:  # Optional: msgpack responses
+    import msgpack
+except ImportError:  # pragma: no cover - depends on the environment
+    msgpack = None
+
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+PACKED_MEDIA_TYPE = "application/vnd.terravit.packed"
+
+# Response formats, by ?format= name:
+# - "json": the response model as JSON (default).
+# - "packed": little-endian u32 header length, a JSON header with the scalar fields and an "arrays" table of
+#   {dtype, offset, length} per vector field, then the raw little-endian arrays (offsets are relative to the
+#   first array byte, which is 8-byte aligned). See decode_packed().
+# - "msgpack": the scalar fields plus "arrays": {name: {dtype, data}} with data as raw little-endian bytes.
+#   Needs the optional msgpack package.
+RESPONSE_FORMATS = ("json", "packed", "msgpack")
+ARRAY_DTYPES = ("float16", "float32")
+
+_MEDIA_TYPES = {
+    JSON_MEDIA_TYPE: "json",
+    "application/*": "json",
+    "*/*": "json",
+    MSGPACK_MEDIA_TYPE: "msgpack",
+    "application/x-msgpack": "msgpack",
+    PACKED_MEDIA_TYPE: "packed",
+}
+
+
+def negotiate_format(accept: Optional[str], requested: Optional[str] = None) -> str:
+    """Pick a response format from an explicit ``requested`` name, else the Accept header (by q-value).
+
+    Falls back to JSON when nothing acceptable is listed. Raises ValueError
+    for an unknown format or msgpack without the msgpack package.
+    """
+    fmt = requested
+    if fmt is None:
+        fmt = "json"
+        best = 0.0
+        for part in (accept or "").split(","):
+            media_type, *params = [p.strip() for p in part.split(";")]
+            q = 1.0
+            for param in params:
+                if param.startswith("q="):
+                    try:
+                        q = float(param[2:])
+                    except ValueError:
+                        q = 0.0
+            candidate = _MEDIA_TYPES.get(media_type.lower())
+            if candidate is not None and q > best:
+                fmt, best = candidate, q
+
+    if fmt not in RESPONSE_FORMATS:
+        raise ValueError(f"Unknown response format '{fmt}'; expected one of {', '.join(RESPONSE_FORMATS)}")
+    if fmt == "msgpack" and msgpack is None:
+        raise ValueError("msgpack responses require the optional msgpack package")
+    return fmt
+
+
+def _split_arrays(
+    model: BaseModel,
+    array_fields: Sequence[str],
+    dtype: str,
+) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    if dtype not in ARRAY_DTYPES:
+        raise ValueError(f"Unknown array dtype '{dtype}'; expected one of {', '.join(ARRAY_DTYPES)}")
+    fields = model.model_dump(mode="json")
+    arrays = {}
+    for name in array_fields:
+        values = fields.pop(name, None)
+        if values is not None:
+            arrays[name] = np.asarray(values, dtype="<f2" if dtype == "float16" else "<f4")
+    return fields, arrays
+
+
+def encode_packed(model: BaseModel, array_fields: Sequence[str], dtype: str = "float32") -> bytes:
+    fields, arrays = _split_arrays(model, array_fields, dtype)
+    table = {}
+    offset = 0
+    for name, values in arrays.items():
+        table[name] = {"dtype": dtype, "offset": offset, "length": int(values.size)}
+        offset += values.nbytes
+
+    header = json.dumps({**fields, "arrays": table}, separators=(",", ":")).encode()
+    header += b" " * (-(4 + len(header)) % 8)  # align the arrays for zero-copy np.frombuffer
+    return b"".join([struct.pack("<I", len(header)), header, *(values.tobytes() for values in arrays.values())])
+
+
+def decode_packed(body: bytes) -> Dict[str, Any]:
+    """Client-side inverse of the "packed" format: the scalar fields plus one NumPy array per vector field."""
+    (header_len,) = struct.unpack_from("<I", body)
+    header = json.loads(body[4 : 4 + header_len])
+    start = 4 + header_len
+    for name, spec in header.pop("arrays").items():
+        dtype = "<f2" if spec["dtype"] == "float16" else "<f4"
+        header[name] = np.frombuffer(body, dtype=dtype, count=spec["length"], offset=start + spec["offset"])
+    return header
+
+
+def encode_response(
+    model: BaseModel,
+    fmt: str = "json",
+    array_fields: Sequence[str] = (),
+    dtype: str = "float32",
+) -> Response:
+    """Serialize a response model in ``fmt`` (see RESPONSE_FORMATS).
+
+    JSON goes straight through pydantic's serializer, skipping FastAPI's
+    validate-then-encode pass over models the endpoint already built.
+    ``array_fields`` are the float vectors packed as ``dtype`` in the binary
+    formats.
+    """
+    if fmt == "json":
+        return Response(model.model_dump_json(), media_type=JSON_MEDIA_TYPE)
+    if fmt == "packed":
+        return Response(encode_packed(model, array_fields, dtype), media_type=PACKED_MEDIA_TYPE)
+
+    fields, arrays = _split_arrays(model, array_fields, dtype)
+    fields["arrays"] = {name: {"dtype": dtype, "data": values.tobytes()} for name, values in arrays.items()}
+    return Response(msgpack.packb(fields, use_bin_type=True), media_type=MSGPACK_MEDIA_TYPE)
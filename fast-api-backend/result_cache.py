@@ -0,0 +1,215 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import torch
+
+
+@dataclass
+class CachedResult:
+    """Per-image model outputs worth keeping: logits [io_dim] and pooled embedding [encoder_dim]."""
+
+    logits: torch.Tensor
+    embedding: Optional[torch.Tensor] = None
+    stats: Optional[Dict[str, Any]] = None  # "adaptive" mode encoder stats (tokens kept, layers run)
+
+
+class ResultCache:
+    """LRU cache of per-image model outputs with size and TTL bounds.
+
+    Keys are content addresses built by :meth:`key` from the decoded pixels,
+    the model weights identity and the inference mode (with the settings
+    that change its outputs, see TerraViTModel.mode_id), so resubmitted tiles
+    skip inference no matter how they were re-encoded. With ``disk_dir`` set,
+    entries are also written as ``.npz`` files and reloaded on a memory miss,
+    so the cache survives restarts. ``get``/``put`` cover both tiers; async
+    callers use the ``*_memory`` halves inline and run the ``*_disk`` halves
+    in a thread, since those do blocking file I/O.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_s: float = 3600.0,
+        disk_dir: Optional[str] = None,
+        max_disk_entries: int = 100_000,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.disk_dir = disk_dir
+        self.max_disk_entries = max_disk_entries
+
+        self._entries: "OrderedDict[str, Tuple[float, CachedResult]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_writes = 0
+
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> "ResultCache":
+        return cls(
+            max_entries=int(os.getenv("TERRAVIT_CACHE_SIZE", "1024")),
+            ttl_s=float(os.getenv("TERRAVIT_CACHE_TTL_S", "3600")),
+            disk_dir=os.getenv("TERRAVIT_CACHE_DIR") or None,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def key(weights_id: str, mode: str, pixel_digest: str) -> str:
+        return hashlib.blake2b(f"{weights_id}:{mode}:{pixel_digest}".encode(), digest_size=20).hexdigest()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._hits + self._disk_hits + self._misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl_s,
+            "disk_enabled": self.disk_dir is not None,
+            "hits": self._hits,
+            "disk_hits": self._disk_hits,
+            "misses": self._misses,
+            "evictions": self._evictions,
+            "hit_rate": (self._hits + self._disk_hits) / lookups if lookups else 0.0,
+        }
+
+    @property
+    def disk_enabled(self) -> bool:
+        return self.enabled and self.disk_dir is not None
+
+    def get(self, key: str) -> Optional[CachedResult]:
+        result = self.get_memory(key)
+        return result if result is not None else self.get_disk(key)
+
+    def get_memory(self, key: str) -> Optional[CachedResult]:
+        """In-memory lookup only; a miss is counted by the :meth:`get_disk` call that must follow it."""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            created, result = entry
+            if time.time() - created <= self.ttl_s:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return result
+            del self._entries[key]
+            return None
+
+    def get_disk(self, key: str) -> Optional[CachedResult]:
+        """Disk lookup after a memory miss (blocking I/O); a hit is promoted into memory."""
+        if not self.enabled:
+            return None
+
+        loaded = self._disk_get(key, time.time())
+        with self._lock:
+            if loaded is None:
+                self._misses += 1
+                return None
+            self._disk_hits += 1
+            self._insert(key, loaded[0], loaded[1])
+        return loaded[1]
+
+    def put(self, key: str, result: CachedResult) -> None:
+        self.put_disk(key, self.put_memory(key, result))
+
+    def put_memory(self, key: str, result: CachedResult) -> CachedResult:
+        """Insert a detached CPU copy of ``result`` into memory and return it (for :meth:`put_disk`)."""
+        if not self.enabled:
+            return result
+        result = CachedResult(
+            logits=result.logits.detach().cpu(),
+            embedding=None if result.embedding is None else result.embedding.detach().cpu(),
+            stats=None if result.stats is None else dict(result.stats),
+        )
+        with self._lock:
+            self._insert(key, time.time(), result)
+        return result
+
+    def put_disk(self, key: str, result: CachedResult) -> None:
+        """Write ``result`` to the disk tier, if any (blocking I/O)."""
+        if self.disk_enabled:
+            self._disk_put(key, time.time(), result)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _insert(self, key: str, created: float, result: CachedResult) -> None:
+        self._entries[key] = (created, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def _disk_path(self, key: str) -> str:
+        assert self.disk_dir is not None
+        return os.path.join(self.disk_dir, f"{key}.npz")
+
+    def _disk_get(self, key: str, now: float) -> Optional[Tuple[float, CachedResult]]:
+        if self.disk_dir is None:
+            return None
+        path = self._disk_path(key)
+        try:
+            with np.load(path) as data:
+                created = float(data["created"])
+                if now - created > self.ttl_s:
+                    os.remove(path)
+                    return None
+                embedding = torch.from_numpy(data["embedding"]) if "embedding" in data.files else None
+                stats = json.loads(str(data["stats"])) if "stats" in data.files else None
+                return created, CachedResult(logits=torch.from_numpy(data["logits"]), embedding=embedding, stats=stats)
+        except (OSError, KeyError, ValueError):
+            # Missing, half-written or foreign file: treat as a miss
+            return None
+
+    def _disk_put(self, key: str, created: float, result: CachedResult) -> None:
+        if self.disk_dir is None:
+            return
+        arrays = {"created": np.float64(created), "logits": result.logits.numpy()}
+        if result.embedding is not None:
+            arrays["embedding"] = result.embedding.numpy()
+        if result.stats is not None:
+            arrays["stats"] = np.array(json.dumps(result.stats))
+
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(f, **arrays)
+            # Atomic so concurrent readers (or other workers) never see partial files
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+
+        self._disk_writes += 1
+        if self._disk_writes % 256 == 0:
+            self._prune_disk()
+
+    def _prune_disk(self) -> None:
+        assert self.disk_dir is not None
+        try:
+            paths = [os.path.join(self.disk_dir, name) for name in os.listdir(self.disk_dir) if name.endswith(".npz")]
+            if len(paths) <= self.max_disk_entries:
+                return
+            paths.sort(key=os.path.getmtime)
+            for path in paths[: len(paths) - self.max_disk_entries]:
+                os.remove(path)
+        except OSError:
+            pass
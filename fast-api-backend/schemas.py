@@ -1,6 +1,17 @@
-from typing import List, Optional
+from datetime import datetime
+from typing import Dict, List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+
+
+class InferenceStats(BaseModel):
+    """Encoder work for one image in the "adaptive" inference mode."""
+
+    tokens_kept: int  # active tokens in the last layer run
+    num_tokens: int
+    layers_run: int
+    num_layers: int
+    token_fraction: float  # token-layer evaluations relative to the full encoder
 
 
 class PredictionResponse(BaseModel):
@@ -8,12 +19,103 @@ class PredictionResponse(BaseModel):
     top_class_score: Optional[float] = None
     raw_scores: Optional[List[float]] = None
     raw_output: Optional[str] = None
+    class_indices: Optional[List[int]] = None  # with top_classes: the class of each raw_scores entry
+    inference_stats: Optional[InferenceStats] = None
+
+
+class BatchPredictionItem(PredictionResponse):
+    index: int  # position in the stream: uploaded files first, then archive members in archive order
+    filename: str
+    error: Optional[str] = None
+
+
+class PrecisionCheck(BaseModel):
+    precision: str
+    max_abs_logit_diff: float
+    max_rel_logit_diff: float  # relative to the largest |fp32 logit|
+    min_cosine_similarity: float
+    max_abs_prob_diff: float
+    top_class_match: bool
+    passed: bool
+
+
+class ModelInfo(BaseModel):
+    name: str
+    default: bool
+    weights: str
+    version: str  # SatViT architecture (terravit_model.SATVIT_CONFIGS key)
+    resident: bool
+    memory_mb: float  # parameter memory while resident, memory-mapped pages included
+    last_used: Optional[datetime] = None
+
+
+class ModelRegistryStats(BaseModel):
+    models: List[ModelInfo]
+    memory_budget_mb: float  # 0 means no limit
+    loads: int
+    evictions: int
 
 
 class HealthResponse(BaseModel):
     status: str
     model_loaded: bool
     device: str
+    precision: str = "fp32"
+    runtime: str = "eager"  # eager, compiled, or the exported artifact format
+    precision_check: Optional[PrecisionCheck] = None  # accuracy vs fp32, measured when the model loaded
+    models: List[ModelInfo] = []  # the default model and any from TERRAVIT_MODELS
+
+
+class BatcherStats(BaseModel):
+    queue_depth: int
+    max_batch_size: int
+    max_wait_ms: float
+    batches: int
+    items: int
+    last_batch_size: int
+    mean_batch_size: float
+    batch_size_histogram: Dict[str, int]
+
+
+class BatchingMetricsResponse(BaseModel):
+    batchers: Dict[str, BatcherStats]
+
+
+class ExecutorStats(BaseModel):
+    kind: str
+    max_workers: int
+    max_pending: int
+    pending: int
+    rejected: int
+    torch_threads: int
+    torch_interop_threads: int
+
+
+class CacheStats(BaseModel):
+    entries: int
+    max_entries: int
+    ttl_s: float
+    disk_enabled: bool
+    hits: int
+    disk_hits: int
+    misses: int
+    evictions: int
+    hit_rate: float
+
+
+class ForecastCacheStats(BaseModel):
+    entries: int
+    max_entries: int
+    ttl_s: float
+    shared_backend: Optional[str] = None
+    inflight: int
+    hits: int
+    shared_hits: int
+    coalesced: int  # callers that joined an in-flight fetch for the same key
+    misses: int
+    evictions: int
+    shared_errors: int
+    hit_rate: float
 
 
 class ClimateRiskRequest(BaseModel):
@@ -48,10 +150,201 @@ class ClimateRiskHistoryResponse(BaseModel):
     years: List[ClimateRiskHistoryYear]
 
 
+class ClimateRiskPoint(BaseModel):
+    lat: float = Field(..., ge=-90, le=90)
+    lon: float = Field(..., ge=-180, le=180)
+
+
+class ClimateRiskBoundingBox(BaseModel):
+    min_lat: float = Field(..., ge=-90, le=90)
+    min_lon: float = Field(..., ge=-180, le=180)
+    max_lat: float = Field(..., ge=-90, le=90)
+    max_lon: float = Field(..., ge=-180, le=180)
+    rows: int = Field(..., ge=1)
+    cols: int = Field(..., ge=1)
+
+
+class ClimateRiskBatchRequest(BaseModel):
+    points: List[ClimateRiskPoint] = []
+    bbox: Optional[ClimateRiskBoundingBox] = None  # scored at its rows x cols cell centres
+
+
+class ClimateRiskBatchItem(BaseModel):
+    index: int  # position in points, followed by the bbox cells in row-major order
+    lat: float
+    lon: float
+    scores: Optional[ClimateRiskScores] = None
+    summary: Optional[str] = None
+    error: Optional[str] = None
+
+
+class ChangeMap(BaseModel):
+    metric: str
+    format: str  # "png" (8-bit grayscale scaled to [min, max]) or "float16" (row-major little-endian)
+    height: int
+    width: int
+    min: float
+    max: float
+    data: str  # base64
+
+
+class ChangedRegion(BaseModel):
+    row: int
+    col: int
+    score: float
+    bbox: List[float]  # [x0, y0, x1, y1] as fractions of image width/height
+
+
 class ChangeDetectResponse(BaseModel):
     change_score: float
     class_scores_before: Optional[List[float]] = None
     class_scores_after: Optional[List[float]] = None
     per_class_change: Optional[List[float]] = None
+    class_indices: Optional[List[int]] = None  # with top_classes: the class of each vector entry, largest change first
     dominant_change_class_index: Optional[int] = None
+    change_map: Optional[ChangeMap] = None
+    changed_regions: Optional[List[ChangedRegion]] = None
+    inference_stats: Optional[List[InferenceStats]] = None  # [before, after] in "adaptive" mode
     summary: str
+
+
+class SeriesAcquisition(BaseModel):
+    index: int
+    digest: str  # pixel digest; an image already in the series is not appended again
+    label: str  # upload filename
+    added_at: datetime
+    encoded: bool  # encoded by this request (False: stored from an earlier call)
+    top_class_index: int
+
+
+class SeriesStep(BaseModel):
+    index: int  # acquisition index; the step compares it with acquisition index - 1
+    change_score: float  # mean per-patch token distance to the previous acquisition
+    cumulative_score: float  # mean per-patch token distance to the first acquisition
+    max_patch_change: float
+    class_change_score: float  # mean absolute class probability change, as in /change/detect
+
+
+class ChangeSeriesResponse(BaseModel):
+    site_id: Optional[str] = None
+    metric: str
+    grid: int  # patch grid side; trajectory column p is patch row p // grid, col p % grid
+    acquisitions: List[SeriesAcquisition]
+    steps: List[SeriesStep]
+    step_trajectories: Optional[ChangeMap] = None  # float16 [steps, num_patches]: distance to the previous acquisition
+    cumulative_trajectories: Optional[ChangeMap] = None  # float16 [steps, num_patches]: distance to the first
+    changed_regions: Optional[List[ChangedRegion]] = None  # most changed patches, first to latest acquisition
+    encoded: int
+    reused: int
+    summary: str
+
+
+class SiteStoreStats(BaseModel):
+    sites: int
+    max_sites: int
+    persistent: bool
+    hits: int
+    disk_hits: int
+    misses: int
+    acquisitions_encoded: int
+    acquisitions_reused: int
+
+
+class SceneTile(BaseModel):
+    row: int
+    col: int
+    bbox: List[int]  # [x0, y0, x1, y1] in scene pixels
+    top_class_index: Optional[int] = None
+    top_class_score: Optional[float] = None
+    change_score: Optional[float] = None
+    dominant_change_class_index: Optional[int] = None
+
+
+class TiledSceneResponse(BaseModel):
+    output: str  # "predict" or "change"
+    width: int
+    height: int
+    window: int
+    overlap: int
+    rows: int
+    cols: int
+    grid: List[List[float]]  # per-tile top class score (predict) or change score (change)
+    tiles: List[SceneTile]
+    summary: str
+
+
+class JobStatus(BaseModel):
+    id: str
+    kind: str  # "tiled" or "raster"
+    status: str  # queued, running, succeeded, failed, cancelled
+    priority: int
+    progress: float  # 0-1, from windows_done / windows_total
+    windows_done: int
+    windows_total: int
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    cancel_requested: bool = False
+    error: Optional[str] = None
+
+
+class JobListResponse(BaseModel):
+    jobs: List[JobStatus]
+
+
+class EmbeddingResponse(BaseModel):
+    id: str  # tile_id if given, otherwise a content address of the pixels, weights and mode
+    dim: int
+    format: str = "float16"  # row-major little-endian
+    data: str  # base64
+    norm: float  # L2 norm of the embedding
+    indexed: bool = False  # added to the vector index by this request (False if the id was already stored)
+
+
+class SimilarTile(BaseModel):
+    id: str
+    score: float  # cosine similarity to the query
+    filename: Optional[str] = None
+    added_at: Optional[datetime] = None
+
+
+class SimilarSearchResponse(BaseModel):
+    results: List[SimilarTile]
+    indexed_vectors: int
+    took_ms: float  # index search time, excluding inference on the query image
+
+
+class VectorIndexStats(BaseModel):
+    vectors: int
+    dim: Optional[int] = None
+    spaces: int = 0  # distinct embedding spaces (model weights + inference mode)
+    trained: bool
+    nlist: int
+    nprobe: int
+    persistent: bool
+    searches: int
+    avg_search_ms: float
+
+
+class JobStats(BaseModel):
+    workers: int
+    queued: int
+    running: int
+    succeeded: int
+    failed: int
+    cancelled: int
+
+
+class ProfilerTrace(BaseModel):
+    path: str
+    requests: int
+    duration_s: float
+    bytes: int
+
+
+class ProfilerStatus(BaseModel):
+    active: bool  # a capture is armed or recording
+    requested: int
+    remaining: int  # counted requests not yet finished
+    directory: str
+    last_trace: Optional[ProfilerTrace] = None
@@ -0,0 +1,241 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+
+from change_map import CHANGE_METRICS, patch_distances
+
+
+@dataclass
+class SiteSeries:
+    """One site's ordered acquisitions, reduced to what temporal change scoring needs.
+
+    Only the first ("baseline") and latest acquisitions keep their encoder
+    tokens [num_patches, encoder_dim] (as float16). Every later acquisition
+    adds one step: its per-patch distance to the previous acquisition
+    ("step") and to the baseline ("cumulative"), for each of CHANGE_METRICS.
+    A site thus holds two token sets plus O(steps * num_patches) floats, and
+    appending an acquisition only needs the new image's tokens.
+    """
+
+    weights_id: str
+    mode: str
+    digests: List[str] = field(default_factory=list)
+    labels: List[str] = field(default_factory=list)
+    added_at: List[float] = field(default_factory=list)
+    logits: List[torch.Tensor] = field(default_factory=list)  # [io_dim] per acquisition
+    baseline: Optional[torch.Tensor] = None
+    latest: Optional[torch.Tensor] = None
+    step: Dict[str, List[torch.Tensor]] = field(default_factory=lambda: {m: [] for m in CHANGE_METRICS})
+    cumulative: Dict[str, List[torch.Tensor]] = field(default_factory=lambda: {m: [] for m in CHANGE_METRICS})
+
+    def __len__(self) -> int:
+        return len(self.digests)
+
+    def append(
+        self,
+        digests: Sequence[str],
+        labels: Sequence[str],
+        logits: torch.Tensor,
+        tokens: torch.Tensor,
+    ) -> None:
+        """Append a batch of acquisitions, in order: logits [B, io_dim] and tokens [B, num_patches, encoder_dim]."""
+        # Round through float16 first so a site reloaded from disk scores exactly like the one in memory
+        tokens = tokens.detach().cpu().to(torch.float16)
+        chain = tokens if self.latest is None else torch.cat([self.latest[None], tokens])
+        first = tokens[0] if self.baseline is None else self.baseline
+
+        previous, current = chain[:-1].float(), chain[1:].float()
+        baseline = first.float().expand_as(current)
+        # All scoring before any mutation, so a failed append leaves the series unchanged
+        distances = {
+            metric: (patch_distances(previous, current, metric), patch_distances(baseline, current, metric))
+            for metric in CHANGE_METRICS
+        }
+
+        now = time.time()
+        for metric, (step, cumulative) in distances.items():
+            self.step[metric].extend(step.unbind(0))
+            self.cumulative[metric].extend(cumulative.unbind(0))
+        self.baseline = first.clone()
+        self.latest = tokens[-1].clone()
+        self.digests.extend(digests)
+        self.labels.extend(labels)
+        self.added_at.extend([now] * len(digests))
+        self.logits.extend(logits.detach().cpu().float().unbind(0))
+
+    def trajectories(self, metric: str) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Per-patch (step, cumulative) distances [steps, num_patches] under ``metric``."""
+        if metric not in CHANGE_METRICS:
+            raise ValueError(f"Unknown change metric '{metric}'; expected one of {', '.join(CHANGE_METRICS)}")
+        if not self.step[metric]:
+            num_patches = 0 if self.baseline is None else self.baseline.shape[0]
+            empty = torch.zeros(0, num_patches)
+            return empty, empty
+        return torch.stack(self.step[metric]), torch.stack(self.cumulative[metric])
+
+    def to_arrays(self, site_id: str) -> Dict[str, np.ndarray]:
+        assert self.baseline is not None and self.latest is not None
+        meta = {
+            "site_id": site_id,
+            "weights_id": self.weights_id,
+            "mode": self.mode,
+            "digests": self.digests,
+            "labels": self.labels,
+            "added_at": self.added_at,
+        }
+        arrays = {
+            "meta": np.array(json.dumps(meta)),
+            "logits": torch.stack(self.logits).numpy(),
+            "baseline": self.baseline.numpy(),
+            "latest": self.latest.numpy(),
+        }
+        for metric in CHANGE_METRICS:
+            step, cumulative = self.trajectories(metric)
+            arrays[f"step_{metric}"] = step.numpy()
+            arrays[f"cumulative_{metric}"] = cumulative.numpy()
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, data: Any) -> Tuple[str, "SiteSeries"]:
+        meta = json.loads(str(data["meta"]))
+        series = cls(
+            weights_id=meta["weights_id"],
+            mode=meta["mode"],
+            digests=meta["digests"],
+            labels=meta["labels"],
+            added_at=meta["added_at"],
+            logits=list(torch.from_numpy(data["logits"]).unbind(0)),
+            baseline=torch.from_numpy(data["baseline"]),
+            latest=torch.from_numpy(data["latest"]),
+        )
+        for metric in CHANGE_METRICS:
+            series.step[metric] = list(torch.from_numpy(data[f"step_{metric}"]).unbind(0))
+            series.cumulative[metric] = list(torch.from_numpy(data[f"cumulative_{metric}"]).unbind(0))
+        return meta["site_id"], series
+
+
+class SiteStore:
+    """Per-site acquisition series for /change/series, LRU-bounded in memory.
+
+    With ``disk_dir`` set, each site is also written as one ``.npz`` file
+    (rewritten atomically after every append; it stays small, see
+    SiteSeries) and reloaded on a memory miss, so sites survive restarts and
+    memory eviction. Callers serialize updates to one site themselves.
+    """
+
+    def __init__(self, max_sites: int = 64, disk_dir: Optional[str] = None) -> None:
+        self.max_sites = max_sites
+        self.disk_dir = disk_dir
+
+        self._sites: "OrderedDict[str, SiteSeries]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._encoded = 0
+        self._reused = 0
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> "SiteStore":
+        return cls(
+            max_sites=int(os.getenv("TERRAVIT_SITE_CACHE_SIZE", "64")),
+            disk_dir=os.getenv("TERRAVIT_SITE_DIR", "sites") or None,
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sites": len(self._sites),
+            "max_sites": self.max_sites,
+            "persistent": self.disk_dir is not None,
+            "hits": self._hits,
+            "disk_hits": self._disk_hits,
+            "misses": self._misses,
+            "acquisitions_encoded": self._encoded,
+            "acquisitions_reused": self._reused,
+        }
+
+    def get(self, site_id: str) -> Optional[SiteSeries]:
+        with self._lock:
+            series = self._sites.get(site_id)
+            if series is not None:
+                self._sites.move_to_end(site_id)
+                self._hits += 1
+                return series
+
+        series = self._disk_get(site_id)
+        with self._lock:
+            if series is None:
+                self._misses += 1
+                return None
+            self._disk_hits += 1
+            self._insert(site_id, series)
+        return series
+
+    def put(self, site_id: str, series: SiteSeries) -> None:
+        with self._lock:
+            self._insert(site_id, series)
+        self._disk_put(site_id, series)
+
+    def record(self, encoded: int, reused: int) -> None:
+        """Count submitted acquisitions that needed encoding vs. were already in their series."""
+        with self._lock:
+            self._encoded += encoded
+            self._reused += reused
+
+    def delete(self, site_id: str) -> bool:
+        with self._lock:
+            found = self._sites.pop(site_id, None) is not None
+        if self.disk_dir is not None:
+            try:
+                os.remove(self._disk_path(site_id))
+                found = True
+            except OSError:
+                pass
+        return found
+
+    def _insert(self, site_id: str, series: SiteSeries) -> None:
+        self._sites[site_id] = series
+        self._sites.move_to_end(site_id)
+        while len(self._sites) > self.max_sites:
+            self._sites.popitem(last=False)
+
+    def _disk_path(self, site_id: str) -> str:
+        assert self.disk_dir is not None
+        # Site ids are client-supplied: hash them into safe file names (the id itself is kept inside)
+        name = hashlib.blake2b(site_id.encode(), digest_size=16).hexdigest()
+        return os.path.join(self.disk_dir, f"{name}.npz")
+
+    def _disk_get(self, site_id: str) -> Optional[SiteSeries]:
+        if self.disk_dir is None:
+            return None
+        try:
+            with np.load(self._disk_path(site_id)) as data:
+                stored_id, series = SiteSeries.from_arrays(data)
+        except (OSError, KeyError, ValueError):
+            # Missing, half-written or foreign file: treat as a miss
+            return None
+        return series if stored_id == site_id else None
+
+    def _disk_put(self, site_id: str, series: SiteSeries) -> None:
+        if self.disk_dir is None or series.baseline is None:
+            return
+        path = self._disk_path(site_id)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(f, **series.to_arrays(site_id))
+            os.replace(tmp_path, path)
+        except OSError:
+            return
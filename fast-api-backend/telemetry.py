@@ -0,0 +1,402 @@
+import asyncio
+import contextlib
+import math
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import torch
+from starlette.routing import Match
+
+
+# Latency buckets in seconds, from sub-millisecond stages to multi-second tiled requests
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def samples(self) -> List[Tuple[str, LabelValues, float, Sequence[str]]]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for name, values, value, labelnames in self.samples():
+            lines.append(f"{name}{_format_labels(labelnames, values)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[Tuple[str, LabelValues, float, Sequence[str]]]:
+        with self._lock:
+            return [(self.name, k, v, self.labelnames) for k, v in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def samples(self) -> List[Tuple[str, LabelValues, float, Sequence[str]]]:
+        with self._lock:
+            return [(self.name, k, v, self.labelnames) for k, v in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # label values -> (per-bucket counts, sum)
+        self._values: Dict[LabelValues, Tuple[List[int], float]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * len(self.buckets), 0.0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    @contextlib.contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> List[Tuple[str, LabelValues, float, Sequence[str]]]:
+        out = []
+        bucket_labels = self.labelnames + ("le",)
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    le = "+Inf" if math.isinf(bound) else repr(bound)
+                    out.append((f"{self.name}_bucket", key + (le,), float(cumulative), bucket_labels))
+                out.append((f"{self.name}_sum", key, total, self.labelnames))
+                out.append((f"{self.name}_count", key, float(cumulative), self.labelnames))
+        return out
+
+
+# (name, type, help, [(label dict, value)]) produced on demand, e.g. from existing stats() methods
+CollectedMetric = Tuple[str, str, str, List[Tuple[Dict[str, Any], float]]]
+
+
+class Registry:
+    """Metrics rendered in the Prometheus text exposition format (version 0.0.4)."""
+
+    def __init__(self) -> None:
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], List[CollectedMetric]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], List[CollectedMetric]]) -> None:
+        """Add a callback whose metrics are computed at scrape time."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines += metric.render()
+        for collector in self._collectors:
+            for name, kind, documentation, samples in collector():
+                lines += [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGE_SECONDS = REGISTRY.register(
+    Histogram(
+        "terravit_stage_duration_seconds",
+        "Time spent in each stage of the inference pipeline.",
+        ["stage"],
+    )
+)
+HTTP_REQUEST_SECONDS = REGISTRY.register(
+    Histogram(
+        "terravit_http_request_duration_seconds",
+        "HTTP request latency until the response body is sent.",
+        ["method", "route", "status"],
+    )
+)
+HTTP_IN_FLIGHT = REGISTRY.register(
+    Gauge("terravit_http_requests_in_flight", "HTTP requests currently being handled.", ["route"])
+)
+MODEL_LOAD_SECONDS = REGISTRY.register(
+    Gauge("terravit_model_load_seconds", "Wall time of the last model (or artifact) load.")
+)
+UPSTREAM_SECONDS = REGISTRY.register(
+    Histogram(
+        "terravit_upstream_request_duration_seconds",
+        "Latency of calls to external APIs, failed calls included.",
+        ["service", "endpoint"],
+    )
+)
+UPSTREAM_ERRORS = REGISTRY.register(
+    Counter(
+        "terravit_upstream_errors_total",
+        "Failed calls to external APIs by error kind (HTTP status or exception name).",
+        ["service", "endpoint", "kind"],
+    )
+)
+
+
+@contextlib.contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a pipeline stage into STAGE_SECONDS and label it in profiler traces as ``terravit::<name>``."""
+    started = time.perf_counter()
+    try:
+        with torch.profiler.record_function(f"terravit::{name}"):
+            yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=name)
+
+
+def _profiler_config() -> Dict[str, Any]:
+    activities = [torch.profiler.ProfilerActivity.CPU]
+    if torch.cuda.is_available():
+        activities.append(torch.profiler.ProfilerActivity.CUDA)
+    config: Dict[str, Any] = {"activities": activities, "record_shapes": True}
+    try:
+        # Inference runs on executor threads, not the event loop thread that starts the profiler
+        config["experimental_config"] = torch._C._profiler._ExperimentalConfig(profile_all_threads=True)
+    except (AttributeError, TypeError):  # older torch: only the starting thread is traced
+        pass
+    return config
+
+
+class ProfilerCapture:
+    """Record one torch.profiler trace spanning the next N requests and write it as a Chrome trace.
+
+    :meth:`arm` sets N. The profiler starts when the first counted request
+    begins and stops once all N have finished; requests overlapping that
+    window appear in the trace too. Traces go to ``directory`` as
+    ``trace-<UTC timestamp>.json`` (open in chrome://tracing or Perfetto).
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._to_start = 0
+        self._running = 0
+        self._requested = 0
+        self._profiler: Any = None
+        self._stopped: Any = None  # finished profiler waiting for save()
+        self._started_at: Optional[float] = None
+        self._last: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def from_env(cls) -> "ProfilerCapture":
+        return cls(os.getenv("TERRAVIT_PROFILE_DIR", "profiles"))
+
+    @property
+    def active(self) -> bool:
+        return self._to_start > 0 or self._running > 0
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "active": self.active,
+                "requested": self._requested,
+                "remaining": self._to_start + self._running,
+                "directory": os.path.abspath(self.directory),
+                "last_trace": self._last,
+            }
+
+    def arm(self, requests: int) -> None:
+        """Capture the next ``requests`` requests. Raises RuntimeError if a capture is already pending."""
+        with self._lock:
+            if self.active:
+                raise RuntimeError("A profiler capture is already in progress")
+            self._to_start = requests
+            self._requested = requests
+
+    def begin(self) -> bool:
+        """Called as a request starts; returns True if it is part of the capture (then call :meth:`end`)."""
+        if self._to_start <= 0:  # cheap unlocked check for the common case
+            return False
+        with self._lock:
+            if self._to_start <= 0:
+                return False
+            if self._profiler is None:
+                self._profiler = torch.profiler.profile(**_profiler_config())
+                self._profiler.start()
+                self._started_at = time.time()
+            self._to_start -= 1
+            self._running += 1
+            return True
+
+    def end(self) -> bool:
+        """Called when a counted request finishes; returns True if it stopped the profiler (then call :meth:`save`).
+
+        The profiler is stopped on the thread that started it, i.e. the event
+        loop; only the export in :meth:`save` is slow enough to offload.
+        """
+        with self._lock:
+            self._running -= 1
+            if self._to_start > 0 or self._running > 0 or self._profiler is None:
+                return False
+            self._stopped, self._profiler = self._profiler, None
+            self._stopped.stop()
+            return True
+
+    def save(self) -> Optional[str]:
+        """Write the stopped capture as a Chrome trace; returns its path, or None if there is nothing to write."""
+        with self._lock:
+            profiler, self._stopped = self._stopped, None
+            if profiler is None:
+                return None
+            started_at = self._started_at
+
+            os.makedirs(self.directory, exist_ok=True)
+            stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+            path = os.path.join(self.directory, f"trace-{stamp}.json")
+            profiler.export_chrome_trace(path)
+            self._last = {
+                "path": os.path.abspath(path),
+                "requests": self._requested,
+                "duration_s": time.time() - (started_at or time.time()),
+                "bytes": os.path.getsize(path),
+            }
+            return path
+
+
+Scope = Dict[str, Any]
+ASGIApp = Callable[[Scope, Callable[[], Awaitable[Any]], Callable[[Any], Awaitable[None]]], Awaitable[None]]
+
+
+def _route_template(scope: Scope) -> str:
+    """The path template of the route matching ``scope`` (e.g. ``/jobs/{job_id}``), to bound label cardinality."""
+    app = scope.get("app")
+    router = getattr(app, "router", None)
+    for route in getattr(router, "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", scope["path"])
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency and in-flight counts per route, and driving a ProfilerCapture.
+
+    Only requests whose path starts with one of ``profiled_prefixes`` count
+    towards a profiler capture, so scrapes and health checks do not use it up.
+    Pure ASGI rather than BaseHTTPMiddleware, which would buffer streamed responses.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        profiler: Optional[ProfilerCapture] = None,
+        profiled_prefixes: Sequence[str] = (),
+    ) -> None:
+        self.app = app
+        self.profiler = profiler
+        self.profiled_prefixes = tuple(profiled_prefixes)
+
+    async def __call__(self, scope: Scope, receive: Callable[[], Awaitable[Any]], send: Callable[[Any], Awaitable[None]]) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route = _route_template(scope)
+        status = 500  # if the app raises before starting a response
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        profiled = (
+            self.profiler is not None
+            and scope["path"].startswith(self.profiled_prefixes)
+            and self.profiler.begin()
+        )
+        HTTP_IN_FLIGHT.inc(route=route)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec(route=route)
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started, method=scope["method"], route=route, status=str(status)
+            )
+            if profiled and self.profiler.end():
+                await asyncio.to_thread(self.profiler.save)
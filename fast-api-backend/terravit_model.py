@@ -1,112 +1,547 @@
+import contextlib
+import hashlib
+import io
 import os
-from typing import Any, Dict
+import threading
+import time
+import warnings
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
 
+import numpy as np
 import torch
+from torch import nn
 from PIL import Image
 from torchvision import transforms
 from einops import rearrange
 
-from SatViT_model import SatViT
+from SatViT_model import DEFAULT_ATTENTION_CHUNK_SIZE, FFN, TOKEN_SCORES, Attention, SatViT
+from change_map import patch_distances
+from model_artifact import ArtifactFn, artifact_format, load_artifact, load_metadata
+from telemetry import MODEL_LOAD_SECONDS, stage
+
+try:  # Optional: .safetensors weights
+    from safetensors.torch import load_file as load_safetensors
+except ImportError:  # pragma: no cover - depends on the environment
+    load_safetensors = None
+
+# Ways of turning patches into a single io_dim logit vector:
+# - "mae": the original path, SatViT.forward(mask_ratio=0.0). Runs random masking and the MAE loss, both unused.
+# - "encoder": SatViT.encode + SatViT.decode on the full token set. Same output as "mae" without the masking,
+#   unshuffle gather and loss.
+# - "linear": SatViT.encode + the decoder projections only (decoder blocks skipped). Cheapest, but an
+#   approximation of "mae"; run parity_check() on representative tiles before switching an endpoint to it.
+# - "adaptive": like "encoder", but the encoder drops low-importance tokens between layers and may stop early
+#   (SatViT.encode_adaptive, configured by TERRAVIT_ADAPTIVE_*). Also an approximation; responses report the
+#   tokens kept and layers run.
+INFERENCE_MODES = ("mae", "encoder", "linear", "adaptive")
+DEFAULT_INFERENCE_MODE = "encoder"
+
+
+# Numeric precision of the loaded model (TERRAVIT_PRECISION):
+# - "fp32": eager float32, as trained (default).
+# - "int8": dynamic int8 quantization of the nn.Linear layers inside the Attention/FFN blocks. CPU only;
+#   the input/output projections stay fp32.
+# - "bf16": bfloat16 autocast around every forward pass; weights stay fp32.
+# Non-fp32 precisions are checked against fp32 logits when the model loads (see precision_check()).
+PRECISIONS = ("fp32", "int8", "bf16")
+
+
+# What runs the forward passes (TerraViTModel.runtime):
+# - "eager": the SatViT module as loaded from the weights file (default).
+# - "compiled": eager, with the encoder/decoder Transformers wrapped by torch.compile (TERRAVIT_TORCH_COMPILE=1).
+#   Compilation happens during load(), so startup is slower and steady-state latency lower; for long-running workers.
+# - "torchscript" / "export" / "onnx": a graph exported by export_model.py (TERRAVIT_MODEL_ARTIFACT). It covers one
+#   inference mode; other modes fall back to an eager model built on first use. On CPU these neither start nor run
+#   faster than eager with memory-mapped weights (a .pt2 load spends seconds deserializing the graph); see README.
+RUNTIMES = ("eager", "compiled", "torchscript", "export", "onnx")
+
+# Largest single-image upload, in pixels (decoded before being fitted to the model input). tiling raises PIL's
+# process-wide decompression-bomb guard for large scenes, so uploads are checked against this instead. The
+# default is where PIL's own guard used to reject an image.
+MAX_IMAGE_PIXELS = int(os.getenv("TERRAVIT_MAX_IMAGE_PIXELS", str(2 * (1024 * 1024 * 1024 // 4 // 3))))
+
+# Per-channel normalization of RGB uploads (ImageNet statistics)
+RGB_MEAN = (0.485, 0.456, 0.406)
+RGB_STD = (0.229, 0.224, 0.225)
+
+
+@dataclass(frozen=True)
+class SatViTConfig:
+    """Architecture of one SatViT checkpoint; the weights file must match it exactly."""
+
+    patch_hw: int
+    num_patches: int
+    encoder_dim: int = 768
+    encoder_depth: int = 12
+    encoder_num_heads: int = 12
+    decoder_dim: int = 512
+    decoder_depth: int = 1
+    decoder_num_heads: int = 8
+    num_channels: int = 15
+
+    @property
+    def io_dim(self) -> int:
+        return self.patch_hw * self.patch_hw * self.num_channels
+
+
+# Published checkpoints. V1 has a 16x16 grid of 16px patches (256 tokens, roughly 4x cheaper to encode than V2's
+# 32x32 grid of 8px patches) on the same 256px input.
+SATVIT_CONFIGS = {
+    "V1": SatViTConfig(patch_hw=16, num_patches=256, decoder_dim=384, decoder_depth=2, decoder_num_heads=6),
+    "V2": SatViTConfig(patch_hw=8, num_patches=1024),
+}
+
+
+def infer_version(weights_path: str) -> str:
+    """Checkpoint version guessed from the file name ("V1" anywhere in it, else "V2")."""
+    return "V1" if "V1" in weights_path else "V2"
+
+
+def quantize_transformer_linears(model: nn.Module) -> nn.Module:
+    """Swap the nn.Linear layers of every Attention/FFN block for dynamically quantized int8 ones, in place."""
+    for module in list(model.modules()):
+        if isinstance(module, (Attention, FFN)):
+            torch.ao.quantization.quantize_dynamic(module, {nn.Linear}, dtype=torch.qint8, inplace=True)
+    return model
+
+
+def resolve_inference_mode(mode: Optional[str], env_var: Optional[str] = None) -> str:
+    """Return a validated inference mode, falling back to ``env_var`` and then the default."""
+    if mode is None and env_var is not None:
+        mode = os.getenv(env_var)
+    if mode is None:
+        mode = DEFAULT_INFERENCE_MODE
+    if mode not in INFERENCE_MODES:
+        raise ValueError(f"Unknown inference mode '{mode}'; expected one of {', '.join(INFERENCE_MODES)}")
+    return mode
 
 
 class TerraViTModel:
     """Wrapper around the TerraViT Vision Transformer model weights."""
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        weights_path: Optional[str] = None,
+        version: Optional[str] = None,
+        artifact_path: Optional[str] = None,
+    ) -> None:
+        """Describe a model to load; arguments left as None come from the TERRAVIT_* environment.
+
+        ``version`` (a SATVIT_CONFIGS key) defaults to TERRAVIT_MODEL_VERSION,
+        else it is inferred from the weights file name. Pass
+        ``artifact_path=""`` to ignore TERRAVIT_MODEL_ARTIFACT.
+        """
         self._model = None
         self._device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         # Default to SatViT_V2.pt, but allow override via env var
-        self._weights_path = os.getenv("TERRAVIT_WEIGHTS_PATH", "SatViT_V2.pt")
+        self._weights_path = weights_path or os.getenv("TERRAVIT_WEIGHTS_PATH", "SatViT_V2.pt")
+        self._version = version or os.getenv("TERRAVIT_MODEL_VERSION") or infer_version(self._weights_path)
+        if self._version not in SATVIT_CONFIGS:
+            raise ValueError(f"Unknown SatViT version '{self._version}'; expected one of {', '.join(SATVIT_CONFIGS)}")
+        self.config = SATVIT_CONFIGS[self._version]
+        # Map checkpoint tensors read-only instead of copying them, so worker processes share one set of pages
+        self._mmap_weights = os.getenv("TERRAVIT_WEIGHTS_MMAP", "1") != "0"
+        # Build SatViT on the meta device and adopt the checkpoint tensors, skipping the random init
+        self._fast_init = os.getenv("TERRAVIT_FAST_INIT", "1") != "0"
+        # Attention implementation (see SatViT_model.ATTENTION_BACKENDS); weights are identical for all of them
+        self._attention_backend = os.getenv("TERRAVIT_ATTENTION_BACKEND", "auto")
+        self._attention_chunk_size = int(os.getenv("TERRAVIT_ATTENTION_CHUNK_SIZE", str(DEFAULT_ATTENTION_CHUNK_SIZE)))
+        # Token pruning / early exit of the "adaptive" mode (see BaseTransformer.forward_adaptive)
+        exit_threshold = os.getenv("TERRAVIT_ADAPTIVE_EXIT_THRESHOLD", "")
+        self._adaptive: Dict[str, Any] = {
+            "keep_ratio": float(os.getenv("TERRAVIT_ADAPTIVE_KEEP_RATIO", "0.7")),
+            "prune_layers": tuple(int(i) for i in os.getenv("TERRAVIT_ADAPTIVE_PRUNE_LAYERS", "4,8").split(",") if i),
+            "exit_threshold": float(exit_threshold) if exit_threshold else None,
+            "min_layers": int(os.getenv("TERRAVIT_ADAPTIVE_MIN_LAYERS", "8")),
+            "score": os.getenv("TERRAVIT_ADAPTIVE_SCORE", "attention"),
+        }
+
+        # Precision (see PRECISIONS); _active_precision is what forward passes currently use
+        self._precision = os.getenv("TERRAVIT_PRECISION", "fp32")
+        self._active_precision = "fp32"
+        self._check_precision_on_load = os.getenv("TERRAVIT_PRECISION_CHECK", "1") != "0"
+        # Largest accepted max |logit diff| relative to the largest |fp32 logit|
+        self._precision_tolerance = float(os.getenv("TERRAVIT_PRECISION_TOLERANCE", "0.05"))
+        self._precision_check: Dict[str, Any] | None = None
+
+        # Exported inference graph (see RUNTIMES); the eager model is only built if a request needs it
+        self._artifact_path = (os.getenv("TERRAVIT_MODEL_ARTIFACT") if artifact_path is None else artifact_path) or None
+        self._artifact: ArtifactFn | None = None
+        self._artifact_mode: str | None = None
+        self._torch_compile = os.getenv("TERRAVIT_TORCH_COMPILE", "0") != "0"
+        self._runtime = "eager"
+        self._build_lock = threading.Lock()
 
         # Store model-specific patch configuration once weights are known
         self._patch_hw: int | None = None
         self._num_patches: int | None = None
         self._num_channels: int | None = None
 
+        # RGB fast path: RGB uploads are patchified with 3 channels and projected by a copy of
+        # linear_input whose weights are summed over the repeated channels (built in load()).
+        self._rgb_fast_path = os.getenv("TERRAVIT_RGB_FAST_PATH", "1") != "0"
+        self._rgb_input: nn.Linear | None = None
+
         # Basic RGB preprocessing before patchifying (resize + normalize)
         self._rgb_transform = transforms.Compose(
             [
                 transforms.ToTensor(),
-                transforms.Normalize(
-                    mean=[0.485, 0.456, 0.406],
-                    std=[0.229, 0.224, 0.225],
-                ),
+                transforms.Normalize(mean=list(RGB_MEAN), std=list(RGB_STD)),
             ]
         )
 
+        # Fused preprocessing (images_to_patches): ToTensor + Normalize folded into one scale and bias per
+        # channel, applied by a single strided op that also patchifies. "0" uses _rgb_transform + _patchify.
+        self._fused_preprocess = os.getenv("TERRAVIT_FUSED_PREPROCESS", "1") != "0"
+        mean, std = torch.tensor(RGB_MEAN), torch.tensor(RGB_STD)
+        self._pixel_scale = (1.0 / (255.0 * std)).view(3, 1, 1).to(self._device)
+        self._pixel_bias = (-mean / std).view(3, 1, 1).to(self._device)
+        # Decode/resize uploads much larger than the model input at reduced size (JPEG draft mode, PIL reduce)
+        self._reduced_decode = os.getenv("TERRAVIT_REDUCED_DECODE", "1") != "0"
+
     @property
     def device_str(self) -> str:
         return str(self._device)
 
     @property
     def is_loaded(self) -> bool:
-        return self._model is not None
+        return self._model is not None or self._artifact is not None
+
+    @property
+    def runtime(self) -> str:
+        return self._runtime
+
+    @property
+    def version(self) -> str:
+        return self._version
+
+    @property
+    def weights_path(self) -> str:
+        return self._weights_path
+
+    @property
+    def memory_bytes(self) -> int:
+        """Bytes of the loaded parameters and buffers (memory-mapped pages included), or of the artifact file."""
+        total = 0
+        if self._artifact_path and self._artifact is not None:
+            total += os.path.getsize(self._artifact_path)
+        modules = [m for m in (self._model, self._rgb_input) if m is not None]
+        for module in modules:
+            total += sum(t.numel() * t.element_size() for t in module.parameters())
+            total += sum(t.numel() * t.element_size() for t in module.buffers())
+        return total
+
+    @property
+    def precision(self) -> str:
+        return self._precision
+
+    @property
+    def precision_check_result(self) -> Optional[Dict[str, Any]]:
+        """Result of the accuracy check run when the model loaded, if any."""
+        return self._precision_check
+
+    @property
+    def input_side(self) -> int:
+        """Side length in pixels of the square model input (patch_hw * grid_size)."""
+        if self._patch_hw is None or self._num_patches is None:
+            raise RuntimeError("Model configuration not initialized; call load() first.")
+        return self._patch_hw * int(self._num_patches ** 0.5)
+
+    @property
+    def weights_id(self) -> str:
+        """Identity of the configured weights file or artifact (path, size, mtime) and precision, e.g. for cache keys."""
+        path = os.path.abspath(self._artifact_path or self._weights_path)
+        try:
+            stat = os.stat(path)
+            ident = f"{path}:{stat.st_size}:{stat.st_mtime_ns}"
+        except OSError:
+            ident = path
+        if self._precision != "fp32":
+            ident += f":{self._precision}"
+        return hashlib.blake2b(ident.encode(), digest_size=12).hexdigest()
+
+    def mode_id(self, mode: str) -> str:
+        """weights_id plus the settings that change ``mode``'s outputs (TERRAVIT_ADAPTIVE_*), e.g. for cache keys."""
+        if mode != "adaptive":
+            return self.weights_id
+        config = ",".join(f"{name}={value}" for name, value in sorted(self._adaptive.items()))
+        return hashlib.blake2b(f"{self.weights_id}:{config}".encode(), digest_size=12).hexdigest()
 
     def load(self) -> None:
-        """Load the model weights into memory if not already loaded."""
-        if self._model is not None:
+        """Load the model weights (or the configured artifact) into memory if not already loaded."""
+        if self.is_loaded:
             return
 
+        with self._build_lock:
+            if self.is_loaded:
+                return
+            started = time.perf_counter()
+            if self._artifact_path:
+                self._load_artifact()
+            else:
+                self._load_eager()
+            MODEL_LOAD_SECONDS.set(time.perf_counter() - started)
+
+    def _eager_model(self) -> SatViT:
+        """The eager SatViT module, built on first use when serving from an artifact."""
+        if self._model is None:
+            with self._build_lock:
+                if self._model is None:
+                    self._load_eager()
+        return self._model  # type: ignore[return-value]
+
+    def _load_artifact(self) -> None:
+        assert self._artifact_path is not None
+        if self._precision != "fp32":
+            raise RuntimeError("Model artifacts are exported in fp32; TERRAVIT_PRECISION must be fp32 to serve one")
+        fmt = artifact_format(self._artifact_path)
+        metadata = load_metadata(self._artifact_path)
+        if fmt != "onnx" and metadata.get("torch_version") != torch.__version__:
+            warnings.warn(
+                f"Model artifact was exported with torch {metadata.get('torch_version')}, "
+                f"running torch {torch.__version__}; re-export it if loading fails"
+            )
+
+        self._patch_hw = int(metadata["patch_hw"])
+        self._num_patches = int(metadata["num_patches"])
+        self._num_channels = int(metadata["num_channels"])
+        self._artifact_mode = metadata["mode"]
+        self._artifact = load_artifact(self._artifact_path, self._device)
+        self._runtime = fmt
+
+    def _load_eager(self) -> None:
+        if self._precision not in PRECISIONS:
+            raise RuntimeError(f"Unknown precision '{self._precision}'; expected one of {', '.join(PRECISIONS)}")
+        if self._precision == "int8" and self._device.type != "cpu":
+            raise RuntimeError("int8 dynamic quantization is only supported on CPU")
+        if self._adaptive["score"] not in TOKEN_SCORES:
+            raise RuntimeError(
+                f"Unknown TERRAVIT_ADAPTIVE_SCORE '{self._adaptive['score']}'; expected one of {', '.join(TOKEN_SCORES)}"
+            )
+        if not 0.0 < self._adaptive["keep_ratio"] <= 1.0:
+            raise RuntimeError("TERRAVIT_ADAPTIVE_KEEP_RATIO must be in (0, 1]")
+
+        model = self._build_model()
+        self._active_precision = "fp32"
+        self._model = model
+
+        if self._rgb_fast_path:
+            self._rgb_input = self._fold_rgb_input(model.linear_input)
+
+        if self._precision != "fp32":
+            check_patches = self._precision_check_patches() if self._check_precision_on_load else None
+            reference = self._reference_logits(model, check_patches) if check_patches is not None else None
+            if self._precision == "int8":
+                quantize_transformer_linears(model)
+            self._active_precision = self._precision
+
+            if check_patches is not None:
+                self._precision_check = self._compare_to_reference(reference, check_patches)
+                if not self._precision_check["passed"]:
+                    warnings.warn(f"{self._precision} inference deviates from fp32: {self._precision_check}")
+
+        if self._torch_compile:
+            self._compile(model)
+            if self._artifact is None:
+                self._runtime = "compiled"
+
+    def _compile(self, model: SatViT) -> None:
+        """Wrap the encoder/decoder Transformers with torch.compile and compile them now rather than on a request.
+
+        The warm-up uses a batch of 2 with dynamic shapes, so other batch sizes
+        reuse the same graphs instead of recompiling.
+        """
+        model.encoder = torch.compile(model.encoder, dynamic=True)
+        model.decoder = torch.compile(model.decoder, dynamic=True)
+        patches = self._precision_check_patches().expand(2, -1, -1)
+        with torch.no_grad(), self._autocast():
+            model.decode(model.encode(patches), pool=True, blocks=True)
+
+    def _build_model(self) -> SatViT:
+        """Instantiate SatViT for the configured weights and load them (fp32, eval mode)."""
         if not os.path.exists(self._weights_path):
             raise RuntimeError(f"Model weights not found at '{self._weights_path}'")
 
-        # Determine hyperparameters based on model version
-        if "V1" in self._weights_path:
-            # SatViT-V1 hyperparameters
-            patch_hw = 16
-            num_patches = 256
-            encoder_dim = 768
-            encoder_depth = 12
-            encoder_num_heads = 12
-            decoder_dim = 384
-            decoder_depth = 2
-            decoder_num_heads = 6
-        else:
-            # SatViT-V2 hyperparameters (default)
-            patch_hw = 8
-            num_patches = 1024
-            encoder_dim = 768
-            encoder_depth = 12
-            encoder_num_heads = 12
-            decoder_dim = 512
-            decoder_depth = 1
-            decoder_num_heads = 8
-
-        num_channels = 15
-        io_dim = int(patch_hw * patch_hw * num_channels)
+        config = self.config
 
         # Cache config for preprocessing helpers
-        self._patch_hw = patch_hw
-        self._num_patches = num_patches
-        self._num_channels = num_channels
-
-        # Instantiate the SatViT model architecture
-        model = SatViT(
-            io_dim=io_dim,
-            num_patches=num_patches,
-            encoder_dim=encoder_dim,
-            encoder_depth=encoder_depth,
-            encoder_num_heads=encoder_num_heads,
-            decoder_dim=decoder_dim,
-            decoder_depth=decoder_depth,
-            decoder_num_heads=decoder_num_heads,
-        )
-
-        # Load the state_dict from the checkpoint
-        state_dict = torch.load(self._weights_path, map_location=self._device)
-        model.load_state_dict(state_dict)
-
-        # Move to device and set to evaluation mode
+        self._patch_hw = config.patch_hw
+        self._num_patches = config.num_patches
+        self._num_channels = config.num_channels
+
+        # Instantiate the SatViT model architecture. With fast init its parameters are meta tensors
+        # (no memory, no random init) that load_state_dict(assign=True) replaces with the checkpoint's.
+        with torch.device("meta") if self._fast_init else contextlib.nullcontext():
+            model = SatViT(
+                io_dim=config.io_dim,
+                num_patches=config.num_patches,
+                encoder_dim=config.encoder_dim,
+                encoder_depth=config.encoder_depth,
+                encoder_num_heads=config.encoder_num_heads,
+                decoder_dim=config.decoder_dim,
+                decoder_depth=config.decoder_depth,
+                decoder_num_heads=config.decoder_num_heads,
+            )
+        model.set_attention_backend(self._attention_backend, self._attention_chunk_size)
+
+        # Load the state_dict from the checkpoint (strict, so no meta parameter survives)
+        model.load_state_dict(self.read_state_dict(), assign=self._fast_init)
+
+        # Move to device (a no-op for mapped CPU tensors) and set to evaluation mode
         model.to(self._device)
         model.eval()
-        self._model = model
+        return model
+
+    def read_state_dict(self) -> Dict[str, torch.Tensor]:
+        """Read the configured checkpoint, memory-mapped where possible.
+
+        ``.safetensors`` files (needs the optional safetensors package) and
+        zip-format ``torch.save`` checkpoints are mapped read-only on CPU;
+        untouched pages are then shared by every process that maps the same
+        file. Legacy checkpoints, or TERRAVIT_WEIGHTS_MMAP=0, fall back to a
+        regular copying load.
+        """
+        if self._weights_path.endswith(".safetensors"):
+            if load_safetensors is None:
+                raise RuntimeError("Loading .safetensors weights requires the optional safetensors package")
+            return load_safetensors(self._weights_path, device="cpu")
+
+        if self._mmap_weights:
+            try:
+                return torch.load(self._weights_path, map_location="cpu", mmap=True)
+            except RuntimeError as exc:
+                warnings.warn(
+                    f"Could not memory-map '{self._weights_path}' ({exc}); loading a private copy. "
+                    "Convert it with `python export_model.py convert-weights` to share it across workers."
+                )
+        return torch.load(self._weights_path, map_location=self._device)
+
+    def _autocast(self) -> Any:
+        """Autocast context for the active precision (a no-op unless bf16)."""
+        if self._active_precision == "bf16":
+            return torch.autocast(device_type=self._device.type, dtype=torch.bfloat16)
+        return contextlib.nullcontext()
+
+    def _precision_check_patches(self) -> torch.Tensor:
+        """Deterministic standard-normal patches [1, num_patches, io_dim], on the scale of normalized inputs."""
+        assert self._num_patches is not None and self._patch_hw is not None and self._num_channels is not None
+        generator = torch.Generator().manual_seed(0)
+        io_dim = self._patch_hw * self._patch_hw * self._num_channels
+        return torch.randn(1, self._num_patches, io_dim, generator=generator).to(self._device)
+
+    def _reference_logits(self, model: SatViT, patches: torch.Tensor) -> torch.Tensor:
+        """fp32 "encoder"-mode logits of an unquantized ``model``, ignoring the active precision."""
+        if self._is_rgb_patches(patches):
+            patches = self._expand_rgb_patches(patches)
+        with torch.no_grad():
+            return model.decode(model.encode(patches), pool=True, blocks=True).float()
+
+    def _compare_to_reference(self, reference: torch.Tensor, patches: torch.Tensor) -> Dict[str, Any]:
+        candidate = self._patch_logits(patches, "encoder")
+        diff = float(torch.max(torch.abs(candidate - reference)).item())
+        relative = diff / max(float(torch.max(torch.abs(reference)).item()), 1e-12)
+        top_match = bool(torch.equal(torch.argmax(candidate, dim=-1), torch.argmax(reference, dim=-1)))
+        return {
+            "precision": self._active_precision,
+            "max_abs_logit_diff": diff,
+            "max_rel_logit_diff": relative,
+            "min_cosine_similarity": float(
+                torch.nn.functional.cosine_similarity(candidate, reference, dim=-1).min().item()
+            ),
+            "max_abs_prob_diff": float(
+                torch.max(torch.abs(torch.softmax(candidate, dim=-1) - torch.softmax(reference, dim=-1))).item()
+            ),
+            "top_class_match": top_match,
+            "passed": top_match and relative <= self._precision_tolerance,
+        }
+
+    def precision_check(self, image: Optional[Image.Image] = None) -> Dict[str, Any]:
+        """Compare the active precision's logits with fp32 on ``image`` (or the built-in check input).
+
+        Returns the max absolute / relative logit difference, min cosine
+        similarity, max probability difference, whether the top class agrees
+        and ``passed`` against TERRAVIT_PRECISION_TOLERANCE. For int8 a
+        temporary fp32 copy of the model is built from the weights file. When
+        serving from an artifact this checks the artifact against the eager
+        model instead.
+        """
+        if not self.is_loaded:
+            self.load()
+
+        patches = self._image_to_patches(image) if image is not None else self._precision_check_patches()
+        reference_model = self._build_model() if self._active_precision == "int8" else self._eager_model()
+        reference = self._reference_logits(reference_model, patches)  # type: ignore[arg-type]
+        return self._compare_to_reference(reference, patches)
+
+    def _rgb_channel_index(self) -> torch.Tensor:
+        """Source RGB channel for each of the ``num_channels`` model channels (R, G, B, R, G, B, ...)."""
+        assert self._num_channels is not None
+        return torch.arange(self._num_channels, device=self._device) % 3
+
+    def _fold_rgb_input(self, linear_input: nn.Linear) -> nn.Linear:
+        """Fold the RGB -> num_channels repetition into a 3-channel copy of ``linear_input``.
+
+        Every model channel c is a copy of RGB channel c % 3, so projecting the
+        repeated patch equals projecting the RGB patch with the weight columns of
+        each copy summed onto their source channel.
+        """
+        assert self._patch_hw is not None and self._num_channels is not None
+        pixels = self._patch_hw * self._patch_hw
+        out_dim = linear_input.out_features
+
+        weight = linear_input.weight.detach().view(out_dim, self._num_channels, pixels)
+        folded = torch.zeros(out_dim, 3, pixels, dtype=weight.dtype, device=weight.device)
+        folded.index_add_(1, self._rgb_channel_index(), weight)
 
-    def _image_to_patches(self, image: Image.Image) -> torch.Tensor:
+        rgb_input = nn.Linear(3 * pixels, out_dim).to(device=weight.device, dtype=weight.dtype)
+        with torch.no_grad():
+            rgb_input.weight.copy_(folded.view(out_dim, 3 * pixels))
+            rgb_input.bias.copy_(linear_input.bias.detach())
+        rgb_input.eval()
+        return rgb_input
+
+    def _is_rgb_patches(self, patches: torch.Tensor) -> bool:
+        assert self._patch_hw is not None
+        return self._num_channels != 3 and patches.shape[-1] == 3 * self._patch_hw * self._patch_hw
+
+    def _expand_rgb_patches(self, patches: torch.Tensor) -> torch.Tensor:
+        """Materialise 3-channel RGB patches [B, N, 3*ph*pw] as the model's [B, N, io_dim] layout."""
+        assert self._patch_hw is not None
+        b, n, _ = patches.shape
+        patches = patches.view(b, n, 3, self._patch_hw * self._patch_hw)
+        return patches.index_select(2, self._rgb_channel_index()).view(b, n, -1)
+
+    def _patchify(self, tensor: torch.Tensor) -> torch.Tensor:
+        """Patchify [B, C, H, W] -> [B, num_patches, C*patch_hw*patch_hw] (channel-major per patch)."""
+        assert self._patch_hw is not None and self._num_patches is not None
+        b, c = tensor.shape[:2]
+        grid_size = int(self._num_patches ** 0.5)
+
+        patches = tensor.unfold(2, self._patch_hw, self._patch_hw).unfold(3, self._patch_hw, self._patch_hw)
+        # shape: [B, C, grid_h, grid_w, patch_hw, patch_hw]
+        patches = patches.contiguous().view(
+            b,
+            c,
+            grid_size * grid_size,
+            self._patch_hw,
+            self._patch_hw,
+        )
+        patches = patches.permute(0, 2, 1, 3, 4).contiguous()  # [B, num_patches, C, ph, pw]
+        return patches.view(b, self._num_patches, -1)  # [B, num_patches, C*ph*pw]
+
+    def _image_to_patches(self, image: Union[Image.Image, np.ndarray, torch.Tensor]) -> torch.Tensor:
         """Convert a PIL image into SatViT patch tensor [1, num_patches, io_dim].
 
         The original SatViT was trained on multi-channel (e.g. Sentinel) data.
         For generic RGB uploads, we adapt by repeating / trimming channels to
-        match the expected ``num_channels`` and then patchifying.
+        match the expected ``num_channels`` and then patchifying. With the RGB
+        fast path enabled the repetition is skipped and the result is
+        [1, num_patches, 3*patch_hw*patch_hw]; the model side accounts for it.
+
+        Multi-band data (e.g. a raster window) can be passed directly as an
+        already-normalized [C, H, W] array; it skips PIL entirely and a native
+        ``num_channels`` stack is used as is.
         """
 
         if self._patch_hw is None or self._num_patches is None or self._num_channels is None:
@@ -116,8 +551,21 @@ class TerraViTModel:
         grid_size = int(self._num_patches ** 0.5)
         side = self._patch_hw * grid_size
 
-        img = image.convert("RGB").resize((side, side))
-        tensor = self._rgb_transform(img).unsqueeze(0).to(self._device)  # [1, 3, H, W]
+        if isinstance(image, Image.Image):
+            if self._fused_preprocess and self._fused_repeats() is not None:
+                return self.images_to_patches([image])
+            img = image.convert("RGB")
+            if img.size != (side, side):
+                img = img.resize((side, side))
+            tensor = self._rgb_transform(img).unsqueeze(0).to(self._device)  # [1, 3, H, W]
+        else:
+            # as_tensor shares memory with float32 numpy input
+            tensor = torch.as_tensor(image, dtype=torch.float32).unsqueeze(0).to(self._device)  # [1, C, H, W]
+            if tensor.shape[-2:] != (side, side):
+                tensor = torch.nn.functional.interpolate(tensor, size=(side, side), mode="bilinear", align_corners=False)
+
+        if tensor.shape[1] == 3 and self._rgb_input is not None:
+            return self._patchify(tensor)  # [1, num_patches, 3*ph*pw]
 
         # Adjust channel count to expected num_channels (e.g. 15)
         c = tensor.shape[1]
@@ -129,66 +577,391 @@ class TerraViTModel:
             tensor = tensor[:, : self._num_channels]
 
         # Patchify: [B, C, H, W] -> [B, num_patches, patch_hw*patch_hw*num_channels]
-        patches = tensor.unfold(2, self._patch_hw, self._patch_hw).unfold(3, self._patch_hw, self._patch_hw)
-        # shape: [B, C, grid_h, grid_w, patch_hw, patch_hw]
-        patches = patches.contiguous().view(
-            1,
-            self._num_channels,
-            grid_size * grid_size,
-            self._patch_hw,
-            self._patch_hw,
-        )
-        patches = patches.permute(0, 2, 1, 3, 4).contiguous()  # [B, num_patches, C, ph, pw]
-        patches = patches.view(1, self._num_patches, -1)  # [B, num_patches, io_dim]
-
-        return patches
+        return self._patchify(tensor)
+
+    def fit_image(self, image: Image.Image) -> Image.Image:
+        """``image`` as RGB at the model input size (input_side x input_side), as preprocessing expects it."""
+        side = self.input_side
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        if image.size != (side, side):
+            # With a reducing_gap, sources much larger than the target are first shrunk by an integer factor
+            image = image.resize((side, side), reducing_gap=2.0 if self._reduced_decode else None)
+        return image
+
+    def _fused_repeats(self) -> Optional[int]:
+        """How many times the RGB channels repeat in the model's patch layout, or None if they don't tile it."""
+        assert self._num_channels is not None
+        if self._rgb_input is not None:
+            return 1  # RGB fast path: 3-channel patches
+        return self._num_channels // 3 if self._num_channels % 3 == 0 else None
+
+    def images_to_patches(self, images: Sequence[Image.Image]) -> torch.Tensor:
+        """Preprocess PIL images into one patch tensor [B, num_patches, dim], like _image_to_patches per image.
+
+        Each image is fitted (see fit_image) and its uint8 pixels are viewed
+        as [grid, grid, 3, patch_hw, patch_hw] through strides alone, then
+        cast-copied straight into their slot of the batch tensor; for
+        full-channel patches the RGB repetition is a stride-0 expand of the
+        same view. Normalization (x * scale + bias, folding ToTensor and
+        Normalize) runs in place over the whole batch afterwards, so the
+        batch tensor is the only float allocation.
+        """
+        if self._patch_hw is None or self._num_patches is None or self._num_channels is None:
+            raise RuntimeError("Model configuration not initialized; call load() first.")
+        repeats = self._fused_repeats()
+        if not self._fused_preprocess or repeats is None:
+            return self._stack_patches([self._image_to_patches(image) for image in images])
 
-    def _image_logits(self, image: Image.Image) -> torch.Tensor:
-        """Run SatViT on an image and return a 1D logits vector.
+        patch_hw = self._patch_hw
+        grid_size = int(self._num_patches ** 0.5)
+        out = torch.empty(len(images), self._num_patches, repeats * 3 * patch_hw * patch_hw, device=self._device)
+        layout = out.view(len(images), grid_size, grid_size, repeats, 3, patch_hw, patch_hw)
+        for i, image in enumerate(images):
+            pixels = torch.from_numpy(np.array(self.fit_image(image))).to(self._device)  # [H, W, 3] uint8
+            # [grid, ph, grid, pw, 3] -> [grid, grid, 3, ph, pw]: patch-major, channel-major within a patch
+            pixels = pixels.view(grid_size, patch_hw, grid_size, patch_hw, 3).permute(0, 2, 4, 1, 3)
+            # A casting copy_ needs no temporary (mixed-dtype arithmetic would allocate a float copy of the pixels)
+            layout[i].copy_(pixels.unsqueeze(2).expand_as(layout[i]))
+        layout.mul_(self._pixel_scale).add_(self._pixel_bias)
+        return out
+
+    def _patch_outputs(
+        self,
+        patches: torch.Tensor,
+        mode: str = DEFAULT_INFERENCE_MODE,
+    ) -> Tuple[torch.Tensor, torch.Tensor, Optional[List[Dict[str, Any]]]]:
+        """Run SatViT on a patch tensor [B, num_patches, io_dim].
+
+        Returns logits [B, io_dim], the mean-pooled encoder embedding
+        [B, encoder_dim] and, in "adaptive" mode, per-sample encoder stats
+        (None otherwise). RGB fast-path patches [B, num_patches, 3*ph*pw] are
+        accepted too.
 
         We use the MAE decoder output averaged over patches as a simple
         per-dimension logit representation suitable for downstream tasks
         like classification or change detection.
         """
 
-        if self._model is None:
+        if not self.is_loaded:
             self.load()
 
-        patches = self._image_to_patches(image)
-
+        mode = resolve_inference_mode(mode)
+        if self._artifact is not None and mode == self._artifact_mode:
+            with stage("artifact"):
+                logits, latent = self._run_artifact(patches)
+            return logits.float(), latent.mean(dim=1).float(), None
+
+        model = self._eager_model()
+        with torch.no_grad(), self._autocast():
+            if mode == "mae":
+                # The MAE forward (and its loss) needs the full channel layout
+                if self._is_rgb_patches(patches):
+                    patches = self._expand_rgb_patches(patches)
+                # Same steps as SatViT.forward, keeping the latent; token order doesn't matter for the mean
+                with stage("encoder"):
+                    latent, mask, ids_restore = model.forward_encoder(patches, 0.0)
+                with stage("decoder"):
+                    pred = model.forward_decoder(latent, ids_restore)
+                    model.forward_loss(patches, pred, mask)
+                return pred.mean(dim=1).float(), latent.mean(dim=1).float(), None
+
+            stats = None
+            with stage("encoder"):
+                if mode == "adaptive":
+                    latent, stats = self._encode_adaptive(patches)
+                else:
+                    latent = self._encode(patches)
+            with stage("decoder"):
+                logits = model.decode(latent, pool=True, blocks=mode != "linear")
+            return logits.float(), latent.mean(dim=1).float(), stats
+
+    def _encode(self, patches: torch.Tensor) -> torch.Tensor:
+        """Encoder tokens [B, num_patches, encoder_dim] for full or RGB fast-path patches (no masking)."""
+        rgb_input = self._rgb_input if self._is_rgb_patches(patches) else None
+        return self._eager_model().encode(patches, rgb_input)
+
+    def _encode_adaptive(self, patches: torch.Tensor) -> Tuple[torch.Tensor, List[Dict[str, Any]]]:
+        """Encoder tokens with token pruning / early exit, plus per-sample stats (see INFERENCE_MODES)."""
+        rgb_input = self._rgb_input if self._is_rgb_patches(patches) else None
+        model = self._eager_model()
+        latent, stats = model.encode_adaptive(patches, rgb_input, **self._adaptive)
+        num_tokens = latent.shape[1]
+        num_layers = len(model.encoder.layers)
+        return latent, [
+            {
+                "tokens_kept": int(kept),
+                "num_tokens": num_tokens,
+                "layers_run": int(layers),
+                "num_layers": num_layers,
+                "token_fraction": float(token_layers) / (num_tokens * num_layers),
+            }
+            for kept, layers, token_layers in zip(stats["tokens_kept"], stats["layers_run"], stats["token_layers"])
+        ]
+
+    def _run_artifact(self, patches: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Exported-graph logits [B, io_dim] and encoder tokens [B, num_patches, encoder_dim]."""
+        assert self._artifact is not None
+        if self._is_rgb_patches(patches):
+            # The exported graph only has the full-channel input projection
+            patches = self._expand_rgb_patches(patches)
         with torch.no_grad():
-            loss, pred, mask = self._model(patches, mask_ratio=0.0)  # type: ignore[misc]
+            return self._artifact(patches.contiguous())
+
+    def _patch_logits(self, patches: torch.Tensor, mode: str = DEFAULT_INFERENCE_MODE) -> torch.Tensor:
+        """Run SatViT on a patch tensor [B, num_patches, io_dim] and return logits [B, io_dim]."""
+        return self._patch_outputs(patches, mode)[0]
+
+    def _stack_patches(self, patches: Sequence[torch.Tensor]) -> torch.Tensor:
+        patches = list(patches)
+        if len(patches) == 1:
+            return patches[0]  # already a batch (e.g. from images_to_patches); skip the copy
+        if len({p.shape[-1] for p in patches}) > 1:
+            # RGB fast-path and full-channel inputs in one batch: fall back to the full layout
+            patches = [self._expand_rgb_patches(p) if self._is_rgb_patches(p) else p for p in patches]
+        return torch.cat(patches, dim=0)  # [B, num_patches, io_dim]
+
+    def batch_logits(
+        self,
+        patches: Sequence[torch.Tensor],
+        mode: str = DEFAULT_INFERENCE_MODE,
+    ) -> List[torch.Tensor]:
+        """Run one batched forward pass over per-image patch tensors [1, num_patches, io_dim].
+
+        Returns one 1D logits vector per input, in order.
+        """
+        return list(self._patch_logits(self._stack_patches(patches), mode).unbind(0))
+
+    def batch_outputs(
+        self,
+        patches: Sequence[torch.Tensor],
+        mode: str = DEFAULT_INFERENCE_MODE,
+    ) -> List[Tuple[torch.Tensor, torch.Tensor, Optional[Dict[str, Any]]]]:
+        """Like batch_logits, but returns (logits, pooled embedding, adaptive-mode stats or None) per input."""
+        logits, embeddings, stats = self._patch_outputs(self._stack_patches(patches), mode)
+        return list(zip(logits.unbind(0), embeddings.unbind(0), stats or [None] * len(logits)))
+
+    def encode_tokens(
+        self,
+        patches: Sequence[torch.Tensor],
+        mode: str = DEFAULT_INFERENCE_MODE,
+    ) -> Dict[str, Any]:
+        """Encode per-image patch tensors as one batch, keeping the per-patch encoder tokens.
+
+        Returns ``logits`` [B, io_dim], ``tokens`` [B, num_patches, encoder_dim]
+        and ``stats`` (per-image adaptive-mode stats, or None).
+        The "mae" mode is served by "encoder", which gives the same logits.
+        """
+        if not self.is_loaded:
+            self.load()
+
+        mode = resolve_inference_mode(mode)
+        mode = "encoder" if mode == "mae" else mode
+        patches = self._stack_patches(patches)
+        stats = None
+        with torch.no_grad(), self._autocast():
+            if self._artifact is not None and mode == self._artifact_mode:
+                with stage("artifact"):
+                    logits, latent = self._run_artifact(patches)
+            else:
+                with stage("encoder"):
+                    if mode == "adaptive":
+                        latent, stats = self._encode_adaptive(patches)
+                    else:
+                        latent = self._encode(patches)
+                with stage("decoder"):
+                    logits = self._eager_model().decode(latent, pool=True, blocks=mode != "linear")
+        return {"logits": logits.float(), "tokens": latent.float(), "stats": stats}
+
+    def patch_change(
+        self,
+        before: torch.Tensor,
+        after: torch.Tensor,
+        mode: str = DEFAULT_INFERENCE_MODE,
+        metric: str = "cosine",
+    ) -> Dict[str, Any]:
+        """Encode a before/after pair as one batch of 2 and compare per-patch encoder tokens.
+
+        Returns ``logits`` [2, io_dim] and ``embeddings`` [2, encoder_dim] for
+        the pair, plus ``distances`` [grid, grid] between corresponding tokens
+        and ``stats`` (per-image adaptive-mode stats, or None).
+        """
+        out = self.encode_tokens([before, after], mode)
+        latent = out["tokens"]
+        distances = patch_distances(latent[0], latent[1], metric)
+
+        assert self._num_patches is not None
+        grid_size = int(self._num_patches ** 0.5)
+        return {
+            "logits": out["logits"],
+            "embeddings": latent.mean(dim=1),
+            "distances": distances.view(grid_size, grid_size),
+            "stats": out["stats"],
+        }
+
+    def _image_logits(self, image: Image.Image, mode: str = DEFAULT_INFERENCE_MODE) -> torch.Tensor:
+        """Run SatViT on an image and return a 1D logits vector."""
+
+        if not self.is_loaded:
+            self.load()
+
+        patches = self._image_to_patches(image)
 
         # Aggregate over patches -> [io_dim]
-        logits = pred.mean(dim=1).view(-1)
-        return logits
+        return self._patch_logits(patches, mode).view(-1)
+
+    def parity_check(self, image: Image.Image, mode: str = DEFAULT_INFERENCE_MODE) -> Dict[str, Any]:
+        """Compare ``mode`` against the original "mae" path on one image.
 
-    def predict(self, image: Image.Image) -> Dict[str, Any]:
+        Returns the largest absolute differences in logits and softmax
+        probabilities and whether the top class agrees, so a mode switch can be
+        validated on real tiles before rolling it out.
+        """
+        if not self.is_loaded:
+            self.load()
+
+        patches = self._image_to_patches(image)
+        reference = self._patch_logits(patches, "mae").view(-1)
+        candidate = self._patch_logits(patches, mode).view(-1)
+
+        ref_probs = torch.softmax(reference, dim=0)
+        cand_probs = torch.softmax(candidate, dim=0)
+
+        return {
+            "mode": mode,
+            "max_abs_logit_diff": float(torch.max(torch.abs(candidate - reference)).item()),
+            "max_abs_prob_diff": float(torch.max(torch.abs(cand_probs - ref_probs)).item()),
+            "top_class_match": bool(torch.argmax(ref_probs).item() == torch.argmax(cand_probs).item()),
+        }
+
+    def predict(self, image: Image.Image, mode: str = DEFAULT_INFERENCE_MODE) -> Dict[str, Any]:
         """Run inference and return a generic prediction dictionary.
 
         Note: This uses softmax over the first dimension of the model output.
         You should adapt this to your exact TerraViT head (e.g. regression, multi-label, etc.).
         """
         # Use the helper that maps images -> SatViT patch space -> logits
-        logits = self._image_logits(image)
+        return self.logits_to_prediction(self._image_logits(image, mode))
+
+    @staticmethod
+    def logits_to_prediction(logits: torch.Tensor, top_k: Optional[int] = None) -> Dict[str, Any]:
+        """Turn a 1D logits vector into the generic prediction dictionary.
 
+        With ``top_k``, ``raw_scores`` only holds the ``top_k`` highest
+        probabilities (descending) and ``class_indices`` their classes.
+        """
         probs = torch.softmax(logits, dim=0)
         top_prob, top_idx = torch.max(probs, dim=0)
 
-        return {
+        result = {
             "top_class_index": int(top_idx.item()),
             "top_class_score": float(top_prob.item()),
             "raw_scores": probs.cpu().tolist(),
             "raw_output": None,
         }
-
-        # Fallback: just stringify whatever the model returned
-        return {
-            "top_class_index": None,
-            "top_class_score": None,
-            "raw_scores": None,
-            "raw_output": str(output),
-        }
+        if top_k is not None:
+            values, indices = torch.topk(probs, min(top_k, probs.numel()))
+            result["raw_scores"] = values.cpu().tolist()
+            result["class_indices"] = indices.cpu().tolist()
+        return result
 
 
 terravit_model = TerraViTModel()
+
+
+# Module-level entry points for executor workers. They reference the global
+# model (or a model_registry entry) by name, so they pickle cheaply into
+# process-pool workers, each of which holds its own loaded copy.
+
+
+def get_model(name: Optional[str] = None) -> TerraViTModel:
+    """The loaded global model, or the model registered as ``name`` (see model_registry)."""
+    if name is None:
+        terravit_model.load()
+        return terravit_model
+    # Imported here: model_registry imports this module
+    from model_registry import model_registry
+
+    return model_registry.get(name)
+
+
+def pixel_digest(image: Image.Image) -> str:
+    """Content hash of decoded pixels, independent of the file encoding."""
+    h = hashlib.blake2b(digest_size=20)
+    h.update(f"{image.mode}:{image.size[0]}x{image.size[1]}:".encode())
+    h.update(image.tobytes())
+    return h.hexdigest()
+
+
+def decode_image(image_bytes: bytes, model: Optional[str] = None) -> Tuple[str, Image.Image]:
+    """Decode uploaded image bytes; return their pixel digest and the image fitted to the global (or named) model.
+
+    With TERRAVIT_REDUCED_DECODE on (default), JPEGs at least twice the
+    model input side are decoded at 1/2 to 1/8 scale (draft mode) and the
+    digest covers those reduced pixels. Raises ValueError if the bytes are
+    not a readable image or it has more than MAX_IMAGE_PIXELS pixels.
+    """
+    target = get_model(model)
+    with stage("decode"):
+        try:
+            image = Image.open(io.BytesIO(image_bytes))
+        except Exception as exc:  # noqa: BLE001
+            raise ValueError("Could not read image file.") from exc
+        if image.width * image.height > MAX_IMAGE_PIXELS:
+            raise ValueError(
+                f"Image is {image.width}x{image.height} pixels; uploads are limited to {MAX_IMAGE_PIXELS} "
+                "(use /predict/tiled for large scenes)."
+            )
+        try:
+            if target._reduced_decode and image.format == "JPEG":
+                # libjpeg scales during the IDCT, keeping both sides >= the requested size
+                image.draft("RGB", (target.input_side, target.input_side))
+            image.load()
+        except Exception as exc:  # noqa: BLE001
+            raise ValueError("Could not read image file.") from exc
+        return pixel_digest(image), target.fit_image(image)
+
+
+def images_to_patches(images: Sequence[Image.Image], model: Optional[str] = None) -> torch.Tensor:
+    """Decoded images as one patch batch for the global (or named) model (see TerraViTModel.images_to_patches)."""
+    target = get_model(model)
+    with stage("preprocess"):
+        return target.images_to_patches(images)
+
+
+def prepare_image(image_bytes: bytes, model: Optional[str] = None) -> Tuple[str, torch.Tensor]:
+    """Decode uploaded image bytes; return their pixel digest and patches [1, num_patches, dim].
+
+    Raises ValueError if the bytes are not a readable image.
+    """
+    digest, image = decode_image(image_bytes, model)
+    return digest, images_to_patches([image], model)
+
+
+def batch_outputs(
+    patches: Sequence[torch.Tensor],
+    mode: str = DEFAULT_INFERENCE_MODE,
+    model: Optional[str] = None,
+) -> List[Tuple[torch.Tensor, torch.Tensor, Optional[Dict[str, Any]]]]:
+    """Batched forward pass on the global (or named) model (see TerraViTModel.batch_outputs)."""
+    return get_model(model).batch_outputs(patches, mode)
+
+
+def encode_tokens(
+    patches: Sequence[torch.Tensor],
+    mode: str = DEFAULT_INFERENCE_MODE,
+    model: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Batched logits and per-patch encoder tokens on the global (or named) model (see TerraViTModel.encode_tokens)."""
+    return get_model(model).encode_tokens(patches, mode)
+
+
+def patch_change(
+    before: torch.Tensor,
+    after: torch.Tensor,
+    mode: str = DEFAULT_INFERENCE_MODE,
+    metric: str = "cosine",
+    model: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Spatial change on the global (or named) model (see TerraViTModel.patch_change)."""
+    return get_model(model).patch_change(before, after, mode, metric)
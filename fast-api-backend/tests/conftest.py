@@ -0,0 +1,64 @@
+"""Shared fixtures: the service runs on random V1 weights with all state in a temporary directory.
+
+The environment is configured at import, before any test module imports the
+service, since its modules read TERRAVIT_* when they are first imported.
+"""
+import os
+import shutil
+import sys
+import tempfile
+from typing import Iterator
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+WORKDIR = tempfile.mkdtemp(prefix="terravit-tests-")
+WEIGHTS_PATH = os.path.join(WORKDIR, "SatViT_V1_random.pt")
+
+os.environ.update(
+    {
+        "TERRAVIT_WEIGHTS_PATH": WEIGHTS_PATH,
+        # A second registry entry on the same weights, for ?model= tests
+        "TERRAVIT_MODELS": f"alt={WEIGHTS_PATH}:V1",
+        "TERRAVIT_ERA5_CACHE_PATH": "",
+        "TERRAVIT_JOB_DB": os.path.join(WORKDIR, "jobs.sqlite3"),
+        "TERRAVIT_JOB_DIR": os.path.join(WORKDIR, "job_data"),
+        "TERRAVIT_SITE_DIR": "",
+        "TERRAVIT_VECTOR_INDEX_DIR": "",
+        "TERRAVIT_PROFILE_DIR": os.path.join(WORKDIR, "profiles"),
+    }
+)
+os.environ.pop("TERRAVIT_CACHE_DIR", None)
+
+
+@pytest.fixture(scope="session")
+def weights_path() -> Iterator[str]:
+    """Randomly initialized V1 weights at TERRAVIT_WEIGHTS_PATH (V1 encodes 256 tokens, so forward passes stay fast)."""
+    from benchmark import _random_weights
+
+    path = _random_weights("V1", WORKDIR)
+    assert path == WEIGHTS_PATH
+    yield path
+    shutil.rmtree(WORKDIR, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def model(weights_path: str):
+    from terravit_model import terravit_model
+
+    terravit_model.load()
+    return terravit_model
+
+
+@pytest.fixture
+def client(model):
+    """TestClient on the app with its inference workers and job queue running."""
+    from fastapi.testclient import TestClient
+
+    import main
+
+    with TestClient(main.app) as test_client:
+        yield test_client
+    main._batchers.clear()
@@ -0,0 +1,57 @@
+import asyncio
+import io
+import json
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import main
+
+
+def _scene() -> bytes:
+    buf = io.BytesIO()
+    Image.fromarray(np.random.default_rng(5).integers(0, 256, (300, 300, 3), dtype=np.uint8)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+@pytest.fixture
+def off_loop_store(monkeypatch):
+    """Fail any JobStore call made on the event loop thread instead of in a worker thread."""
+    store = main.job_manager.store
+    calls = []
+
+    def guard(name):
+        method = getattr(store, name)
+
+        def call(*args, **kwargs):
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                calls.append(name)
+                return method(*args, **kwargs)
+            raise AssertionError(f"JobStore.{name} called on the event loop")
+
+        return call
+
+    for name in ("create", "get", "list", "result", "cancel", "cancel_requested", "finish", "claim_next", "counts"):
+        monkeypatch.setattr(store, name, guard(name))
+    return calls
+
+
+def test_job_endpoints_and_events_keep_the_store_off_the_event_loop(client, off_loop_store):
+    response = client.post("/jobs/tiled", files={"file": ("s.png", _scene(), "image/png")})
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+
+    with client.stream("GET", f"/jobs/{job_id}/events") as events:
+        statuses = [
+            json.loads(line[len("data: ") :])["status"] for line in events.iter_lines() if line.startswith("data: ")
+        ]
+    assert statuses[-1] == "succeeded"
+
+    assert client.get(f"/jobs/{job_id}/result").json()["output"] == "predict"
+    assert job_id in [job["id"] for job in client.get("/jobs").json()["jobs"]]
+    assert client.delete(f"/jobs/{job_id}").json()["status"] == "succeeded"
+    assert client.get("/metrics/jobs").status_code == 200
+    assert {"create", "get", "list", "result", "cancel", "finish", "counts"} <= set(off_loop_store)
@@ -0,0 +1,58 @@
+import pytest
+import torch
+from PIL import Image
+
+from terravit_model import TerraViTModel
+
+
+@pytest.fixture(scope="module")
+def image():
+    generator = torch.Generator().manual_seed(0)
+    pixels = torch.randint(0, 256, (256, 256, 3), dtype=torch.uint8, generator=generator)
+    return Image.fromarray(pixels.numpy())
+
+
+def _model(weights_path: str, monkeypatch, **env: str) -> TerraViTModel:
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    model = TerraViTModel(weights_path=weights_path, artifact_path="")
+    model.load()
+    return model
+
+
+@pytest.mark.parametrize("rgb_fast_path", ["1", "0"])
+def test_encoder_mode_matches_mae_path(weights_path, monkeypatch, image, rgb_fast_path):
+    model = _model(weights_path, monkeypatch, TERRAVIT_RGB_FAST_PATH=rgb_fast_path)
+    result = model.parity_check(image, "encoder")
+    assert result["max_abs_logit_diff"] < 1e-4
+    assert result["top_class_match"]
+
+
+def test_attention_backends_match_einsum(weights_path, monkeypatch, image):
+    reference = _model(weights_path, monkeypatch, TERRAVIT_ATTENTION_BACKEND="einsum")
+    patches = reference._image_to_patches(image)
+    expected = reference._patch_logits(patches, "encoder")
+
+    for backend, chunk_size in (("sdpa", "256"), ("chunked", "64")):
+        candidate = _model(
+            weights_path,
+            monkeypatch,
+            TERRAVIT_ATTENTION_BACKEND=backend,
+            TERRAVIT_ATTENTION_CHUNK_SIZE=chunk_size,
+        )
+        torch.testing.assert_close(candidate._patch_logits(patches, "encoder"), expected, rtol=1e-4, atol=1e-4)
+
+
+@pytest.mark.parametrize("precision", ["int8", "bf16"])
+def test_reduced_precision_stays_within_tolerance_of_fp32(weights_path, monkeypatch, image, precision):
+    if precision == "int8" and torch.backends.quantized.supported_engines == ["none"]:
+        pytest.skip("this torch build has no quantized engine")
+    model = _model(weights_path, monkeypatch, TERRAVIT_PRECISION=precision, TERRAVIT_PRECISION_TOLERANCE="0.05")
+    assert model.precision == precision
+
+    # Checked against fp32 at load, on the built-in input, and again on an image
+    for result in (model.precision_check_result, model.precision_check(image)):
+        assert result["precision"] == precision
+        assert result["max_rel_logit_diff"] <= 0.05
+        assert result["min_cosine_similarity"] > 0.99
+        assert result["passed"]
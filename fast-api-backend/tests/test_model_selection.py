@@ -0,0 +1,50 @@
+import io
+import time
+
+import numpy as np
+from PIL import Image
+
+from model_registry import model_registry
+
+
+def _scene() -> bytes:
+    buf = io.BytesIO()
+    Image.fromarray(np.random.default_rng(3).integers(0, 256, (300, 300, 3), dtype=np.uint8)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _last_used(name: str):
+    return next(m["last_used"] for m in model_registry.stats()["models"] if m["name"] == name)
+
+
+def test_tiled_and_raster_endpoints_run_on_the_requested_model(client, tmp_path):
+    before = _last_used("alt") or 0.0
+    response = client.post("/predict/tiled", params={"model": "alt"}, files={"file": ("s.png", _scene(), "image/png")})
+    assert response.status_code == 200
+    used = _last_used("alt")
+    assert used is not None and used > before
+
+    bands = np.random.default_rng(4).normal(size=(15, 260, 260)).astype(np.float32)
+    buf = io.BytesIO()
+    np.save(buf, bands)
+    response = client.post("/predict/raster", params={"model": "alt"}, files={"file": ("r.npy", buf.getvalue())})
+    assert response.status_code == 200
+    assert _last_used("alt") > used
+
+    response = client.post("/predict/tiled", params={"model": "nope"}, files={"file": ("s.png", _scene(), "image/png")})
+    assert response.status_code == 400
+
+
+def test_jobs_keep_the_requested_model(client):
+    before = _last_used("alt") or 0.0
+    response = client.post("/jobs/tiled", params={"model": "alt"}, files={"file": ("s.png", _scene(), "image/png")})
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+
+    deadline = time.monotonic() + 120
+    while client.get(f"/jobs/{job_id}").json()["status"] not in ("succeeded", "failed"):
+        assert time.monotonic() < deadline
+        time.sleep(0.1)
+    assert client.get(f"/jobs/{job_id}").json()["status"] == "succeeded"
+    assert _last_used("alt") > before
+    assert client.get(f"/jobs/{job_id}/result").json()["output"] == "predict"
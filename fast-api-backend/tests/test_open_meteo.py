@@ -0,0 +1,184 @@
+import asyncio
+import json
+import threading
+import time
+from datetime import date, datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from benchmark import _stub_era5, _stub_forecast
+from forecast_cache import ForecastCache
+from open_meteo import ERA5_DAILY, OpenMeteoClient, era5_series_complete
+
+
+def _era5(days: int, missing_tail: int = 0):
+    values = [1.0] * (days - missing_tail) + [None] * missing_tail
+    return {"daily": {name: list(values) for name in ERA5_DAILY.split(",")}}
+
+
+def test_era5_year_is_final_after_lag_or_when_complete():
+    client = OpenMeteoClient(era5_lag_days=5)
+    early_january = datetime(2026, 1, 3, tzinfo=timezone.utc)
+    later = datetime(2026, 1, 10, tzinfo=timezone.utc)
+
+    assert not era5_series_complete(_era5(365, missing_tail=4))
+    assert not client.era5_is_final(2025, _era5(365, missing_tail=4), early_january)
+    assert client.era5_is_final(2025, _era5(365), early_january)
+    assert client.era5_is_final(2025, _era5(365, missing_tail=4), later)
+    # The current year is never final, however complete its days so far
+    assert not client.era5_is_final(2026, _era5(3), later)
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """Open-Meteo forecast/ERA5 answers from the benchmark's synthetic data, recording each request."""
+
+    protocol_version = "HTTP/1.1"  # keep-alive, so pooled connections are observable
+
+    def do_GET(self) -> None:
+        server = self.server
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        server.requests.append((url.path, params, self.client_address[1]))
+        time.sleep(server.delay_s)
+        lats = [float(v) for v in params["latitude"].split(",")]
+        lons = [float(v) for v in params["longitude"].split(",")]
+        if url.path == "/era5":
+            start, end = date.fromisoformat(params["start_date"]), date.fromisoformat(params["end_date"])
+            data = _stub_era5(lats[0], lons[0], (end - start).days + 1)
+            if server.era5_missing_days:
+                for values in data["daily"].values():
+                    values[-server.era5_missing_days :] = [None] * server.era5_missing_days
+        else:
+            forecasts = [_stub_forecast(lat, lon) for lat, lon in zip(lats, lons)]
+            data = forecasts if len(forecasts) > 1 else forecasts[0]
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    server.requests = []
+    server.era5_missing_days = 0
+    server.delay_s = 0.0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _client(server, **kwargs) -> OpenMeteoClient:
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    return OpenMeteoClient(forecast_url=f"{base}/forecast", archive_url=f"{base}/era5", **kwargs)
+
+
+def test_pooled_client_reuses_one_connection(stub_server):
+    client = _client(stub_server)
+
+    async def run():
+        http = client.client
+        for i in range(5):
+            await client.forecast(10.0 + i, 20.0)
+        assert client.client is http
+        await client.aclose()
+        await client.forecast(0.0, 0.0)  # reopens lazily
+        await client.aclose()
+
+    asyncio.run(run())
+    ports = [port for _, _, port in stub_server.requests]
+    assert len(ports) == 6
+    assert len(set(ports[:5])) == 1 and ports[5] != ports[0]
+
+
+def test_forecast_chunks_groups_points_into_multi_location_requests(stub_server):
+    client = _client(stub_server, locations_per_request=3, concurrency=2)
+    points = [(10.0 + i, 20.0 - i) for i in range(8)]
+
+    async def run():
+        chunks = [chunk async for chunk in client.forecast_chunks(points)]
+        single = await client.forecast_many([1.0], [2.0])
+        await client.aclose()
+        return chunks, single
+
+    chunks, single = asyncio.run(run())
+    assert sorted(len(params["latitude"].split(",")) for _, params, _ in stub_server.requests[:3]) == [2, 3, 3]
+    seen = {}
+    for indices, forecasts in chunks:
+        assert forecasts is not None
+        seen.update(zip(indices, forecasts))
+    assert sorted(seen) == list(range(8))
+    assert all(seen[i]["latitude"] == points[i][0] for i in seen)
+    # A single location comes back as one object and is still returned as a list
+    assert len(single) == 1 and single[0]["latitude"] == 1.0
+
+
+def test_era5_cache_hits_final_years_and_refetches_others(stub_server, tmp_path):
+    client = _client(stub_server, cache_path=str(tmp_path / "era5.sqlite3"))
+    this_year = datetime.now(timezone.utc).year
+    past = [this_year - 3, this_year - 2]
+
+    async def run(years):
+        result = await client.era5_years(45.123, 7.456, years)
+        await client.aclose()
+        return result
+
+    first = asyncio.run(run(past + [this_year]))
+    assert len(stub_server.requests) == 3
+    assert all(params["latitude"] == "45.12" for _, params, _ in stub_server.requests)
+
+    second = asyncio.run(run(past + [this_year]))
+    # Past years come from the cache; the current year is fetched again
+    assert len(stub_server.requests) == 4
+    assert stub_server.requests[-1][1]["start_date"] == f"{this_year}-01-01"
+    assert {year: second[year] for year in past} == {year: first[year] for year in past}
+
+    # A year that ended within the lag window and still has null days is not cached
+    stub_server.era5_missing_days = 4
+    client.era5_lag_days = 100_000
+    asyncio.run(run([this_year - 1]))
+    asyncio.run(run([this_year - 1]))
+    assert len(stub_server.requests) == 6
+
+
+def test_batch_and_single_forecasts_share_cache_and_inflight_fetches(stub_server):
+    stub_server.delay_s = 0.2
+    cache = ForecastCache()
+    client = _client(stub_server, locations_per_request=3, forecast_cache=cache)
+    points = [(10.0, 20.0), (11.0, 21.0), (12.0, 22.0)]
+
+    async def batch():
+        seen = {}
+        async for indices, forecasts in client.forecast_chunks(points):
+            seen.update(zip(indices, forecasts))
+        return seen
+
+    async def run():
+        single = asyncio.ensure_future(client.forecast(10.0, 20.0))
+        await asyncio.sleep(0)
+        first = asyncio.ensure_future(batch())
+        while cache.stats()["inflight"] < 3:
+            await asyncio.sleep(0.01)
+        # Joins the batch's fetch instead of requesting (11, 21) again
+        joined = await client.forecast(11.0, 21.0)
+        results = await first, await single, joined
+        second = await batch()
+        await client.aclose()
+        return results, second
+
+    (first, single, joined), second = asyncio.run(run())
+    # One single-location request and one request for the two cells the batch claimed
+    assert sorted(params["latitude"] for _, params, _ in stub_server.requests) == ["10.0", "11.0,12.0"]
+    assert first[0] == single and first[1] == joined and second == first
+    stats = cache.stats()
+    assert (stats["hits"], stats["coalesced"], stats["misses"]) == (3, 2, 3)
+    assert stats["hit_rate"] == 5 / 8 and stats["inflight"] == 0
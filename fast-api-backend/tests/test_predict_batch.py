@@ -0,0 +1,46 @@
+import io
+import json
+import zipfile
+
+from PIL import Image
+
+
+def _png(side: int, seed: int) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (side, side), (seed * 40 % 256, 90, 200 - seed)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _lines(response):
+    return [json.loads(line) for line in response.text.splitlines() if line]
+
+
+def test_predict_batch_files_streams_one_line_per_file(client):
+    files = [("files", (f"{i}.png", _png(64, i), "image/png")) for i in range(3)]
+    response = client.post("/predict/batch", files=files, params={"batch_size": 2})
+
+    assert response.status_code == 200
+    lines = _lines(response)
+    assert [line["filename"] for line in lines] == ["0.png", "1.png", "2.png"]
+    assert [line["index"] for line in lines] == [0, 1, 2]
+    assert all(line["error"] is None and line["top_class_index"] is not None for line in lines)
+
+
+def test_predict_batch_reports_unreadable_file_and_corrupt_archive_separately(client):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("a.png", _png(64, 7))
+    corrupt = archive.getvalue()[:-30]
+    files = [
+        ("files", ("ok.png", _png(64, 1), "image/png")),
+        ("files", ("bad.png", b"not an image", "image/png")),
+        ("archive", ("scenes.zip", corrupt, "application/zip")),
+    ]
+    response = client.post("/predict/batch", files=files)
+
+    assert response.status_code == 200
+    lines = _lines(response)
+    assert [line["filename"] for line in lines] == ["ok.png", "bad.png", "scenes.zip"]
+    assert lines[0]["error"] is None
+    assert lines[1]["error"] == "Could not read image file."
+    assert lines[2]["error"].startswith("Could not read archive")
@@ -0,0 +1,40 @@
+import os
+import tempfile
+
+import numpy as np
+
+from raster_io import open_raster
+from tiling import analyze_raster
+
+
+def test_compressed_bands_are_spilled_to_mapped_files_and_removed_on_close(tmp_path, monkeypatch):
+    spill_dir = tmp_path / "spill"
+    spill_dir.mkdir()
+    monkeypatch.setattr(tempfile, "tempdir", str(spill_dir))
+    bands = np.random.default_rng(0).normal(size=(3, 70, 90)).astype(np.float32)
+    path = str(tmp_path / "bands.npz")
+    np.savez_compressed(path, *bands)
+
+    with open_raster(path) as stack:
+        assert (stack.num_bands, stack.height, stack.width) == (3, 70, 90)
+        window = stack.read_window(64, 32, 48)
+        # Every decoded band now lives in its own mapped temporary file, not in memory
+        assert all(isinstance(stack.band(i), np.memmap) for i in range(3))
+        assert len(os.listdir(spill_dir)) == 3
+    assert os.listdir(spill_dir) == []
+
+    expected = np.zeros((3, 48, 48), dtype=np.float32)
+    expected[:, :38, :26] = bands[:, 32:70, 64:90]
+    np.testing.assert_array_equal(window, expected)
+
+
+def test_analyze_raster_leaves_no_temporary_files(tmp_path, monkeypatch, model):
+    spill_dir = tmp_path / "spill"
+    spill_dir.mkdir()
+    monkeypatch.setattr(tempfile, "tempdir", str(spill_dir))
+    bands = np.random.default_rng(1).normal(size=(model.config.num_channels, 40, 40)).astype(np.float32)
+    path = str(tmp_path / "stack.npz")
+    np.savez_compressed(path, bands)
+
+    result = analyze_raster(path, after_path=path)
+    assert result["output"] == "change" and os.listdir(spill_dir) == []
@@ -0,0 +1,52 @@
+import torch
+from PIL import Image
+
+from result_cache import CachedResult, ResultCache
+from terravit_model import TerraViTModel, pixel_digest
+
+
+def _adaptive_model(weights_path: str, monkeypatch, keep_ratio: str) -> TerraViTModel:
+    monkeypatch.setenv("TERRAVIT_ADAPTIVE_KEEP_RATIO", keep_ratio)
+    model = TerraViTModel(weights_path=weights_path, artifact_path="")
+    model.load()
+    return model
+
+
+def test_adaptive_configs_do_not_share_cache_entries(weights_path, monkeypatch, tmp_path):
+    half = _adaptive_model(weights_path, monkeypatch, "0.5")
+    most = _adaptive_model(weights_path, monkeypatch, "0.9")
+    # Exact modes do not depend on the adaptive config
+    assert half.mode_id("encoder") == most.mode_id("encoder") == half.weights_id
+    assert half.mode_id("adaptive") != most.mode_id("adaptive")
+
+    image = Image.new("RGB", (half.input_side, half.input_side), (30, 120, 60))
+    digest = pixel_digest(image)
+    half_key = ResultCache.key(half.mode_id("adaptive"), "adaptive", digest)
+    most_key = ResultCache.key(most.mode_id("adaptive"), "adaptive", digest)
+
+    cache = ResultCache(max_entries=8, disk_dir=str(tmp_path))
+    logits, embedding, stats = half.batch_outputs([half.images_to_patches([image])], "adaptive")[0]
+    cache.put(half_key, CachedResult(logits=logits, embedding=embedding, stats=stats))
+
+    assert cache.get(most_key) is None
+    assert ResultCache(max_entries=8, disk_dir=str(tmp_path)).get(most_key) is None
+
+    # The entry keeps its adaptive stats, in memory and on disk
+    assert stats is not None and stats["tokens_kept"] < half.config.num_patches
+    assert cache.get(half_key).stats == stats
+    assert ResultCache(max_entries=8, disk_dir=str(tmp_path)).get(half_key).stats == stats
+
+
+def test_memory_and_disk_tiers_split_lookups_and_counts(tmp_path):
+    result = CachedResult(logits=torch.arange(4, dtype=torch.float32))
+    ResultCache(max_entries=8, disk_dir=str(tmp_path)).put("k", result)
+
+    cache = ResultCache(max_entries=8, disk_dir=str(tmp_path))
+    assert cache.get_memory("k") is None and cache.get_memory("other") is None
+    loaded = cache.get_disk("k")
+    assert loaded is not None and torch.equal(loaded.logits, result.logits)
+    assert cache.get_disk("other") is None
+    # The disk hit was promoted, so the next lookup never leaves memory
+    assert cache.get_memory("k") is not None
+    stats = cache.stats()
+    assert (stats["hits"], stats["disk_hits"], stats["misses"]) == (1, 1, 1)
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+import tiling
+from tiling import Scene, analyze_scene, tile_layout
+
+
+@pytest.fixture
+def scene_path(tmp_path):
+    pixels = np.random.default_rng(0).integers(0, 256, (300, 520, 3), dtype=np.uint8)
+    path = tmp_path / "scene.tif"
+    Image.fromarray(pixels).save(path)  # uncompressed, so it is memory-mapped
+    return str(path), pixels
+
+
+def test_scene_windows_match_full_decode_with_zero_padding(scene_path):
+    path, pixels = scene_path
+    scene = Scene(path)
+    try:
+        assert (scene.width, scene.height) == (520, 300)
+        assert scene._pixels is not None
+        inside = np.asarray(scene.read_window((256, 0, 512, 256)))
+        edge = np.asarray(scene.read_window((264, 44, 520, 300)))
+        padded = np.asarray(scene.read_window((400, 200, 656, 456)))
+    finally:
+        scene.close()
+
+    np.testing.assert_array_equal(inside, pixels[0:256, 256:512])
+    np.testing.assert_array_equal(edge, pixels[44:300, 264:520])
+    assert padded.shape == (256, 256, 3)
+    np.testing.assert_array_equal(padded[:100, :120], pixels[200:300, 400:520])
+    assert not padded[100:].any() and not padded[:, 120:].any()
+
+
+def test_scene_converts_and_resizes_per_window(tmp_path):
+    path = tmp_path / "gray.png"
+    Image.new("L", (100, 50), 128).save(path)
+    scene = Scene(str(path), size=(200, 100))
+    try:
+        window = scene.read_window((0, 0, 64, 64))
+    finally:
+        scene.close()
+    assert window.mode == "RGB" and window.size == (64, 64)
+    assert np.asarray(window).min() == np.asarray(window).max() == 128
+
+
+@pytest.mark.parametrize("fmt", ["BMP", "PNG"])
+def test_scene_resized_windows_match_resized_scene(scene_path, tmp_path, fmt):
+    _, pixels = scene_path
+    path = tmp_path / f"after.{fmt.lower()}"
+    Image.fromarray(pixels).save(path, format=fmt)
+    expected = np.asarray(Image.fromarray(pixels).resize((260, 150))).astype(int)
+
+    scene = Scene(str(path), size=(260, 150))
+    try:
+        window = np.asarray(scene.read_window((100, 50, 356, 306))).astype(int)
+    finally:
+        scene.close()
+    # Resampling differs from the whole-scene resize only by rounding at the region border
+    assert np.abs(window[:100, :160] - expected[50:150, 100:260]).mean() < 1.0
+    assert not window[100:].any()
+
+
+def test_scene_pixel_limit(scene_path, monkeypatch):
+    assert Image.MAX_IMAGE_PIXELS >= tiling.MAX_SCENE_PIXELS
+    monkeypatch.setattr(tiling, "MAX_SCENE_PIXELS", 100_000)
+    with pytest.raises(ValueError, match="TERRAVIT_MAX_SCENE_PIXELS"):
+        Scene(scene_path[0])
+
+
+def test_analyze_scene_tiles_grid(model, scene_path):
+    result = analyze_scene(scene_path[0], overlap=16, batch_size=2)
+    xs, ys = tile_layout(520, 300, model.input_side, 16)
+    assert (result["rows"], result["cols"]) == (len(ys), len(xs))
+    assert len(result["tiles"]) == len(xs) * len(ys)
+
+    change = analyze_scene(scene_path[0], scene_path[0], batch_size=4)
+    assert change["output"] == "change"
+    assert max(tile["change_score"] for tile in change["tiles"]) < 1e-5
+
+
+def test_predict_tiled_endpoint(client, scene_path):
+    with open(scene_path[0], "rb") as f:
+        response = client.post("/predict/tiled", files={"file": ("scene.tif", f.read(), "image/tiff")})
+    assert response.status_code == 200
+    assert response.json()["output"] == "predict"
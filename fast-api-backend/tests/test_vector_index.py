@@ -0,0 +1,48 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+from vector_index import VectorIndex
+
+
+def _png(seed: int) -> bytes:
+    buf = io.BytesIO()
+    Image.fromarray(np.random.default_rng(seed).integers(0, 256, (64, 64, 3), dtype=np.uint8)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def test_spaces_keep_ids_and_searches_apart(tmp_path):
+    index = VectorIndex(str(tmp_path))
+    rng = np.random.default_rng(0)
+    a, b = rng.normal(size=(2, 8))
+    assert index.add("t", a, space="encoder:w1")
+    assert index.add("t", b, space="adaptive:w1")
+    assert not index.add("t", b, space="adaptive:w1")
+
+    assert [r["space"] for r in index.search(a, k=5, space="encoder:w1")] == ["encoder:w1"]
+    assert index.search(a, k=5, space="encoder:w2") == []
+    assert len(index.search(a, k=5)) == 2
+
+    reloaded = VectorIndex(str(tmp_path))
+    assert reloaded.has("t", "adaptive:w1") and not reloaded.has("t")
+    assert [r["space"] for r in reloaded.search(b, k=5, space="adaptive:w1")] == ["adaptive:w1"]
+    assert reloaded.stats()["spaces"] == 2
+
+
+def test_embed_and_search_separate_inference_modes(client):
+    tile = {"file": ("tile.png", _png(1), "image/png")}
+    encoder = client.post("/embed", params={"mode": "encoder"}, files=tile).json()
+    adaptive = client.post("/embed", params={"mode": "adaptive"}, files=tile).json()
+    # The same pixels under another mode get their own default id and entry
+    assert encoder["indexed"] and adaptive["indexed"] and encoder["id"] != adaptive["id"]
+    assert not client.post("/embed", params={"mode": "adaptive"}, files=tile).json()["indexed"]
+
+    for mode, expected in (("encoder", encoder["id"]), ("adaptive", adaptive["id"])):
+        response = client.post("/search/similar", params={"mode": mode, "k": 10}, files=tile)
+        assert response.status_code == 200
+        ids = [r["id"] for r in response.json()["results"]]
+        assert expected in ids and ({encoder["id"], adaptive["id"]} - {expected}).isdisjoint(ids)
+
+    response = client.post("/search/similar", params={"model": "nope"}, files=tile)
+    assert response.status_code == 400
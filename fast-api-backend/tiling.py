@@ -0,0 +1,372 @@
+import math
+import os
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import torch
+from PIL import Image
+
+from raster_io import open_raster, standardize_bands
+from terravit_model import DEFAULT_INFERENCE_MODE, TerraViTModel, get_model
+
+
+Box = Tuple[int, int, int, int]
+
+# Largest scene /predict/tiled accepts, in pixels (default 2**30, e.g. 32k x 32k). PIL's decompression-bomb
+# guard (Image.MAX_IMAGE_PIXELS, ~89 Mpx, an error at twice that) would reject a 10k x 10k scene before it is
+# ever tiled, so it is raised to this limit process-wide. Scenes are read one window at a time; single-image
+# uploads are held to terravit_model.MAX_IMAGE_PIXELS instead.
+MAX_SCENE_PIXELS = int(os.getenv("TERRAVIT_MAX_SCENE_PIXELS", str(1 << 30)))
+Image.MAX_IMAGE_PIXELS = max(Image.MAX_IMAGE_PIXELS or 0, MAX_SCENE_PIXELS)
+
+# progress(windows_done, windows_total); may raise to abort a long analysis
+ProgressCallback = Callable[[int, int], None]
+
+
+def window_starts(length: int, window: int, stride: int) -> List[int]:
+    """Start offsets of windows covering ``length``; the last window is aligned to the far edge."""
+    if length <= window:
+        return [0]
+    starts = list(range(0, length - window + 1, stride))
+    if starts[-1] != length - window:
+        starts.append(length - window)
+    return starts
+
+
+def tile_layout(width: int, height: int, window: int, overlap: int) -> Tuple[List[int], List[int]]:
+    """Return (x starts, y starts) of the sliding-window grid over a ``width`` x ``height`` scene."""
+    if not 0 <= overlap < window:
+        raise ValueError(f"overlap must be in [0, {window}), got {overlap}")
+    stride = window - overlap
+    return window_starts(width, window, stride), window_starts(height, window, stride)
+
+
+def iter_windows(width: int, height: int, window: int, overlap: int) -> Iterator[Tuple[int, int, Box]]:
+    """Yield (row, col, box) row by row; boxes may extend past the scene edge (readers zero pad)."""
+    xs, ys = tile_layout(width, height, window, overlap)
+    for row, y in enumerate(ys):
+        for col, x in enumerate(xs):
+            yield row, col, (x, y, x + window, y + window)
+
+
+def tiled_outputs(
+    model: TerraViTModel,
+    width: int,
+    height: int,
+    read_window: Callable[[Box], Any],
+    mode: str = DEFAULT_INFERENCE_MODE,
+    overlap: int = 0,
+    batch_size: int = 8,
+    progress: Optional[Callable[[int], None]] = None,
+) -> Dict[str, Any]:
+    """Run ``model`` over every window of a ``width`` x ``height`` scene in batches of ``batch_size``.
+
+    ``read_window(box)`` returns anything ``model._image_to_patches`` accepts
+    (a PIL tile or a normalized band array), so only the windows being
+    inferred are ever decoded. Windows are ``model.input_side`` pixels square,
+    so tiles are encoded at native resolution instead of squashing the scene,
+    and only one batch of tiles is held as tensors at a time. Returns the
+    grid layout and per-tile logits [rows, cols, io_dim]. ``progress`` is
+    called with the number of windows done after each batch.
+    """
+    model.load()
+    window = model.input_side
+    xs, ys = tile_layout(width, height, window, overlap)
+
+    logits: List[torch.Tensor] = []
+    boxes: List[Box] = []
+    pending: List[torch.Tensor] = []
+
+    def flush() -> None:
+        logits.extend(model.batch_logits(pending, mode))
+        pending.clear()
+        if progress is not None:
+            progress(len(logits))
+
+    for _, _, box in iter_windows(width, height, window, overlap):
+        boxes.append(box)
+        pending.append(model._image_to_patches(read_window(box)))
+        if len(pending) >= batch_size:
+            flush()
+    if pending:
+        flush()
+
+    return {
+        "window": window,
+        "rows": len(ys),
+        "cols": len(xs),
+        "boxes": boxes,
+        "logits": torch.stack(logits).view(len(ys), len(xs), -1),
+    }
+
+
+def _scene_progress(
+    progress: Optional[ProgressCallback], window: int, width: int, height: int, overlap: int, scenes: int
+) -> Callable[[int], Callable[[int], None]]:
+    """Per-scene window callbacks that report overall progress across ``scenes`` equally sized scenes."""
+    xs, ys = tile_layout(width, height, window, overlap)
+    per_scene = len(xs) * len(ys)
+
+    def for_scene(index: int) -> Callable[[int], None]:
+        def report(done: int) -> None:
+            if progress is not None:
+                progress(index * per_scene + done, scenes * per_scene)
+
+        return report
+
+    return for_scene
+
+
+# Uncompressed pixel layouts read straight from the file: PIL raw mode -> bytes per pixel
+_MAPPABLE_RAWMODES = {"RGB": 3, "BGR": 3, "RGBA": 4, "RGBX": 4, "L": 1}
+
+
+def _map_raw_pixels(image: Image.Image, path: str) -> Optional[np.ndarray]:
+    """Memory-map an uncompressed single-block scene (raw TIFF, BMP, PPM) as [H, W, 3] RGB or [H, W] gray.
+
+    Returns None for anything PIL has to decode (compressed or tiled data).
+    PIL itself only maps 1- and 4-byte pixels, so an RGB scene would
+    otherwise be decoded in full on the first crop.
+    """
+    if len(image.tile) != 1:
+        return None
+    codec, extents, offset, args = image.tile[0]
+    rawmode, stride, ystep = (args, 0, 1) if isinstance(args, str) else (tuple(args) + (0, 1))[:3]
+    width, height = image.size
+    bpp = _MAPPABLE_RAWMODES.get(rawmode) if codec == "raw" else None
+    if bpp is None or tuple(extents) != (0, 0, width, height) or ystep not in (1, -1):
+        return None
+    stride = stride or width * bpp
+    if stride < width * bpp or offset + stride * height > os.path.getsize(path):
+        return None
+
+    rows = np.memmap(path, dtype=np.uint8, mode="r", offset=offset, shape=(height, stride))
+    if ystep == -1:
+        rows = rows[::-1]  # bottom-up rows (BMP)
+    pixels = rows[:, : width * bpp].reshape(height, width, bpp)
+    if rawmode == "L":
+        return pixels[:, :, 0]
+    return pixels[:, :, 2::-1] if rawmode == "BGR" else pixels[:, :, :3]
+
+
+class Scene:
+    """Lazily opened image scene read as RGB one window at a time.
+
+    Nothing is decoded up front. Uncompressed scenes (raw TIFF, BMP, PPM)
+    are memory-mapped, so a window only touches the rows under it.
+    Compressed formats (PNG, JPEG, compressed TIFF) cannot be decoded
+    partially; PIL decodes them once in their native mode, and only each
+    window is converted to RGB. With ``size``, the scene is read as if
+    resized to it (for change detection against a differently sized scene),
+    again one window at a time.
+    """
+
+    def __init__(self, path: str, size: Optional[Tuple[int, int]] = None) -> None:
+        try:
+            self._image = Image.open(path)
+        except Exception as exc:  # noqa: BLE001
+            raise ValueError("Could not read image file.") from exc
+        width, height = self._image.size
+        if width * height > MAX_SCENE_PIXELS:
+            self.close()
+            raise ValueError(
+                f"Scene is {width}x{height} pixels; the limit is {MAX_SCENE_PIXELS} (TERRAVIT_MAX_SCENE_PIXELS)."
+            )
+        self._pixels = _map_raw_pixels(self._image, path)
+        self._source_size = (width, height)
+        self.width, self.height = size or (width, height)
+
+    def _region(self, x0: int, y0: int, x1: int, y1: int) -> Image.Image:
+        if self._pixels is not None:
+            return Image.fromarray(np.ascontiguousarray(self._pixels[y0:y1, x0:x1]))
+        return self._image.crop((x0, y0, x1, y1))
+
+    def read_window(self, box: Box) -> Image.Image:
+        """The RGB window ``box`` of the scene, zero padded where it extends past the edge."""
+        x0, y0, x1, y1 = box
+        inside = (x0, y0, min(x1, self.width), min(y1, self.height))
+        try:
+            if self._source_size == (self.width, self.height):
+                tile = self._region(*inside)
+            else:
+                sx, sy = self._source_size[0] / self.width, self._source_size[1] / self.height
+                source = (inside[0] * sx, inside[1] * sy, inside[2] * sx, inside[3] * sy)
+                # Only the source rows/columns under the window are read, then resized into it
+                left, top = math.floor(source[0]), math.floor(source[1])
+                right = min(math.ceil(source[2]), self._source_size[0])
+                bottom = min(math.ceil(source[3]), self._source_size[1])
+                region = self._region(left, top, right, bottom)
+                tile = region.resize(
+                    (inside[2] - x0, inside[3] - y0),
+                    box=(source[0] - left, source[1] - top, source[2] - left, source[3] - top),
+                )
+            tile = tile.convert("RGB")
+        except Exception as exc:  # noqa: BLE001
+            raise ValueError("Could not read image file.") from exc
+        if tile.size == (x1 - x0, y1 - y0):
+            return tile
+        window = Image.new("RGB", (x1 - x0, y1 - y0))
+        window.paste(tile)
+        return window
+
+    def close(self) -> None:
+        self._pixels = None
+        self._image.close()
+
+
+def _tiled_result(
+    width: int,
+    height: int,
+    overlap: int,
+    before_out: Dict[str, Any],
+    after_out: Optional[Dict[str, Any]],
+) -> Dict[str, Any]:
+    before_probs = torch.softmax(before_out["logits"], dim=-1)  # [rows, cols, io_dim]
+
+    tiles: List[Dict[str, Any]] = []
+    if after_out is None:
+        top_scores, top_indices = before_probs.max(dim=-1)  # [rows, cols]
+        grid = top_scores
+        for index, box in enumerate(before_out["boxes"]):
+            row, col = divmod(index, before_out["cols"])
+            tiles.append(
+                {
+                    "row": row,
+                    "col": col,
+                    "bbox": list(box),
+                    "top_class_index": int(top_indices[row, col].item()),
+                    "top_class_score": float(top_scores[row, col].item()),
+                }
+            )
+    else:
+        diffs = torch.softmax(after_out["logits"], dim=-1) - before_probs  # [rows, cols, io_dim]
+        grid = diffs.abs().mean(dim=-1)  # [rows, cols]
+        dominant = diffs.abs().argmax(dim=-1)
+        for index, box in enumerate(before_out["boxes"]):
+            row, col = divmod(index, before_out["cols"])
+            tiles.append(
+                {
+                    "row": row,
+                    "col": col,
+                    "bbox": list(box),
+                    "change_score": float(grid[row, col].item()),
+                    "dominant_change_class_index": int(dominant[row, col].item()),
+                }
+            )
+
+    return {
+        "output": "predict" if after_out is None else "change",
+        "width": width,
+        "height": height,
+        "window": before_out["window"],
+        "overlap": overlap,
+        "rows": before_out["rows"],
+        "cols": before_out["cols"],
+        "grid": grid.tolist(),
+        "tiles": tiles,
+    }
+
+
+def analyze_scene(
+    path: str,
+    after_path: Optional[str] = None,
+    mode: str = DEFAULT_INFERENCE_MODE,
+    overlap: int = 0,
+    batch_size: int = 8,
+    progress: Optional[ProgressCallback] = None,
+    model: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Tiled prediction (or tiled change detection if ``after_path`` is given) on the global (or named) model.
+
+    Module-level so it can run on executor workers. Scenes are read one
+    window at a time (see :class:`Scene`). For change detection the ``after``
+    scene is resized to the ``before`` scene's size, window by window, if
+    they differ.
+    """
+    target = get_model(model)
+    before = Scene(path)
+    try:
+        scenes = 1 if after_path is None else 2
+        report = _scene_progress(progress, target.input_side, before.width, before.height, overlap, scenes)
+        before_out = tiled_outputs(
+            target, before.width, before.height, before.read_window, mode, overlap, batch_size, report(0)
+        )
+    finally:
+        before.close()
+
+    after_out = None
+    if after_path is not None:
+        after = Scene(after_path, size=(before.width, before.height))
+        try:
+            after_out = tiled_outputs(
+                target, after.width, after.height, after.read_window, mode, overlap, batch_size, report(1)
+            )
+        finally:
+            after.close()
+
+    return _tiled_result(before.width, before.height, overlap, before_out, after_out)
+
+
+def analyze_raster(
+    path: str,
+    filename: Optional[str] = None,
+    after_path: Optional[str] = None,
+    after_filename: Optional[str] = None,
+    mode: str = DEFAULT_INFERENCE_MODE,
+    overlap: int = 0,
+    batch_size: int = 8,
+    normalize: bool = True,
+    progress: Optional[ProgressCallback] = None,
+    model: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Tiled prediction / change detection over multi-band rasters on the global (or named) model.
+
+    Rasters are opened lazily (see raster_io.open_raster) and only the windows
+    being inferred are read, as float32 band stacks fed straight into the
+    model; each raster is closed (temporary band files removed) as soon as
+    its pass is done. With ``normalize`` each window is standardized per band. Both
+    rasters must have the same dimensions for change detection.
+    """
+    target = get_model(model)
+    window = target.input_side
+
+    def reader(stack: Any) -> Callable[[Box], Any]:
+        def read(box: Box) -> Any:
+            bands = stack.read_window(box[0], box[1], window)
+            return standardize_bands(bands) if normalize else bands
+
+        return read
+
+    with open_raster(path, filename) as before:
+        scenes = 1 if after_path is None else 2
+        report = _scene_progress(progress, window, before.width, before.height, overlap, scenes)
+        before_out = tiled_outputs(
+            target, before.width, before.height, reader(before), mode, overlap, batch_size, report(0)
+        )
+
+    after_out = None
+    if after_path is not None:
+        with open_raster(after_path, after_filename) as after:
+            if (after.width, after.height) != (before.width, before.height):
+                raise ValueError(
+                    f"Raster sizes differ: {before.width}x{before.height} vs {after.width}x{after.height}"
+                )
+            after_out = tiled_outputs(
+                target, after.width, after.height, reader(after), mode, overlap, batch_size, report(1)
+            )
+
+    return _tiled_result(before.width, before.height, overlap, before_out, after_out)
+
+
+def tiled_summary(result: Dict[str, Any], noun: str = "scene") -> str:
+    """One-line summary of an :func:`analyze_scene` / :func:`analyze_raster` result."""
+    if result["output"] == "change":
+        top = max(result["tiles"], key=lambda t: t["change_score"])
+        return (
+            f"{result['rows']}x{result['cols']} tiles; "
+            f"largest change {top['change_score']:.3f} at row {top['row']}, col {top['col']}."
+        )
+    return (
+        f"{result['rows']}x{result['cols']} tiles of {result['window']}px "
+        f"over a {result['width']}x{result['height']} {noun}."
+    )
@@ -0,0 +1,306 @@
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def spherical_kmeans(vectors: np.ndarray, k: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Cluster unit vectors by cosine similarity; returns unit centroids float32 [k, dim]."""
+    rng = np.random.default_rng(seed)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    centroids = vectors[rng.choice(len(vectors), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        counts = np.bincount(assign, minlength=k)
+        empty = counts == 0
+        if empty.any():
+            # Reseed empty clusters with random members instead of losing them
+            sums[empty] = vectors[rng.choice(len(vectors), size=int(empty.sum()), replace=False)]
+        centroids = _normalize(sums)
+    return centroids
+
+
+class VectorIndex:
+    """Append-only IVF (inverted file) index of embeddings for cosine-similarity search, persisted to a directory.
+
+    Vectors are stored L2-normalized, as float16 on disk and float32 in
+    memory (NumPy has no fast float16 matmul). Until ``train_size``
+    vectors exist, search is an exact scan. After that, spherical k-means
+    splits them into ``nlist`` clusters (4 * sqrt(N) when 0) and a query
+    only scans the vectors of its ``nprobe`` closest clusters. New vectors
+    are assigned to the nearest existing cluster; the clusters are retrained
+    whenever the index has doubled since the last training.
+
+    Each vector may belong to a ``space`` (e.g. the weights and inference
+    mode that produced it). Ids are unique per space, and a search with a
+    space only ranks vectors of that space, since similarities between
+    spaces mean nothing.
+
+    On disk: ``vectors.f16`` (raw row-major float16, appended),
+    ``items.jsonl`` (one JSON record per vector, appended) and
+    ``index.json`` (dimension and cluster centroids, rewritten atomically).
+    Inserts therefore never rewrite existing data, and a partially written
+    tail (e.g. after a crash) is ignored on load.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str],
+        nlist: int = 0,
+        nprobe: int = 8,
+        train_size: int = 4096,
+    ) -> None:
+        self.path = path
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_size = train_size
+
+        self._lock = threading.Lock()
+        self._dim: Optional[int] = None
+        self._vectors = np.zeros((0, 0), dtype=np.float32)  # capacity-doubling buffer; rows [:_count] are valid
+        self._count = 0
+        self._items: List[Dict[str, Any]] = []
+        self._rows: Dict[Tuple[Optional[str], str], int] = {}  # (space, id) -> row
+        self._spaces = np.zeros(0, dtype=np.int32)  # per row, an index into _space_names
+        self._space_names: Dict[Optional[str], int] = {}
+
+        self._centroids: Optional[np.ndarray] = None
+        self._lists: List[List[int]] = []
+        self._trained_at = 0
+
+        self._searches = 0
+        self._search_ms = 0.0
+
+        if self.path:
+            os.makedirs(self.path, exist_ok=True)
+            self._load()
+
+    @classmethod
+    def from_env(cls) -> "VectorIndex":
+        return cls(
+            path=os.getenv("TERRAVIT_VECTOR_INDEX_DIR", "vector_index") or None,
+            nlist=int(os.getenv("TERRAVIT_VECTOR_INDEX_NLIST", "0")),
+            nprobe=int(os.getenv("TERRAVIT_VECTOR_INDEX_NPROBE", "8")),
+            train_size=int(os.getenv("TERRAVIT_VECTOR_INDEX_TRAIN_SIZE", "4096")),
+        )
+
+    def __len__(self) -> int:
+        return self._count
+
+    def has(self, item_id: str, space: Optional[str] = None) -> bool:
+        return (space, item_id) in self._rows
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "vectors": self._count,
+            "dim": self._dim,
+            "spaces": len(self._space_names),
+            "trained": self._centroids is not None,
+            "nlist": 0 if self._centroids is None else len(self._centroids),
+            "nprobe": self.nprobe,
+            "persistent": self.path is not None,
+            "searches": self._searches,
+            "avg_search_ms": self._search_ms / self._searches if self._searches else 0.0,
+        }
+
+    def add(
+        self,
+        item_id: str,
+        vector: np.ndarray,
+        metadata: Optional[Dict[str, Any]] = None,
+        space: Optional[str] = None,
+    ) -> bool:
+        """Insert one embedding under ``item_id`` in ``space``; returns False (and changes nothing) if already stored.
+
+        Raises ValueError if the vector's dimension differs from the index's.
+        """
+        # Round through float16 so memory and disk hold the same values
+        unit = _normalize(np.asarray(vector).reshape(-1)).astype(np.float16).astype(np.float32)
+        record = {"id": item_id, "added_at": time.time(), **(metadata or {})}
+        if space is not None:
+            record["space"] = space
+        with self._lock:
+            if (space, item_id) in self._rows:
+                return False
+            if self._dim is None:
+                self._dim = int(unit.shape[0])
+                self._write_header()
+            elif unit.shape[0] != self._dim:
+                raise ValueError(f"Embedding has dimension {unit.shape[0]}; this index stores {self._dim}")
+
+            self._append(unit, record)
+            self._persist(unit, record)
+            if self._count >= self.train_size and self._count >= 2 * self._trained_at:
+                self._train()
+            return True
+
+    def search(
+        self, vector: np.ndarray, k: int = 10, nprobe: Optional[int] = None, space: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Return up to ``k`` stored items most similar to ``vector``, best first, each with a cosine ``score``.
+
+        With ``space``, only items added in that space are ranked.
+        """
+        started = time.perf_counter()
+        query = _normalize(np.asarray(vector).reshape(-1))
+        with self._lock:
+            if self._count == 0:
+                return []
+            if query.shape[0] != self._dim:
+                raise ValueError(f"Query has dimension {query.shape[0]}; this index stores {self._dim}")
+
+            if self._centroids is None:
+                candidates = None if space is None else np.arange(self._count)
+            else:
+                probe = min(nprobe or self.nprobe, len(self._centroids))
+                closest = np.argsort(-(self._centroids @ query))[:probe]
+                candidates = np.fromiter(
+                    (row for c in closest for row in self._lists[c]),
+                    dtype=np.int64,
+                )
+            if space is not None:
+                space_index = self._space_names.get(space)
+                if space_index is None:
+                    return []
+                candidates = candidates[self._spaces[candidates] == space_index]
+                if len(candidates) == 0:
+                    return []
+            scores = self._vectors[: self._count] @ query if candidates is None else self._vectors[candidates] @ query
+
+            k = min(k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+            top = top[np.argsort(-scores[top])]
+            rows = top if candidates is None else candidates[top]
+            results = [{**self._items[row], "score": float(scores[i])} for i, row in zip(top, rows)]
+
+            self._searches += 1
+            self._search_ms += (time.perf_counter() - started) * 1000.0
+        return results
+
+    def _append(self, unit: np.ndarray, record: Dict[str, Any]) -> None:
+        if self._count == len(self._vectors):
+            grown = np.zeros((max(1024, 2 * len(self._vectors)), self._dim or 0), dtype=np.float32)
+            if self._count:
+                grown[: self._count] = self._vectors[: self._count]
+            self._vectors = grown
+        row = self._count
+        if row == len(self._spaces):
+            self._spaces = np.concatenate([self._spaces, np.zeros(len(self._vectors) - row, dtype=np.int32)])
+        space = record.get("space")
+        self._spaces[row] = self._space_names.setdefault(space, len(self._space_names))
+        self._vectors[row] = unit
+        self._items.append(record)
+        self._rows[(space, record["id"])] = row
+        self._count += 1
+        if self._centroids is not None:
+            self._lists[int(np.argmax(self._centroids @ unit))].append(row)
+
+    def _train(self) -> None:
+        vectors = self._vectors[: self._count]
+        nlist = self.nlist or int(4 * np.sqrt(self._count))
+        nlist = max(1, min(nlist, self._count))
+        # k-means on a sample is enough to place the centroids; every vector is assigned afterwards
+        sample = vectors
+        if len(vectors) > 64 * nlist:
+            sample = vectors[np.random.default_rng(0).choice(len(vectors), size=64 * nlist, replace=False)]
+        self._set_centroids(spherical_kmeans(sample, nlist))
+        self._trained_at = self._count
+        self._write_header()
+
+    def _set_centroids(self, centroids: np.ndarray) -> None:
+        self._centroids = centroids.astype(np.float32)
+        self._lists = [[] for _ in range(len(centroids))]
+        vectors = self._vectors[: self._count]
+        # Assign in blocks so the [block, nlist] score matrix stays small
+        for start in range(0, self._count, 65536):
+            block = vectors[start : start + 65536]
+            for offset, c in enumerate(np.argmax(block @ self._centroids.T, axis=1)):
+                self._lists[c].append(start + offset)
+
+    # Persistence
+
+    def _file(self, name: str) -> str:
+        assert self.path is not None
+        return os.path.join(self.path, name)
+
+    def _write_header(self) -> None:
+        if self.path is None:
+            return
+        header = {
+            "dim": self._dim,
+            "trained_at": self._trained_at,
+            "centroids": None if self._centroids is None else self._centroids.tolist(),
+        }
+        tmp_path = self._file(f"index.json.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(header, f)
+        os.replace(tmp_path, self._file("index.json"))
+
+    def _persist(self, unit: np.ndarray, record: Dict[str, Any]) -> None:
+        if self.path is None:
+            return
+        with open(self._file("vectors.f16"), "ab") as f:
+            f.write(unit.astype("<f2").tobytes())
+        with open(self._file("items.jsonl"), "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def _load(self) -> None:
+        try:
+            with open(self._file("index.json"), encoding="utf-8") as f:
+                header = json.load(f)
+        except (OSError, ValueError):
+            return
+        self._dim = header.get("dim")
+        if not self._dim:
+            return
+
+        try:
+            vectors = np.fromfile(self._file("vectors.f16"), dtype="<f2")
+            with open(self._file("items.jsonl"), encoding="utf-8") as f:
+                lines = f.read().split("\n")
+        except OSError:
+            return
+        items = []
+        for line in lines:
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                break  # half-written tail
+        count = min(len(vectors) // self._dim, len(items))
+        if len(vectors) != count * self._dim or len(items) != count:
+            self._truncate_files(count, items[:count])
+
+        self._vectors = vectors[: count * self._dim].reshape(count, self._dim).astype(np.float32)
+        self._items = items[:count]
+        self._rows = {(item.get("space"), item["id"]): row for row, item in enumerate(self._items)}
+        self._space_names = {}
+        self._spaces = np.fromiter(
+            (self._space_names.setdefault(item.get("space"), len(self._space_names)) for item in self._items),
+            dtype=np.int32,
+            count=count,
+        )
+        self._count = count
+        if header.get("centroids"):
+            self._trained_at = int(header.get("trained_at") or 0)
+            self._set_centroids(np.asarray(header["centroids"], dtype=np.float32))
+        elif count >= self.train_size:
+            self._train()
+
+    def _truncate_files(self, count: int, items: List[Dict[str, Any]]) -> None:
+        """Drop a partially written tail so later appends line up again."""
+        assert self._dim is not None
+        with open(self._file("vectors.f16"), "r+b") as f:
+            f.truncate(count * self._dim * 2)
+        with open(self._file("items.jsonl"), "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(item) + "\n" for item in items)